@@ -0,0 +1,127 @@
+import pandas as pd
+import os
+
+from findex.results_store import ResultsStore
+from findex.spec_grid import expand_grid, run_spec_grid
+
+# File Paths
+# The grid reads the cleaned data from step 4 (before the credit card threshold of step 5),
+# so the threshold can be varied as a sample filter
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_cleaned.csv"
+OUTPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/spec_grid_results.csv"
+# Results store shared with steps 6 and 7: every model of the grid with full coefficients and covariance
+RESULTS_DB_PATH = r"/Users/anyas/Desktop/Thesis/regression_results.sqlite"
+
+# --- Configuration ---
+
+# Dependent Variables (must be binary 0/1 for logit)
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Baseline explanatory variables, as in steps 6 and 7
+baseline_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+# Alternative regressor sets {name: list of variables}
+REGRESSOR_SETS = {
+    'baseline': baseline_vars,
+    'no_online': [v for v in baseline_vars if v not in ('paid_bills_online', 'bought_online')],
+    'with_debit': baseline_vars + ['has_debit_card'],
+}
+
+# Fixed-effect choices {name: list of FE variables}
+FE_CHOICES = {
+    'country_year': ['economycode', 'year'],
+    'country': ['economycode'],
+    'none': [],
+}
+
+# Sample filters {name: filter}. Supported keys: min_credit_card_threshold, years, exclude_countries
+SAMPLE_FILTERS = {
+    'cc10': {'min_credit_card_threshold': 0.10},
+    'cc05': {'min_credit_card_threshold': 0.05},
+    'cc20': {'min_credit_card_threshold': 0.20},
+    'cc10_2021': {'min_credit_card_threshold': 0.10, 'years': [2021]},
+}
+
+# 'pooled' = step 6 (SEs clustered by country), 'country' = step 7 (one model per country)
+LEVELS = ['pooled']
+
+# Number of parallel worker processes (None = all CPU cores, 1 = no parallelism)
+N_WORKERS = None
+
+# Start each fit from the same group and DV of an earlier specification (False = every fit starts at zero)
+WARM_START = True
+
+country_var = 'economycode'
+
+
+# --- Running the Specification Grid ---
+# Everything runs under the main guard, because worker processes re-import this script on macOS/Windows
+if __name__ == "__main__":
+    print(f"Loading data from: {INPUT_CSV_PATH}")
+    try:
+        data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+        print("Data loaded successfully.")
+    except FileNotFoundError:
+        print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+        exit()
+    except Exception as e:
+        print(f"ERROR loading data: {e}")
+        exit()
+
+    specs = expand_grid(REGRESSOR_SETS, dependent_vars, FE_CHOICES, SAMPLE_FILTERS, LEVELS)
+    print(f"\nRunning {len(specs)} specifications...")
+
+    try:
+        with ResultsStore(RESULTS_DB_PATH) as store:
+            results = run_spec_grid(data_cleaned, specs, country_var=country_var, n_workers=N_WORKERS, store=store,
+                                    warm_start=WARM_START)
+    except KeyError as e:
+        print(f"ERROR: {e}")
+        exit()
+    print(f"All models written to the results store: {RESULTS_DB_PATH}")
+
+    fits = results.drop_duplicates(['Spec ID', 'Group', 'DV'])
+    print(f"Solver iterations: {int(fits['Iterations'].sum())} over {len(fits)} models "
+          f"({int(fits['Warm Start'].fillna(False).astype(bool).sum())} warm-started)")
+
+    print("\n--- Credit card OR by specification ---")
+    summary = results[results['Term'] == 'has_credit_card'].pivot_table(
+        index='Spec ID', columns='DV', values='OR', aggfunc='first'
+    )
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 150):
+        print(summary.round(3))
+
+    output_dir = os.path.dirname(OUTPUT_CSV_PATH)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    print(f"\nSaving long-format results to: {OUTPUT_CSV_PATH}")
+    try:
+        results.to_csv(OUTPUT_CSV_PATH, index=False)
+        print("Results saved successfully.")
+    except Exception as e:
+        print(f"ERROR saving results to CSV: {e}")
+
+    print("\n--- Script Finished ---")
@@ -0,0 +1,128 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import os
+
+from findex.fe_logit import CountryFELogit, threshold_sweep
+
+# File Paths
+# The sweep reads the cleaned data from step 4 (before the credit card threshold of step 5 is applied)
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_cleaned.csv"
+OUTPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/threshold_sweep_credit_card.csv"
+OUTPUT_PLOT_PATH = r"/Users/anyas/Desktop/Thesis/threshold_sweep_credit_card.png"
+
+# --- Configuration ---
+
+# Thresholds for minimum credit card ownership per country (0% to 50% in steps of 1 p.p.)
+THRESHOLDS = np.round(np.arange(0.0, 0.501, 0.01), 2)
+
+# Threshold used in step 5, marked on the plot
+CURRENT_THRESHOLD = 0.10
+
+# Dependent Variables (must be binary 0/1 for logit)
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory Variables, as in step 6
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+country_var = 'economycode'
+year_var = 'year'
+term = 'has_credit_card'
+
+# Plot settings
+DV_COLORS = {'saved': "#1F77B4", 'saved_account': "#2CA02C", 'saved_retirement': "#D62728"}
+DPI = 300
+
+# --- Data Loading ---
+print(f"Loading data from: {INPUT_CSV_PATH}")
+try:
+    data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+    print("Data loaded successfully.")
+except FileNotFoundError:
+    print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+    exit()
+except Exception as e:
+    print(f"ERROR loading data: {e}")
+    exit()
+
+# Country credit card ownership, computed as in step 5
+ownership = data_cleaned.groupby(country_var)['has_credit_card'].mean()
+print(f"Credit card ownership ranges from {ownership.min():.1%} to {ownership.max():.1%} across {len(ownership)} countries.")
+
+# --- Running the Sweep ---
+sweep_tables = []
+for dv in dependent_vars:
+    print(f"\n  Sweeping thresholds for dependent variable: {dv}")
+    try:
+        model = CountryFELogit(data_cleaned, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+        if model.dropped_countries:
+            print(f"    Countries without variation in '{dv}' are left out: {model.dropped_countries}")
+        sweep = threshold_sweep(model, ownership.to_dict(), THRESHOLDS, term=term)
+    except Exception as e:
+        print(f"    ERROR during sweep for '{dv}': {e}")
+        continue
+    print(f"    {len(sweep)} thresholds fitted with {sweep['Iterations'].sum()} Newton iterations in total.")
+    sweep_tables.append(sweep)
+
+if not sweep_tables:
+    print("\nNo sweep results available.")
+    exit()
+
+results = pd.concat(sweep_tables, ignore_index=True)
+with pd.option_context('display.max_rows', 20, 'display.max_columns', None, 'display.width', 150):
+    print(results[['Threshold', 'DV', 'Countries', 'N', 'Lower 95', 'OR', 'Higher 95']])
+
+print(f"\nSaving sweep results to: {OUTPUT_CSV_PATH}")
+try:
+    results.to_csv(OUTPUT_CSV_PATH, index=False)
+    print("Sweep results saved successfully.")
+except Exception as e:
+    print(f"ERROR saving sweep results to CSV: {e}")
+
+# --- Plotting the Threshold -> OR Curve ---
+plt.figure(figsize=(10, 6))
+for dv, group in results.groupby('DV', sort=False):
+    color = DV_COLORS.get(dv)
+    plt.plot(group['Threshold'], group['OR'], color=color, linewidth=2, label=dv)
+    plt.fill_between(group['Threshold'], group['Lower 95'], group['Higher 95'], color=color, alpha=0.15)
+
+plt.axhline(1, color="#555555", linestyle='--', linewidth=1)
+plt.axvline(CURRENT_THRESHOLD, color="#555555", linestyle=':', linewidth=1)
+plt.title('Pooled Odds Ratio of "Has a Credit Card" by Minimum Credit Card Ownership Threshold')
+plt.xlabel('Minimum Credit Card Ownership per Country')
+plt.ylabel('Odds Ratio (95% CI)')
+plt.grid(True, linestyle='--', alpha=0.6)
+plt.legend()
+plt.tight_layout()
+
+output_dir = os.path.dirname(OUTPUT_PLOT_PATH)
+if output_dir and not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+plt.savefig(OUTPUT_PLOT_PATH, dpi=DPI)
+plt.close()
+print(f"✅ Threshold sweep plot saved to {OUTPUT_PLOT_PATH}")
+
+print("\n--- Script Finished ---")
@@ -0,0 +1,108 @@
+import pandas as pd
+import os
+
+from findex.fe_logit import CountryFELogit, leave_one_country_out
+
+# File Paths
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+OUTPUT_INFLUENCE_PATH = r"/Users/anyas/Desktop/Thesis/leave_one_country_out_influence.csv"
+OUTPUT_SUMMARY_PATH = r"/Users/anyas/Desktop/Thesis/leave_one_country_out_summary.csv"
+
+# --- Configuration ---
+
+# False = one-step delete-one-country estimates (fast), True = exact warm-started refits
+EXACT_REFITS = False
+
+# Number of most influential countries to print per dependent variable
+TOP_N = 10
+
+# Dependent Variables (must be binary 0/1 for logit)
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory Variables, as in step 6
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+country_var = 'economycode'
+year_var = 'year'
+term = 'has_credit_card'
+
+# --- Data Loading ---
+print(f"Loading data from: {INPUT_CSV_PATH}")
+try:
+    data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+    print("Data loaded successfully.")
+except FileNotFoundError:
+    print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+    exit()
+except Exception as e:
+    print(f"ERROR loading data: {e}")
+    exit()
+
+# --- Influence Analysis ---
+influence_tables = []
+summaries = []
+for dv in dependent_vars:
+    print(f"\n  Processing dependent variable: {dv}")
+    try:
+        model = CountryFELogit(data_cleaned, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+        if model.dropped_countries:
+            print(f"    Countries without variation in '{dv}' are left out: {model.dropped_countries}")
+        full_fit = model.fit()
+        if not full_fit['converged']:
+            print(f"    WARNING: pooled model for '{dv}' did not converge.")
+        table, summary = leave_one_country_out(model, full_fit, term=term, exact=EXACT_REFITS)
+    except Exception as e:
+        print(f"    ERROR during influence analysis for '{dv}': {e}")
+        continue
+
+    table.insert(0, 'DV', dv)
+    influence_tables.append(table)
+    summaries.append(summary)
+
+    print(f"    Full-sample OR: {summary['OR']:.3f} (clustered SE {summary['Clustered SE']:.4f}, "
+          f"jackknife SE {summary['Jackknife SE']:.4f})")
+    print(f"    Most influential countries on the '{term}' OR:")
+    with pd.option_context('display.max_columns', None, 'display.width', 150):
+        print(table[['Country', 'N', 'OR (-country)', 'Change in OR', 'DFBETA']].head(TOP_N).to_string(index=False))
+
+if not influence_tables:
+    print("\nNo influence results available.")
+    exit()
+
+# --- Saving Results ---
+output_dir = os.path.dirname(OUTPUT_INFLUENCE_PATH)
+if output_dir and not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+try:
+    pd.concat(influence_tables, ignore_index=True).to_csv(OUTPUT_INFLUENCE_PATH, index=False)
+    pd.DataFrame(summaries).to_csv(OUTPUT_SUMMARY_PATH, index=False)
+    print(f"\n✅ Influence table saved to {OUTPUT_INFLUENCE_PATH}")
+    print(f"✅ Jackknife summary saved to {OUTPUT_SUMMARY_PATH}")
+except Exception as e:
+    print(f"ERROR saving influence results to CSV: {e}")
+
+print("\n--- Script Finished ---")
@@ -0,0 +1,129 @@
+import pandas as pd
+
+from findex.lpm import country_blocks, fit_lpm_by_country, fit_lpm_pooled_fe, per_country_table
+
+# File Paths
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+
+# Output file per dependent variable, same layout as the step 7 tables (Country, Lower 95, Coef, Higher 95)
+OUTPUT_FILE_PATHS = {
+    'saved': r"/Users/anyas/Desktop/Thesis/lpm_results_per_country_saved.csv",
+    'saved_account': r"/Users/anyas/Desktop/Thesis/lpm_results_per_country_saved_account.csv",
+    'saved_retirement': r"/Users/anyas/Desktop/Thesis/lpm_results_per_country_saved_retirement.csv",
+}
+
+# Pooled country-FE LPM (SEs clustered by country) for all explanatory variables
+OUTPUT_POOLED_PATH = r"/Users/anyas/Desktop/Thesis/lpm_table_full_data.csv"
+
+# --- Configuration ---
+
+# Dependent Variables (must be binary 0/1)
+# IMPORTANT: Ensure every variable listed here has a corresponding entry in OUTPUT_FILE_PATHS above
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory Variables, as in step 7
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+country_var = 'economycode'
+year_var = 'year' # Set to None if you don't want year controls
+term = 'has_credit_card'
+
+# --- Validate Configuration ---
+missing_paths = [dv for dv in dependent_vars if dv not in OUTPUT_FILE_PATHS]
+if missing_paths:
+    print(f"ERROR: Output file paths are not defined for: {missing_paths}")
+    exit()
+
+# --- Data Loading ---
+print(f"Loading data from: {INPUT_CSV_PATH}")
+try:
+    data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+    print("Data loaded successfully.")
+except FileNotFoundError:
+    print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+    exit()
+except Exception as e:
+    print(f"ERROR loading data: {e}")
+    exit()
+
+missing_cols = [col for col in dependent_vars + explanatory_vars + [country_var] if col not in data_cleaned.columns]
+if missing_cols:
+    print(f"\nERROR: The following required columns are missing from the CSV: {missing_cols}")
+    exit()
+
+# --- Fitting LPMs (all countries at once per DV) ---
+pooled_columns = {}
+all_saved_successfully = True
+
+for dv in dependent_vars:
+    print(f"\nProcessing dependent variable: {dv}")
+    try:
+        blocks = country_blocks(data_cleaned, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+        coef, se, status = fit_lpm_by_country(blocks)
+        pooled_coef, pooled_se, pooled_names = fit_lpm_pooled_fe(blocks)
+    except Exception as e:
+        print(f"  ERROR fitting LPMs for '{dv}': {e}")
+        all_saved_successfully = False
+        continue
+
+    n_ok = sum(s == 'OK' for s in status)
+    print(f"  {n_ok}/{len(status)} countries estimated (HC1 SEs).")
+
+    dv_table = per_country_table(blocks, coef, se, status, term=term)
+    with pd.option_context('display.max_rows', 10, 'display.max_columns', None, 'display.width', 150):
+        print(dv_table)
+
+    output_csv_path = OUTPUT_FILE_PATHS[dv]
+    print(f"Saving table for '{dv}' to: {output_csv_path}")
+    try:
+        dv_table.to_csv(output_csv_path)
+    except Exception as e:
+        print(f"ERROR saving table for '{dv}' to CSV: {e}")
+        all_saved_successfully = False
+
+    pooled_columns[(dv, 'Coef')] = pd.Series(pooled_coef, index=pooled_names)
+    pooled_columns[(dv, 'Clustered SE')] = pd.Series(pooled_se, index=pooled_names)
+
+# --- Pooled Country-FE LPM Table ---
+if pooled_columns:
+    pooled_table = pd.DataFrame(pooled_columns)
+    print("\n--- Pooled LPM with country FE (SEs clustered by country) ---")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 150):
+        print(pooled_table.round(4))
+    try:
+        pooled_table.to_csv(OUTPUT_POOLED_PATH)
+        print(f"Saved pooled LPM table to: {OUTPUT_POOLED_PATH}")
+    except Exception as e:
+        print(f"ERROR saving pooled LPM table to CSV: {e}")
+        all_saved_successfully = False
+
+# --- Final Summary ---
+if all_saved_successfully:
+     print("\nAll LPM tables saved successfully.")
+else:
+     print("\nWarning: One or more LPM tables could not be saved.")
+
+print("\n--- Script Finished ---")
@@ -0,0 +1,131 @@
+import pandas as pd
+import numpy as np
+
+from findex.lpm import country_blocks
+from findex.multilevel_logit import fit_random_slope_logit, country_or_table
+
+# File Paths
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+
+# Shrunken per-country ORs, same layout as the step 7 tables, so the plot scripts (steps 8-10) can read
+# them by pointing their INPUT_FILE here
+OUTPUT_FILE_PATHS = {
+    'saved': r"/Users/anyas/Desktop/Thesis/multilevel_results_per_country_saved.csv",
+    'saved_account': r"/Users/anyas/Desktop/Thesis/multilevel_results_per_country_saved_account.csv",
+    'saved_retirement': r"/Users/anyas/Desktop/Thesis/multilevel_results_per_country_saved_retirement.csv",
+}
+
+# Fixed effects and variance components of each multilevel model
+OUTPUT_SUMMARY_PATH = r"/Users/anyas/Desktop/Thesis/multilevel_summary.csv"
+
+# --- Configuration ---
+
+# Dependent Variables (must be binary 0/1 for logit)
+# IMPORTANT: Ensure every variable listed here has a corresponding entry in OUTPUT_FILE_PATHS above
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory Variables, as in step 7 (has_credit_card gets a random slope by country)
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+country_var = 'economycode'
+year_var = 'year' # Set to None if you don't want year controls
+slope_var = 'has_credit_card'
+
+# --- Validate Configuration ---
+missing_paths = [dv for dv in dependent_vars if dv not in OUTPUT_FILE_PATHS]
+if missing_paths:
+    print(f"ERROR: Output file paths are not defined for: {missing_paths}")
+    exit()
+
+# --- Data Loading ---
+print(f"Loading data from: {INPUT_CSV_PATH}")
+try:
+    data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+    print("Data loaded successfully.")
+except FileNotFoundError:
+    print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+    exit()
+except Exception as e:
+    print(f"ERROR loading data: {e}")
+    exit()
+
+# --- Fitting Multilevel Logits ---
+summary_rows = []
+all_saved_successfully = True
+
+for dv in dependent_vars:
+    print(f"\nProcessing dependent variable: {dv}")
+    try:
+        blocks = country_blocks(data_cleaned, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+        result = fit_random_slope_logit(blocks, slope_var=slope_var)
+    except Exception as e:
+        print(f"  ERROR fitting multilevel model for '{dv}': {e}")
+        all_saved_successfully = False
+        continue
+
+    if not result['converged']:
+        print(f"  WARNING: variance parameters for '{dv}' did not converge.")
+    j = result['names'].index(slope_var)
+    se = np.sqrt(result['cov_beta'][j, j])
+    print(f"  Overall OR of '{slope_var}': {np.exp(result['beta'][j]):.3f} "
+          f"[{np.exp(result['beta'][j] - 1.96 * se):.3f}, {np.exp(result['beta'][j] + 1.96 * se):.3f}]")
+    print(f"  SD of country slopes: {result['sd_slope']:.3f}, SD of country intercepts: {result['sd_intercept']:.3f}, "
+          f"correlation: {result['correlation']:.2f}")
+
+    dv_table = country_or_table(result)
+    with pd.option_context('display.max_rows', 10, 'display.max_columns', None, 'display.width', 150):
+        print(dv_table)
+
+    output_csv_path = OUTPUT_FILE_PATHS[dv]
+    print(f"Saving table for '{dv}' to: {output_csv_path}")
+    try:
+        dv_table.to_csv(output_csv_path)
+    except Exception as e:
+        print(f"ERROR saving table for '{dv}' to CSV: {e}")
+        all_saved_successfully = False
+
+    for name, coef, var in zip(result['names'], result['beta'], np.diagonal(result['cov_beta'])):
+        summary_rows.append({'DV': dv, 'Term': name, 'Coef': coef, 'Std.Err.': np.sqrt(var), 'OR': np.exp(coef)})
+    summary_rows.append({'DV': dv, 'Term': 'SD country intercept', 'Coef': result['sd_intercept']})
+    summary_rows.append({'DV': dv, 'Term': f'SD country slope ({slope_var})', 'Coef': result['sd_slope']})
+    summary_rows.append({'DV': dv, 'Term': 'Correlation intercept/slope', 'Coef': result['correlation']})
+    summary_rows.append({'DV': dv, 'Term': 'Laplace log-likelihood', 'Coef': result['laplace_llf']})
+
+# --- Saving Summary ---
+if summary_rows:
+    try:
+        pd.DataFrame(summary_rows).to_csv(OUTPUT_SUMMARY_PATH, index=False)
+        print(f"\nSaved multilevel summary to: {OUTPUT_SUMMARY_PATH}")
+    except Exception as e:
+        print(f"ERROR saving multilevel summary to CSV: {e}")
+        all_saved_successfully = False
+
+if all_saved_successfully:
+     print("\nAll multilevel tables saved successfully.")
+else:
+     print("\nWarning: One or more multilevel tables could not be saved.")
+
+print("\n--- Script Finished ---")
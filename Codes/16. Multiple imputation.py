@@ -0,0 +1,167 @@
+import pandas as pd
+import numpy as np
+
+from findex.imputation import chained_imputation, save_imputations, run_imputed_fits, pool_fits
+
+# File Paths
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+
+# Imputed values, stored as deltas against the input data (row positions + one int8 vector per imputation)
+IMPUTATIONS_PATH = r"/Users/anyas/Desktop/Thesis/mi_imputations.npz"
+
+# Rubin-pooled tables, in the layouts of steps 6 and 7
+OUTPUT_FULL_DATA_PATH = r"/Users/anyas/Desktop/Thesis/mi_table_full_data.csv"
+OUTPUT_FILE_PATHS = {
+    'saved': r"/Users/anyas/Desktop/Thesis/mi_results_per_country_saved.csv",
+    'saved_account': r"/Users/anyas/Desktop/Thesis/mi_results_per_country_saved_account.csv",
+    'saved_retirement': r"/Users/anyas/Desktop/Thesis/mi_results_per_country_saved_retirement.csv",
+}
+
+# --- Configuration ---
+
+# Dependent Variables (must be binary 0/1 for logit). They help impute the regressors,
+# but rows with a missing DV are still left out of that DV's models
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory Variables, as in steps 6 and 7
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+# Binary variables with missing values to impute (variables without missing values are skipped)
+impute_vars = dependent_vars + [var for var in explanatory_vars if var != 'age']
+
+country_var = 'economycode'
+year_var = 'year' # Set to None if you don't want year controls
+
+N_IMPUTATIONS = 5 # M, the number of completed datasets
+N_CYCLES = 10 # Rounds of chained equations per imputation
+SEED = 2024 # Imputations are reproducible for a given seed
+N_WORKERS = None # Parallel worker processes for the fits (None = all CPU cores, 1 = no parallelism)
+
+
+# --- Running the Imputation and the Fits ---
+# Everything runs under the main guard, because worker processes re-import this script on macOS/Windows
+if __name__ == "__main__":
+    missing_paths = [dv for dv in dependent_vars if dv not in OUTPUT_FILE_PATHS]
+    if missing_paths:
+        print(f"ERROR: Output file paths are not defined for: {missing_paths}")
+        exit()
+
+    print(f"Loading data from: {INPUT_CSV_PATH}")
+    try:
+        data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+        print("Data loaded successfully.")
+    except FileNotFoundError:
+        print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+        exit()
+    except Exception as e:
+        print(f"ERROR loading data: {e}")
+        exit()
+
+    # Complete variables (plus the year dummies) are the predictors of every imputation model
+    predictor_vars = [var for var in explanatory_vars if var not in impute_vars or data_cleaned[var].notna().all()]
+    if year_var:
+        for year in sorted(data_cleaned[year_var].dropna().unique())[1:]:
+            data_cleaned[f"_{year_var}_{year}"] = (data_cleaned[year_var] == year).astype(float)
+            predictor_vars.append(f"_{year_var}_{year}")
+
+    print(f"\nImputing {N_IMPUTATIONS} datasets by chained equations ({N_CYCLES} cycles each)...")
+    imputations = chained_imputation(data_cleaned, impute_vars, predictor_vars, country_var=country_var,
+                                     m=N_IMPUTATIONS, n_cycles=N_CYCLES, seed=SEED)
+    data_cleaned = data_cleaned.drop(columns=[var for var in predictor_vars if var.startswith('_')])
+    for var in imputations['impute_vars']:
+        share = imputations['rows'][var].size / len(data_cleaned)
+        print(f"  {var}: {imputations['rows'][var].size} values imputed ({share:.2%})")
+
+    print(f"Saving imputations to: {IMPUTATIONS_PATH}")
+    try:
+        save_imputations(IMPUTATIONS_PATH, imputations)
+    except Exception as e:
+        print(f"ERROR saving imputations: {e}")
+
+    print("\nFitting the models on every imputed dataset...")
+    fits = run_imputed_fits(data_cleaned, imputations, dependent_vars, explanatory_vars,
+                            country_var=country_var, year_var=year_var, n_workers=N_WORKERS)
+
+    # --- Pooling with Rubin's Rules ---
+    full_tables = {}
+    all_saved_successfully = True
+    for dv in dependent_vars:
+        print(f"\nPooling results for: {dv}")
+        pooled = pool_fits(fits, dv)
+
+        est = pooled['pooled']
+        rows = [pooled['names'].index(var) for var in explanatory_vars]
+        or_df = pd.DataFrame({
+            'Odds Ratio (OR)': [f"{v:.4f}" for v in np.exp(est['Estimate'][rows])],
+            'OR CI 95% Lower': np.exp(est['Lower'][rows]),
+            'OR CI 95% Upper': np.exp(est['Upper'][rows]),
+            'FMI': est['FMI'][rows],
+        }, index=explanatory_vars)
+        info_rows = pd.DataFrame({
+            'Odds Ratio (OR)': ['YES', 'YES', 'YES', f"{pooled['nobs']}", f"{pooled['n_clusters']}", f"{N_IMPUTATIONS}"],
+            'OR CI 95% Lower': ['YES', 'YES', 'YES', '', '', ''],
+            'OR CI 95% Upper': ['YES', 'YES', 'YES', '', '', ''],
+            'FMI': ['', '', '', '', '', ''],
+        }, index=['Country FE', 'Year FE', 'Clustered St.Er.', 'Individuals', 'Countries', 'Imputations'])
+        full_tables[dv] = pd.concat([or_df, info_rows], axis=0)
+
+        country = pooled['country']
+        dv_table = pd.DataFrame(index=pooled['countries'], columns=['Lower 95', 'OR', 'Higher 95'], dtype=object)
+        dv_table.index.name = 'Country'
+        for g, country_code in enumerate(pooled['countries']):
+            if np.isfinite(country['Estimate'][g]) and np.isfinite(country['SE'][g]):
+                dv_table.loc[country_code, 'OR'] = f"{np.exp(country['Estimate'][g]):.3f}"
+                dv_table.loc[country_code, 'Lower 95'] = f"{np.exp(country['Lower'][g]):.3f}"
+                dv_table.loc[country_code, 'Higher 95'] = f"{np.exp(country['Upper'][g]):.3f}"
+            else:
+                dv_table.loc[country_code, :] = 'NA'
+
+        output_csv_path = OUTPUT_FILE_PATHS[dv]
+        print(f"Saving per-country table for '{dv}' to: {output_csv_path}")
+        try:
+            dv_table.to_csv(output_csv_path)
+        except Exception as e:
+            print(f"ERROR saving table for '{dv}' to CSV: {e}")
+            all_saved_successfully = False
+
+    combined_table = pd.concat(full_tables, axis=1)
+    print(f"\n--- Rubin-Pooled Logit Results ({N_IMPUTATIONS} imputations) ---")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 150):
+        print(combined_table)
+
+    print(f"\nSaving combined table to: {OUTPUT_FULL_DATA_PATH}")
+    try:
+        combined_table.to_csv(OUTPUT_FULL_DATA_PATH)
+    except Exception as e:
+        print(f"ERROR saving table to CSV: {e}")
+        all_saved_successfully = False
+
+    if all_saved_successfully:
+         print("\nAll multiple-imputation tables saved successfully.")
+    else:
+         print("\nWarning: One or more multiple-imputation tables could not be saved.")
+
+    print("\n--- Script Finished ---")
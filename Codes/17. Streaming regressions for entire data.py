@@ -0,0 +1,119 @@
+import pandas as pd
+import numpy as np
+
+from findex.streaming_logit import StreamingLogit, csv_chunks, or_table
+
+# File Paths
+# Same input and model as step 6, but the data is read in chunks and never held in memory as a whole
+input_csv_path = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+output_or_csv_path = r"/Users/anyas/Desktop/Thesis/regression_table_full_data_streaming.csv"
+
+# Rows per chunk: memory use is bounded by this (times the number of design columns), not by the data size
+CHUNK_SIZE = 200_000
+
+# 0/1 regressors of a chunk are stored as 'int8' or as 'bits' (8 per byte); FE are kept as integer codes
+STORAGE = 'int8'
+# Keep the compact chunks in memory after the first Newton pass instead of re-reading the CSV on every pass
+# (about one byte per design cell, against eight for a float64 design)
+KEEP_ENCODED = True
+
+# --- Configuration ---
+
+# Specify Dependent Variables (must be binary 0/1 for logit)
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Specify Explanatory Variables (main variables for table output)
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+#   'inc_quint1', # IMPORTANT: we need to remove one of the levels when levels represent all possible outcomes, usually we remove the lowest
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+# Define Fixed Effects Variables
+fe_vars = ['economycode', 'year']
+# Define Clustering Variable
+cluster_var = 'economycode'
+
+# --- Streaming Fit ---
+columns = list(dict.fromkeys(dependent_vars + explanatory_vars + fe_vars + [cluster_var]))
+chunks = csv_chunks(input_csv_path, columns, chunksize=CHUNK_SIZE, dtype={cluster_var: str})
+
+print(f"Fitting pooled logits from {input_csv_path} in chunks of {CHUNK_SIZE} rows...")
+try:
+    model = StreamingLogit(chunks, dependent_vars, explanatory_vars, fe_vars, cluster_var, storage=STORAGE,
+                           keep_encoded=KEEP_ENCODED)
+    results, fit_info = model.fit()
+except FileNotFoundError:
+    print(f"ERROR: File not found at {input_csv_path}. Please check the path.")
+    exit()
+except ValueError as e:
+    print(f"ERROR reading the model columns: {e}")
+    exit()
+except np.linalg.LinAlgError as e:
+    print(f"ERROR during model fit: {e}")
+    exit()
+
+if KEEP_ENCODED:
+    compact_bytes, dense_bytes = model.design_nbytes()
+    print(f"  Design kept in memory: {compact_bytes / 1e6:.1f} MB ({STORAGE}), "
+          f"{dense_bytes / 1e6:.1f} MB as a float64 matrix")
+
+# --- Calculating and Presenting Odds Ratios & Stats ---
+or_tables = {}
+for dv in dependent_vars:
+    result = results[dv]
+    if result is None:
+        info = fit_info[dv]
+        print(f"  WARNING: no table for '{dv}': {info['Fit Status']} after {info['Iterations']} iterations.")
+        continue
+    print(f"  {dv}: {result['nobs']} observations, {result['iterations']} Newton passes")
+
+    or_df = or_table(result, explanatory_vars)
+    stars = pd.cut(or_df['PValue'], bins=[-np.inf, 0.001, 0.01, 0.05, np.inf], labels=['***', '**', '*', ''])
+    or_df['Odds Ratio (OR)'] = or_df['OddsRatio'].round(4).astype(str) + stars.astype(str)
+    final_or_df = or_df[['Odds Ratio (OR)', 'OR CI 95% Lower', 'OR CI 95% Upper']].copy()
+
+    k = len(result['params'])
+    adj_pseudo_r2 = 1 - (result['llf'] - k) / result['llnull']
+    info_rows = pd.DataFrame({
+        'Odds Ratio (OR)': ['YES', 'YES', 'YES', f"{result['nobs']}", f"{result['n_clusters']}",
+                            f"{result['prsquared']:.4f}", f"{adj_pseudo_r2:.4f}"],
+        'OR CI 95% Lower': ['YES', 'YES', 'YES', '', '', '', ''],
+        'OR CI 95% Upper': ['YES', 'YES', 'YES', '', '', '', ''],
+    }, index=['Country FE', 'Year FE', 'Clustered St.Er.', 'Individuals', 'Countries', 'Pseudo R2', 'Adj. Pseudo R2'])
+
+    or_tables[dv] = pd.concat([final_or_df, info_rows], axis=0)
+
+# --- Final Output Generation ---
+combined_table = pd.concat(or_tables, axis=1)
+print("\n--- Combined Logit Results (streaming fit, clustered SEs) ---")
+with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 150):
+    print(combined_table)
+
+print(f"\nSaving combined table to: {output_or_csv_path}")
+try:
+    combined_table.to_csv(output_or_csv_path)
+    print("Combined table saved successfully.")
+except Exception as e:
+    print(f"ERROR saving table to CSV: {e}")
+
+print("\n--- Script Finished ---")
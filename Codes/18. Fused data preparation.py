@@ -0,0 +1,46 @@
+from findex import codebook
+from findex.etl_plan import preparation_plan
+
+# Steps 1-5 as one lazy plan: only the columns that reach data_for_regressions.csv are read and decoded,
+# and the excluded countries are dropped while reading
+
+# File Paths
+WAVE_FILES = {
+    r"/Users/anyas/Desktop/Thesis/data 2017.csv": 2017,
+    r"/Users/anyas/Desktop/Thesis/data 2021.csv": 2021,
+}
+OUTPUT_FILTERED_DATA_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
+
+# Intermediate files of steps 2 and 4, written only when MATERIALIZE_INTERMEDIATES is True. They then hold
+# the rows and columns of the step-by-step files, so the columns are only pruned after the last of them
+MATERIALIZE_INTERMEDIATES = False
+INTERMEDIATE_PATHS = {
+    'data_recoded': r"/Users/anyas/Desktop/Thesis/data_recoded.csv",
+    'data_cleaned': r"/Users/anyas/Desktop/Thesis/data_cleaned.csv",
+}
+
+# Minimum credit card ownership threshold, as in step 5
+MIN_CREDIT_CARD_THRESHOLD = 0.10
+
+plan = preparation_plan(WAVE_FILES, codebook, MIN_CREDIT_CARD_THRESHOLD,
+                        materialize=INTERMEDIATE_PATHS if MATERIALIZE_INTERMEDIATES else None)
+
+print("Plan as written:")
+print(plan.explain())
+print("\nOptimised plan:")
+print(plan.optimized().explain())
+
+try:
+    data_filtered = plan.collect()
+except FileNotFoundError as e:
+    print(f"ERROR: File not found: {e}")
+    exit()
+except Exception as e:
+    print(f"ERROR running the preparation plan: {e}")
+    exit()
+
+print(f"\nResult: {len(data_filtered)} rows, {data_filtered['economycode'].nunique()} countries, "
+      f"{data_filtered.shape[1]} columns")
+
+data_filtered.to_csv(OUTPUT_FILTERED_DATA_PATH, index=False)
+print(f"✅ Filtered data saved to {OUTPUT_FILTERED_DATA_PATH}")
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from findex.codebook import columns_to_keep, recoding_dict, derived_variables
+from findex.stata_ingest import value_labels, check_recoding, stata_to_store
+
+# Reads the World Bank micro_world .dta files directly (instead of converting them to CSV for step 1),
+# keeps their value labels to check the recoding of step 2, and writes the merged waves to a Parquet store
+# that step 2 can read (set its file_path to STORE_PATH). Requires pyarrow for the store.
+
+# File Paths
+WAVE_FILES = {
+    r"/Users/anyas/Desktop/Thesis/micro_world_2017.dta": 2017,
+    r"/Users/anyas/Desktop/Thesis/micro_world_2021.dta": 2021,
+}
+STORE_PATH = r"/Users/anyas/Desktop/Thesis/data 2017-2021.parquet"
+LABEL_CHECK_PATH = r"/Users/anyas/Desktop/Thesis/recoding_label_check.csv"
+
+# Rows read from a .dta file at a time
+CHUNK_SIZE = 100_000
+
+# --- Checking the Recoding Against the Value Labels ---
+checks = []
+for path, year in WAVE_FILES.items():
+    print(f"Reading value labels of {path}...")
+    try:
+        labels = value_labels(path)
+    except FileNotFoundError:
+        print(f"ERROR: File not found at {path}. Please check the path.")
+        exit()
+    missing_columns = [col for col in columns_to_keep if col not in labels and col in recoding_dict]
+    if missing_columns:
+        print(f"  No value labels for recoded columns: {missing_columns}")
+    wave_check = check_recoding(labels, recoding_dict, derived_variables)
+    wave_check.insert(0, 'Year', year)
+    checks.append(wave_check)
+
+label_check = pd.concat(checks, ignore_index=True)
+if label_check.empty:
+    print("✅ Every labelled code of the recoded columns is covered by the recoding.")
+else:
+    print(f"⚠️ {len(label_check)} differences between the recoding and the value labels:")
+    with pd.option_context('display.max_rows', 50, 'display.width', 150):
+        print(label_check)
+label_check.to_csv(LABEL_CHECK_PATH, index=False)
+print(f"Label check saved to {LABEL_CHECK_PATH}")
+
+# --- Writing the Store ---
+print(f"\nStreaming the waves into {STORE_PATH} in chunks of {CHUNK_SIZE} rows...")
+try:
+    n_rows = stata_to_store(WAVE_FILES, STORE_PATH, columns=columns_to_keep, year_column="Year", chunksize=CHUNK_SIZE)
+except ImportError:
+    print("ERROR: writing the Parquet store needs pyarrow (pip install pyarrow).")
+    exit()
+except KeyError as e:
+    print(f"ERROR: column not found in a .dta file: {e}")
+    exit()
+
+print(f"✅ {n_rows} rows written to {STORE_PATH}")
@@ -0,0 +1,114 @@
+import pandas as pd
+import os
+
+from findex.cube import income_quintile
+from findex.results_store import ResultsStore
+from findex.spec_grid import expand_grid, run_spec_grid
+
+# File Paths
+# Like the specification grid, this reads the cleaned data from step 4 and applies the credit card
+# threshold of step 5 as a sample filter
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_cleaned.csv"
+OUTPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/regression_results_by_group.csv"
+# Results store shared with steps 6, 7 and 11
+RESULTS_DB_PATH = r"/Users/anyas/Desktop/Thesis/regression_results.sqlite"
+
+# --- Configuration ---
+
+# Dependent Variables (must be binary 0/1 for logit)
+dependent_vars = [
+    'saved',
+    'saved_account',
+    'saved_retirement'
+]
+
+# Explanatory variables, as in steps 6 and 7
+explanatory_vars = [
+    'has_credit_card',
+    'female',
+    'age',
+    'higher_educ',
+    'employed',
+    'inc_quint2',
+    'inc_quint3',
+    'inc_quint4',
+    'inc_quint5',
+    'recv_wage',
+    'recv_govt_trans',
+    'recv_pension',
+    'borrowed',
+    'has_mobile',
+    'paid_utility',
+    'paid_bills_online',
+    'bought_online',
+]
+
+# Breakdowns: one model per value of each grouping variable, or per combination of several variables.
+# Any column of the data can be used; 'inc_quint' (1-5) is built below from the quintile dummies.
+# Country and year FE (and regressors) that are constant within a group drop out by themselves.
+GROUP_BY = [
+    ['regionwb'],
+    ['year'],
+    ['economycode', 'year'],
+    ['female'],
+    ['inc_quint'],
+]
+
+FE_CHOICES = {'country_year': ['economycode', 'year']}
+SAMPLE_FILTERS = {'cc10': {'min_credit_card_threshold': 0.10}}
+
+# Number of parallel worker processes (None = all CPU cores, 1 = no parallelism)
+N_WORKERS = None
+
+country_var = 'economycode'
+
+
+# --- Running the Grouped Regressions ---
+# Everything runs under the main guard, because worker processes re-import this script on macOS/Windows
+if __name__ == "__main__":
+    print(f"Loading data from: {INPUT_CSV_PATH}")
+    try:
+        data_cleaned = pd.read_csv(INPUT_CSV_PATH)
+        print("Data loaded successfully.")
+    except FileNotFoundError:
+        print(f"ERROR: File not found at {INPUT_CSV_PATH}. Please check the path.")
+        exit()
+    except Exception as e:
+        print(f"ERROR loading data: {e}")
+        exit()
+
+    # Income quintile as one grouping variable (NaN when a dummy is missing)
+    data_cleaned['inc_quint'] = income_quintile(data_cleaned)
+
+    levels = [tuple(keys) for keys in GROUP_BY]
+    specs = expand_grid({'baseline': explanatory_vars}, dependent_vars, FE_CHOICES, SAMPLE_FILTERS, levels)
+    print(f"\nRunning {len(specs)} breakdowns: {', '.join(spec['level'] for spec in specs)}")
+
+    try:
+        with ResultsStore(RESULTS_DB_PATH) as store:
+            results = run_spec_grid(data_cleaned, specs, country_var=country_var, n_workers=N_WORKERS, store=store)
+    except KeyError as e:
+        print(f"ERROR: {e}")
+        exit()
+    print(f"All models written to the results store: {RESULTS_DB_PATH}")
+
+    print("\n--- Credit card OR by group ---")
+    credit_card = results[results['Term'] == 'has_credit_card']
+    for level, rows in credit_card.groupby('Level', sort=False):
+        summary = rows.pivot_table(index='Group', columns='DV', values='OR', aggfunc='first')
+        print(f"\n{level} ({len(summary)} groups)")
+        with pd.option_context('display.max_rows', 30, 'display.width', 150):
+            print(summary.round(3))
+
+    output_dir = os.path.dirname(OUTPUT_CSV_PATH)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    print(f"\nSaving long-format results to: {OUTPUT_CSV_PATH}")
+    try:
+        results.to_csv(OUTPUT_CSV_PATH, index=False)
+        print("Results saved successfully.")
+    except Exception as e:
+        print(f"ERROR saving results to CSV: {e}")
+
+    print("\n--- Script Finished ---")
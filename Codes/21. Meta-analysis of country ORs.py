@@ -0,0 +1,103 @@
+import pandas as pd
+import os
+
+from findex.meta_analysis import (country_regions, effect_sizes, random_effects, store_effect_sizes,
+                                  subgroup_meta_regression)
+from findex.results_store import ResultsStore
+
+# File Paths
+# Per-country ORs: every country-level spec in the results store (steps 7 and 11) when it exists,
+# otherwise the step 7 tables (one per DV)
+RESULTS_DB_PATH = r"/Users/anyas/Desktop/Thesis/regression_results.sqlite"
+COUNTRY_TABLES = {
+    'saved': r"/Users/anyas/Desktop/Thesis/regression_results_per_country_saved.csv",
+    'saved_account': r"/Users/anyas/Desktop/Thesis/regression_results_per_country_saved_account.csv",
+    'saved_retirement': r"/Users/anyas/Desktop/Thesis/regression_results_per_country_saved_retirement.csv",
+}
+# Cleaned data of step 4, for the region of each country
+INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_cleaned.csv"
+OUTPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/meta_analysis_country_or.csv"
+SUBGROUPS_CSV_PATH = r"/Users/anyas/Desktop/Thesis/meta_regression_region_subgroups.csv"
+TESTS_CSV_PATH = r"/Users/anyas/Desktop/Thesis/meta_regression_region_tests.csv"
+
+# --- Configuration ---
+
+# Coefficient pooled across countries and the level of the per-country models in the store
+TERM = 'has_credit_card'
+LEVEL = 'country'
+# Spec ID given to the step 7 tables when there is no results store
+TABLE_SPEC_ID = 'baseline|country_year|cc10|country'
+
+# tau^2 estimators (REML is the default of the pooled row in plots 8-10)
+METHODS = ['REML', 'DL']
+
+# Moderator of the subgroup meta-regression
+country_var = 'economycode'
+region_var = 'regionwb'
+
+
+def load_effect_sizes():
+    """Per-country log ORs and variances with Spec ID, DV and Country columns."""
+    if os.path.exists(RESULTS_DB_PATH):
+        print(f"Loading per-country estimates from the results store: {RESULTS_DB_PATH}")
+        with ResultsStore(RESULTS_DB_PATH) as store:
+            return store_effect_sizes(store, term=TERM, level=LEVEL)
+    tables = []
+    for dv, path in COUNTRY_TABLES.items():
+        print(f"Loading the step 7 table for {dv}: {path}")
+        table = pd.read_csv(path, keep_default_na=False)
+        tables.append(table.assign(**{'Spec ID': TABLE_SPEC_ID, 'DV': dv}))
+    return effect_sizes(pd.concat(tables, ignore_index=True))
+
+
+# --- Running the Meta-Analyses ---
+try:
+    studies = load_effect_sizes()
+except FileNotFoundError as e:
+    print(f"ERROR: {e}")
+    exit()
+n_meta = len(studies[['Spec ID', 'DV']].drop_duplicates())
+print(f"{len(studies)} country estimates in {n_meta} (spec, DV) combinations.")
+
+pooled = pd.concat([random_effects(studies, method=method) for method in METHODS], ignore_index=True)
+pooled = pooled.sort_values(['Spec ID', 'DV', 'Method'], ignore_index=True)
+
+print("\n--- Pooled credit card OR (REML) ---")
+summary = pooled[pooled['Method'] == 'REML'].set_index(['Spec ID', 'DV'])
+with pd.option_context('display.max_rows', 30, 'display.width', 150):
+    print(summary[['k', 'OR', 'Lower 95', 'Higher 95', 'Tau2', 'I2', 'PI Lower', 'PI Upper']].round(3))
+
+# Subgroup meta-regression by region
+print(f"\nLoading regions from: {INPUT_CSV_PATH}")
+try:
+    regions = country_regions(pd.read_csv(INPUT_CSV_PATH, usecols=[country_var, region_var]),
+                              country_var, region_var)
+except (FileNotFoundError, ValueError) as e:
+    print(f"Region meta-regression skipped: {e}")
+    regions = None
+
+if regions is not None:
+    studies['Region'] = studies['Country'].map(regions)
+    unmatched = studies.loc[studies['Region'].isna(), 'Country'].unique()
+    if len(unmatched):
+        print(f"No region for {len(unmatched)} countries (left out of the meta-regression): {', '.join(map(str, unmatched))}")
+    subgroups, tests = subgroup_meta_regression(studies, 'Region')
+
+    print("\n--- Test of region differences ---")
+    with pd.option_context('display.max_rows', 30, 'display.width', 150):
+        print(tests.set_index(['Spec ID', 'DV'])[['k', 'Subgroups', 'Tau2 Residual', 'R2', 'QM', 'QM P-value']].round(3))
+
+# --- Saving ---
+for path in (OUTPUT_CSV_PATH, SUBGROUPS_CSV_PATH, TESTS_CSV_PATH):
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+print(f"\nSaving the pooled estimates to: {OUTPUT_CSV_PATH}")
+pooled.to_csv(OUTPUT_CSV_PATH, index=False)
+if regions is not None:
+    print(f"Saving the region meta-regression to: {SUBGROUPS_CSV_PATH} and {TESTS_CSV_PATH}")
+    subgroups.to_csv(SUBGROUPS_CSV_PATH, index=False)
+    tests.to_csv(TESTS_CSV_PATH, index=False)
+
+print("\n--- Script Finished ---")
@@ -4,6 +4,8 @@ import seaborn as sns
 import numpy as np
 import os
 
+from findex.cube import AggregationCube
+
 # Define all paths at the top of the code
 INPUT_FILE_PATH = r"/Users/anyas/Desktop/Thesis/data_cleaned.csv"
 OUTPUT_STATS_PATH = r"/Users/anyas/Desktop/Thesis/descriptive_overall.csv"
@@ -11,6 +13,10 @@ OUTPUT_CORR_PATH = r"/Users/anyas/Desktop/Thesis/correlation_matrix_overall.csv"
 OUTPUT_COUNTRY_MEANS_PATH = r"/Users/anyas/Desktop/Thesis/country_means.csv"
 OUTPUT_FILTERED_DATA_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
 OUTPUT_PLOTS_PREFIX = r"/Users/anyas/Desktop/Thesis/scatter_"
+# Aggregation cube (counts, sums and weighted sums per country, year, region, sex, income quintile and
+# education cell) and the breakdown tables read from it
+OUTPUT_CUBE_PATH = r"/Users/anyas/Desktop/Thesis/aggregation_cube.csv"
+OUTPUT_BREAKDOWNS_PATH = r"/Users/anyas/Desktop/Thesis/descriptive_breakdowns.csv"
 
 # Minimum credit card ownership threshold (can be adjusted by the user)
 MIN_CREDIT_CARD_THRESHOLD = 0.10  # 10% threshold
@@ -18,9 +24,14 @@ MIN_CREDIT_CARD_THRESHOLD = 0.10  # 10% threshold
 # Load your cleaned dataset
 data_cleaned = pd.read_csv(INPUT_FILE_PATH)
 
+# ✅ Aggregation cube: one pass over the respondent rows; every mean and share below is a sum over its cells
+cube = AggregationCube.from_frame(data_cleaned)
+cube.write(OUTPUT_CUBE_PATH)
+print(f"✅ Aggregation cube with {len(cube.cells)} cells saved to {OUTPUT_CUBE_PATH}")
+
 # ✅ Filter countries by credit card ownership threshold
 # First calculate the country means to apply the filter
-country_means_all = data_cleaned.groupby('economycode')['has_credit_card'].mean().reset_index()
+country_means_all = cube.mean(['has_credit_card'], by=['economycode']).reset_index()
 
 # Get list of countries that meet the threshold
 countries_above_threshold = country_means_all[country_means_all['has_credit_card'] >= MIN_CREDIT_CARD_THRESHOLD][
@@ -63,14 +74,27 @@ print("✅ Correlation analysis completed and saved to files.")
 # Dependent variables: saved, saved_account, saved_retirement
 variables_of_interest = ['has_credit_card', 'saved', 'saved_account', 'saved_retirement']
 
-# Group by economycode (country code) and calculate means for variables of interest
-country_means = data_filtered.groupby('economycode')[variables_of_interest].mean().reset_index()
+# Country means of the variables of interest (countries above the threshold), from the cube
+country_means = cube.mean(variables_of_interest, by=['economycode'],
+                          where={'economycode': countries_above_threshold}).reset_index()
 
 # Save country means to CSV
 country_means.to_csv(OUTPUT_COUNTRY_MEANS_PATH, index=False)
 print("✅ Country means calculated and saved to file.")
 print(country_means.head())
 
+# ✅ Breakdowns by region, year, sex, income quintile and education (raw and survey-weighted shares)
+breakdowns = []
+for dimension in ['regionwb', 'year', 'female', 'inc_quint', 'higher_educ']:
+    for weighted in (False, True):
+        table = cube.mean(variables_of_interest, by=[dimension], where={'economycode': countries_above_threshold},
+                          weighted=weighted)
+        table.index = pd.Index(table.index.astype(str), name='Group')
+        breakdowns.append(table.assign(Breakdown=dimension, Weighted=weighted).reset_index())
+breakdowns = pd.concat(breakdowns, ignore_index=True)[['Breakdown', 'Group', 'Weighted'] + variables_of_interest]
+breakdowns.to_csv(OUTPUT_BREAKDOWNS_PATH, index=False)
+print(f"✅ Breakdowns saved to {OUTPUT_BREAKDOWNS_PATH}")
+
 # ✅ Create scatter plots for each dependent variable vs has_credit_card
 # Define dependent variables
 dependent_vars = ['saved', 'saved_account', 'saved_retirement']
@@ -1,11 +1,21 @@
 import pandas as pd
 import numpy as np
-import statsmodels.formula.api as smf
+import statsmodels.api as sm
 import warnings # To manage potential warnings
 
+from findex.design import encode_design, model_data, model_rows
+from findex.marginal_effects import average_marginal_effects
+from findex.results_store import ResultsStore
+from findex.warm_start import WarmStarts
+from findex.weighted_logit import WeightedLogit
+
 # File Paths
 input_csv_path = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
 output_or_csv_path = r"/Users/anyas/Desktop/Thesis/regression_table_full_data.csv"
+# Results store shared with step 7: full coefficients, covariance and fit statistics of every model
+RESULTS_DB_PATH = r"/Users/anyas/Desktop/Thesis/regression_results.sqlite"
+# Spec id of these models in the store (the specification grid of step 11 uses the same naming under 'grid|')
+SPEC_ID = 'baseline|country_year|cc10|pooled'
 
 # Suppress potential ConvergenceWarning
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
@@ -48,6 +58,17 @@ fe_vars = ['economycode', 'year']
 # Define Clustering Variable
 cluster_var = 'economycode'
 
+# Survey weights: set to True to fit the weighted (pseudo-likelihood) logit with the Findex weight,
+# SEs are then the linearization (sandwich) SEs clustered by country
+USE_SURVEY_WEIGHTS = False
+weight_var = 'wgt'
+
+# Warm starts: each DV's fit starts from the solution of the DV fitted before it (same regressors, mostly
+# the same rows) instead of from zero; the Newton iterations of every fit are printed and stored
+WARM_START = True
+if USE_SURVEY_WEIGHTS:
+    SPEC_ID = f"{SPEC_ID}|weighted"
+
 # --- Data Loading ---
 print(f"Loading data from: {input_csv_path}")
 try:
@@ -69,7 +90,8 @@ try:
          else:
               raise KeyError(f"Variable '{var}' needed for FE/clustering not found.")
     print("Categorical variables prepared.")
-    required_cols = list(set([dv for dv in dependent_vars if dv in data_cleaned.columns] + explanatory_vars + [cluster_var] + fe_vars))
+    required_cols = list(set([dv for dv in dependent_vars if dv in data_cleaned.columns] + explanatory_vars + [cluster_var] + fe_vars
+                             + ([weight_var] if USE_SURVEY_WEIGHTS else [])))
     missing_cols = [col for col in required_cols if col not in data_cleaned.columns]
     if missing_cols:
         print(f"\nERROR: The following required columns are missing from the CSV: {missing_cols}")
@@ -85,41 +107,58 @@ except Exception as e:
 # --- Running Logistic Regressions with Pre-filtering and Clustered SEs ---
 models = {}
 model_stats = {}
+model_ids = {}
+store = ResultsStore(RESULTS_DB_PATH)
 
 print(f"\nRunning regressions with pre-filtering and SEs clustered by '{cluster_var}'...")
-explanatory_formula_part = " + ".join(explanatory_vars)
-fixed_effects_formula_part = " + ".join([f"C({fe})" for fe in fe_vars])
-formula_base = f"{explanatory_formula_part} + {fixed_effects_formula_part}"
+# The regressors and FE dummies are encoded once for all DVs; each DV's model takes its non-missing rows
+# of the shared matrix (columns named as in the formula 'dv ~ regressors + C(economycode) + C(year)')
+dv_cols = [dv for dv in dependent_vars if dv in data_cleaned.columns]
+design = encode_design(data_cleaned, explanatory_vars, fe_vars, dv_cols,
+                       weight_var=weight_var if USE_SURVEY_WEIGHTS else None)
+cluster_codes = pd.Categorical(data_cleaned[cluster_var]).codes
+warm_starts = WarmStarts()
 
 all_models_successful = True
 for dv in dependent_vars:
     print(f"  Processing dependent variable: {dv}")
     print(f"    Pre-filtering data for model '{dv}'...")
-    cols_for_model = list(set([dv] + explanatory_vars + [cluster_var] + fe_vars))
-    df_temp = data_cleaned[cols_for_model]
-    df_model_ready = df_temp.dropna()
+    if dv not in design['y']:
+        print(f"    ERROR: Dependent variable '{dv}' not found in the data. Skipping.")
+        models[dv] = None
+        model_stats[dv] = {}
+        all_models_successful = False
+        continue
+    y, X, weights = model_data(design, dv)
 
-    if df_model_ready.empty:
+    if y.empty:
         print(f"    ERROR: No non-missing observations remain for model '{dv}' after filtering. Skipping.")
         models[dv] = None
         model_stats[dv] = {}
         all_models_successful = False
         continue
 
-    print(f"    Filtered data has {len(df_model_ready)} observations.")
-    cluster_groups_aligned = df_model_ready[cluster_var]
+    print(f"    Filtered data has {len(y)} observations.")
+    cluster_groups_aligned = pd.Series(cluster_codes[design['order']][model_rows(design, dv)])
 
-    formula = f"{dv} ~ {formula_base}"
-    print(f"    Fitting model: {formula}")
+    print(f"    Fitting model: {dv} ~ {X.shape[1]} columns ({', '.join(fe_vars)} FE)")
     try:
-        model = smf.logit(formula, data=df_model_ready).fit(
+        if USE_SURVEY_WEIGHTS:
+            logit_model = WeightedLogit(y, X, weights=weights)
+        else:
+            logit_model = sm.Logit(y, X)
+        start_params, start_key = warm_starts.start(X.columns, list(reversed(list(warm_starts.solved)))) if WARM_START else (None, None)
+        model = logit_model.fit(
+            start_params=start_params,
             disp=False,
             cov_type='cluster',
             cov_kwds={'groups': cluster_groups_aligned},
             use_t=False
         )
+        warm_starts.add(dv, model.params)
         models[dv] = model
-        print(f"    Regression for '{dv}' completed.")
+        start_text = f"warm start from '{start_key}'" if start_key else "cold start"
+        print(f"    Regression for '{dv}' completed in {model.mle_retvals.get('iterations')} iterations ({start_text}).")
     except Exception as e:
         print(f"    ERROR during model fit for '{dv}': {e}")
         models[dv] = None
@@ -144,6 +183,8 @@ for dv in dependent_vars:
             'Num. Clusters': num_clusters # Store the count of clusters
         }
         print(f"    Stats calculated for '{dv}'.")
+        model_ids[dv] = store.add_result(SPEC_ID, 'pooled', 'ALL', dv, model, n_clusters=num_clusters,
+                                         iterations=model.mle_retvals.get('iterations'))
     except Exception as e:
         print(f"    ERROR calculating statistics for '{dv}': {e}")
         model_stats[dv] = {}
@@ -185,33 +226,56 @@ for dv, model in models.items():
         stars = pd.cut(p_vals, bins=[-np.inf, 0.001, 0.01, 0.05, np.inf], labels=['***', '**', '*', ''])
         or_df['Odds Ratio (OR)'] = or_df['OddsRatio'].round(4).astype(str) + stars.astype(str)
 
-        final_or_df = or_df[['Odds Ratio (OR)', 'OR CI 95% Lower', 'OR CI 95% Upper']].copy()
+        # Average marginal effects on the probability (discrete change for 0/1 variables), clustered delta-method CIs
+        exog = model.model.exog
+        ame_columns = [model.model.exog_names.index(var) for var in valid_exp_vars]
+        ame = average_marginal_effects(
+            exog[None], np.array([exog.shape[0]]), model.params.to_numpy()[None],
+            model.cov_params().to_numpy()[None], ame_columns,
+            weights=model.model.weights[None] if USE_SURVEY_WEIGHTS else None
+        )
+        or_df['AME'] = ame['AME'][0]
+        or_df['AME CI 95% Lower'] = ame['Lower'][0]
+        or_df['AME CI 95% Upper'] = ame['Upper'][0]
+        if dv in model_ids:
+            store.add_effects(model_ids[dv], 'AME', valid_exp_vars, ame['AME'][0], ame['Lower'][0], ame['Upper'][0])
+
+        final_or_df = or_df[['Odds Ratio (OR)', 'OR CI 95% Lower', 'OR CI 95% Upper',
+                             'AME', 'AME CI 95% Lower', 'AME CI 95% Upper']].copy()
 
         # --- Create FE and Info Rows ---
         fe_rows = pd.DataFrame({
             'Odds Ratio (OR)': ['YES', 'YES'],
             'OR CI 95% Lower': ['YES', 'YES'],
-            'OR CI 95% Upper': ['YES', 'YES']
+            'OR CI 95% Upper': ['YES', 'YES'],
+            'AME': ['YES', 'YES'],
+            'AME CI 95% Lower': ['YES', 'YES'],
+            'AME CI 95% Upper': ['YES', 'YES']
         }, index=['Country FE', 'Year FE'])
 
         cluster_row = pd.DataFrame({
-            'Odds Ratio (OR)': ['YES'], 'OR CI 95% Lower': ['YES'], 'OR CI 95% Upper': ['YES']
+            'Odds Ratio (OR)': ['YES'], 'OR CI 95% Lower': ['YES'], 'OR CI 95% Upper': ['YES'],
+            'AME': ['YES'], 'AME CI 95% Lower': ['YES'], 'AME CI 95% Upper': ['YES']
         }, index=['Clustered St.Er.']) # Changed label slightly for consistency
 
         # --- Create individual Stat Rows with desired labels ---
         stats = model_stats[dv]
         individuals_row = pd.DataFrame({'Odds Ratio (OR)': [f"{stats['N']}"],
-                                        'OR CI 95% Lower': [''], 'OR CI 95% Upper': ['']},
+                                        'OR CI 95% Lower': [''], 'OR CI 95% Upper': [''],
+                                        'AME': [''], 'AME CI 95% Lower': [''], 'AME CI 95% Upper': ['']},
                                        index=['Individuals'])
         # Use the Num. Clusters count but label the row 'Countries'
         countries_row = pd.DataFrame({'Odds Ratio (OR)': [f"{stats['Num. Clusters']}"],
-                                      'OR CI 95% Lower': [''], 'OR CI 95% Upper': ['']},
+                                      'OR CI 95% Lower': [''], 'OR CI 95% Upper': [''],
+                                      'AME': [''], 'AME CI 95% Lower': [''], 'AME CI 95% Upper': ['']},
                                      index=['Countries']) # Use desired label
         pseudo_r2_row = pd.DataFrame({'Odds Ratio (OR)': [f"{stats['Pseudo R2']:.4f}"],
-                                       'OR CI 95% Lower': [''], 'OR CI 95% Upper': ['']},
+                                       'OR CI 95% Lower': [''], 'OR CI 95% Upper': [''],
+                                       'AME': [''], 'AME CI 95% Lower': [''], 'AME CI 95% Upper': ['']},
                                       index=['Pseudo R2'])
         adj_pseudo_r2_row = pd.DataFrame({'Odds Ratio (OR)': [f"{stats['Adj. Pseudo R2']:.4f}"],
-                                           'OR CI 95% Lower': [''], 'OR CI 95% Upper': ['']},
+                                           'OR CI 95% Lower': [''], 'OR CI 95% Upper': [''],
+                                           'AME': [''], 'AME CI 95% Lower': [''], 'AME CI 95% Upper': ['']},
                                           index=['Adj. Pseudo R2'])
 
         # --- Combine rows in the specified order ---
@@ -250,4 +314,7 @@ if valid_models_count > 0 and or_tables:
 else:
      print("\nNo valid model results available to generate or save the final table.")
 
+store.close()
+print(f"All models written to the results store: {RESULTS_DB_PATH}")
+
 print("\n--- Script Finished ---")
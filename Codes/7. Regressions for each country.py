@@ -1,9 +1,17 @@
 import pandas as pd
 import numpy as np
-import statsmodels.formula.api as smf
-import warnings
+import statsmodels.api as sm
 import os
 
+from findex.design import encode_design, model_data
+from findex.fit_policy import fit_with_fallback
+from findex.checkpoint import run_signature, load_checkpoint, append_checkpoint
+from findex.lpm import country_blocks
+from findex.marginal_effects import average_marginal_effects, align_estimates
+from findex.results_store import ResultsStore
+from findex.warm_start import WarmStarts, aligned_start, country_start
+from findex.weighted_logit import WeightedLogit
+
 # File Paths
 INPUT_CSV_PATH = r"/Users/anyas/Desktop/Thesis/data_for_regressions.csv"
 
@@ -14,12 +22,30 @@ OUTPUT_FILE_PATHS = {
     'saved_retirement': r"/Users/anyas/Desktop/Thesis/regression_results_per_country_saved_retirement.csv",
 }
 
+# Log with the solver used, iterations and fit time for every (country, dv) model
+FIT_LOG_PATH = r"/Users/anyas/Desktop/Thesis/regression_fit_log_per_country.csv"
+
+# Append-only checkpoint: every finished (country, dv) cell is written here as soon as it is done
+CHECKPOINT_PATH = r"/Users/anyas/Desktop/Thesis/regression_checkpoint_per_country.jsonl"
+RESUME_FROM_CHECKPOINT = True # Set to False to refit every cell (old records are then ignored)
+
+# Results store: every (country, dv) model with its full coefficients, covariance, fit statistics and status.
+# The per-country CSV tables below are generated from it
+RESULTS_DB_PATH = r"/Users/anyas/Desktop/Thesis/regression_results.sqlite"
+# Spec id of these models in the store (the specification grid of step 11 uses the same naming under 'grid|')
+SPEC_ID = 'baseline|country_year|cc10|country'
+
+# Warm starts: each fit starts from the closest solved model (the same country's previous DV, else the pooled
+# model of step 6, read from the results store) instead of from zero
+WARM_START = True
+POOLED_SPEC_ID = 'baseline|country_year|cc10|pooled'
+# Set to True to also fit every warm-started cell from zero and log the iterations the warm start saved
+MEASURE_WARM_START_SAVINGS = False
+
 
 # --- Configuration ---
-# Suppress potential ConvergenceWarning and PerfectSeparationWarning
-from statsmodels.tools.sm_exceptions import ConvergenceWarning, PerfectSeparationWarning
-warnings.simplefilter('ignore', ConvergenceWarning)
-warnings.simplefilter('ignore', PerfectSeparationWarning)
+# Convergence and separation warnings are caught per fit by fit_with_fallback (Newton first,
+# then BFGS and L-BFGS, within a per-fit iteration and wall-clock budget) and stored in the fit log
 
 # Specify Dependent Variables (must be binary 0/1 for logit)
 # IMPORTANT: Ensure every variable listed here has a corresponding entry in OUTPUT_FILE_PATHS above
@@ -54,6 +80,10 @@ explanatory_vars = [
 # Specify key column names
 country_var = 'economycode'
 year_var = 'year' # Set to None if you don't want year controls
+weight_var = None # Set to 'wgt' to fit survey-weighted logits (robust HC1 SEs within each country)
+if weight_var:
+    SPEC_ID = f"{SPEC_ID}|weighted"
+    POOLED_SPEC_ID = f"{POOLED_SPEC_ID}|weighted"
 
 # --- Validate Configuration ---
 missing_paths = [dv for dv in dependent_vars if dv not in OUTPUT_FILE_PATHS]
@@ -83,7 +113,8 @@ required_cols_list = list(set(
     dependent_vars +
     explanatory_vars +
     [country_var] +
-    ([year_var] if year_var else [])
+    ([year_var] if year_var else []) +
+    ([weight_var] if weight_var else [])
 ))
 
 missing_cols = [col for col in required_cols_list if col not in data_cleaned.columns]
@@ -106,81 +137,131 @@ print("Data preparation checks complete.")
 
 # --- Running Logistic Regressions by Country ---
 
+# Regressors and year dummies are encoded once for all countries and DVs (rows sorted by country);
+# each (country, dv) model takes its rows of the shared matrix, named as in 'dv ~ regressors + C(year)'
+design = encode_design(data_cleaned, explanatory_vars, [year_var] if year_var else [], dependent_vars,
+                       group_var=country_var, weight_var=weight_var)
+
+warm_starts = WarmStarts()
+pooled_params = {}
+if WARM_START and os.path.exists(RESULTS_DB_PATH):
+    with ResultsStore(RESULTS_DB_PATH) as pooled_store:
+        pooled_params = {dv: pooled_store.params(POOLED_SPEC_ID, 'ALL', dv) for dv in dependent_vars}
+    pooled_params = {dv: params for dv, params in pooled_params.items() if params is not None}
+    print(f"Pooled estimates for warm starts found for: {list(pooled_params) or 'none'}")
+
+
+def warm_start(country, dv, names):
+    """Start vector and its source ('pooled', another DV, or None) for one (country, dv) model."""
+    if not WARM_START:
+        return None, None
+    start_params, key = warm_starts.start(names, [(country, other) for other in dependent_vars if other != dv])
+    if key is not None:
+        return start_params, key[1]
+    if dv in pooled_params:
+        return aligned_start(names, country_start(pooled_params[dv], country, country_var)), 'pooled'
+    return None, None
+
+
+def run_country_model(country, dv):
+    """Fit the logit for one (country, dv) cell. Returns (result dict, fit_info or None)."""
+    y, X, weights = model_data(design, dv, group=country)
+
+    n_obs = len(y)
+    num_potential_predictors = len(explanatory_vars) + (1 if X.shape[1] > len(explanatory_vars) + 1 else 0)
+    min_obs_needed = num_potential_predictors + 5
+
+    if n_obs < min_obs_needed:
+         return {'Status': 'Insufficient N'}, None
+    if y.nunique() < 2:
+         return {'Status': 'No DV Variation'}, None
+
+    fit_info = None
+
+    try:
+        if weight_var:
+            make_model, fit_kwargs = (lambda: WeightedLogit(y, X, weights=weights)), {'cov_type': 'HC1'}
+        else:
+            make_model, fit_kwargs = (lambda: sm.Logit(y, X)), {}
+        start_params, start_source = warm_start(country, dv, X.columns)
+        model, fit_info = fit_with_fallback(make_model(), start_params=start_params, **fit_kwargs)
+        fit_info['Warm Start'] = start_source or 'none'
+        if MEASURE_WARM_START_SAVINGS and start_source:
+            _, cold_info = fit_with_fallback(make_model(), **fit_kwargs)
+            fit_info['Cold Iterations'] = cold_info['Iterations']
+            fit_info['Iterations Saved'] = cold_info['Iterations'] - fit_info['Iterations']
+
+        if model is None:
+            return {'Status': fit_info['Fit Status']}, fit_info
+        warm_starts.add((country, dv), model.params)
+        if 'has_credit_card' in model.params.index:
+            param = model.params['has_credit_card']
+            odds_ratio = np.exp(param)
+            conf = model.conf_int()
+            if 'has_credit_card' in conf.index:
+                 log_odds_ci = conf.loc['has_credit_card']
+                 lower_ci = np.exp(log_odds_ci[0])
+                 upper_ci = np.exp(log_odds_ci[1])
+                 # Full estimates are kept for the marginal effects computed after the loop
+                 return {
+                     'OR': odds_ratio, 'Lower_CI': lower_ci, 'Upper_CI': upper_ci,
+                     'Param Names': list(model.params.index), 'Params': model.params.tolist(),
+                     'Cov': model.cov_params().to_numpy().tolist(),
+                     'N': int(model.nobs), 'LLF': model.llf, 'LLNull': model.llnull,
+                     'Pseudo R2': model.prsquared, 'Cov Type': model.cov_type,
+                 }, fit_info
+            return {'Status': 'CI Calc Error'}, fit_info
+        if 'has_credit_card' in X.columns:
+            return {'Status': 'Not Estimated (Dropped)'}, fit_info
+        return {'Status': 'Not Estimated (Missing/Constant)'}, fit_info
+
+    except Exception as e:
+        # error_type = type(e).__name__ # Keep for debugging if needed
+        return {'Status': 'Fit/CI Error'}, fit_info
+
+
 results_storage = {} # Structure: {country: {dv: {'OR': float, 'Lower_CI': float, 'Upper_CI': float, 'Status': str}}}
+fit_log = {} # Structure: {(country, dv): fit_info dict from fit_with_fallback}
 countries = data_cleaned[country_var].unique()
 countries = sorted([c for c in countries if pd.notna(c)])
 
+# --- Resume from Checkpoint ---
+# Records are only reused when the model setup and the input file are unchanged
+checkpoint_signature = run_signature({
+    'dependent_vars': dependent_vars,
+    'explanatory_vars': explanatory_vars,
+    'country_var': country_var,
+    'year_var': year_var,
+    'weight_var': weight_var,
+    'stored_estimates': True,
+}, INPUT_CSV_PATH)
+completed_cells = load_checkpoint(CHECKPOINT_PATH, checkpoint_signature) if RESUME_FROM_CHECKPOINT else {}
+if completed_cells:
+    print(f"Resuming from checkpoint: {len(completed_cells)} (country, dv) cells already finished.")
+
 print(f"\nFound {len(countries)} unique countries. Running regressions for each...")
 
 # --- Loop through countries and DVs ---
 for country in countries:
     results_storage[country] = {}
-    country_df = data_cleaned[data_cleaned[country_var] == country].copy()
-
-    if country_df.empty:
-        continue
 
     for dv in dependent_vars:
-        cols_for_model = [dv] + explanatory_vars + ([year_var] if year_var else [])
-        cols_for_model = [col for col in cols_for_model if col in country_df.columns]
-        df_model_ready = country_df[cols_for_model].dropna()
-
-        n_obs = len(df_model_ready)
-        num_potential_predictors = len(explanatory_vars) + (1 if year_var and year_var in df_model_ready.columns and df_model_ready[year_var].nunique() > 1 else 0)
-        min_obs_needed = num_potential_predictors + 5
-
-        if n_obs < min_obs_needed:
-             results_storage[country][dv] = {'Status': 'Insufficient N'}
-             continue
-        if dv not in df_model_ready.columns or df_model_ready[dv].nunique() < 2:
-             results_storage[country][dv] = {'Status': 'No DV Variation'}
-             continue
-
-        current_explanatory_parts = [var for var in explanatory_vars if var in df_model_ready.columns]
-        current_formula_parts = current_explanatory_parts
-        use_year_control = False
-
-        if year_var and year_var in df_model_ready.columns:
-             current_formula_parts.append(f"C({year_var})")
-             use_year_control = True
-
-        if not current_explanatory_parts:
-             results_storage[country][dv] = {'Status': 'No Expl Vars'}
-             continue
-
-        formula = f"{dv} ~ {' + '.join(current_formula_parts)}"
+        if (country, dv) in completed_cells:
+            record = completed_cells[(country, dv)]
+            results_storage[country][dv] = record['result']
+            if record['fit_info']:
+                fit_log[(country, dv)] = record['fit_info']
+            continue
+
+        result, fit_info = run_country_model(country, dv)
+        results_storage[country][dv] = result
+        if fit_info:
+            fit_log[(country, dv)] = fit_info
 
         try:
-            if use_year_control:
-                 if year_var in df_model_ready.columns:
-                     df_model_ready[year_var] = df_model_ready[year_var].astype('category')
-                 else:
-                     formula = f"{dv} ~ {' + '.join(current_explanatory_parts)}"
-
-            model = smf.logit(formula, data=df_model_ready).fit(disp=False)
-
-            if 'has_credit_card' in model.params.index:
-                param = model.params['has_credit_card']
-                odds_ratio = np.exp(param)
-                conf = model.conf_int()
-                if 'has_credit_card' in conf.index:
-                     log_odds_ci = conf.loc['has_credit_card']
-                     lower_ci = np.exp(log_odds_ci[0])
-                     upper_ci = np.exp(log_odds_ci[1])
-                     results_storage[country][dv] = {
-                         'OR': odds_ratio, 'Lower_CI': lower_ci, 'Upper_CI': upper_ci
-                     }
-                else:
-                     results_storage[country][dv] = {'Status': 'CI Calc Error'}
-            else:
-                 if 'has_credit_card' in current_explanatory_parts:
-                     results_storage[country][dv] = {'Status': 'Not Estimated (Dropped)'}
-                 else:
-                     results_storage[country][dv] = {'Status': 'Not Estimated (Missing/Constant)'}
-
-        except Exception as e:
-            # error_type = type(e).__name__ # Keep for debugging if needed
-            results_storage[country][dv] = {'Status': 'Fit/CI Error'}
+            append_checkpoint(CHECKPOINT_PATH, checkpoint_signature, country, dv, result, fit_info)
+        except OSError as e:
+            print(f"  WARNING: could not write checkpoint for ({country}, {dv}): {e}")
 
     country_index = countries.index(country) + 1
     if country_index % 25 == 0 or country_index == len(countries):
@@ -189,26 +270,64 @@ for country in countries:
 
 print("\n--- Regression runs finished ---")
 
+# --- Storing All Models ---
+print(f"\nWriting all models to the results store: {RESULTS_DB_PATH}")
+store = ResultsStore(RESULTS_DB_PATH)
+# Countries of earlier runs that are not in this data must not stay in the tables and plots
+store.clear(SPEC_ID)
+model_ids = {}
+for country in countries:
+    for dv in dependent_vars:
+        result = results_storage[country][dv]
+        fit_info = fit_log.get((country, dv), {})
+        solver = {'method': fit_info.get('Method'), 'iterations': fit_info.get('Iterations'),
+                  'signature': checkpoint_signature}
+        if 'Status' in result:
+            model_ids[(country, dv)] = store.add_model(SPEC_ID, 'country', country, dv, result['Status'], **solver)
+        else:
+            model_ids[(country, dv)] = store.add_model(
+                SPEC_ID, 'country', country, dv, 'OK', names=result['Param Names'], params=result['Params'],
+                cov=np.array(result['Cov']), nobs=result.get('N'), llf=result.get('LLF'),
+                llnull=result.get('LLNull'), prsquared=result.get('Pseudo R2'), cov_type=result.get('Cov Type'),
+                **solver
+            )
+
 # --- Assembling and Saving Final Tables (One per DV) ---
 print("\nAssembling and saving final result tables...")
 
-output_columns = ['Lower 95', 'OR', 'Higher 95']
 all_saved_successfully = True
 
+
+def country_marginal_effects(dv):
+    """AME of has_credit_card for all countries of one DV in a single batched computation."""
+    blocks = country_blocks(data_cleaned, dv, explanatory_vars, country_var=country_var, year_var=year_var,
+                            weight_var=weight_var)
+    estimates = [results_storage.get(country, {}).get(dv) for country in blocks['countries']]
+    coef, cov = align_estimates(blocks['names'], estimates)
+    ame = average_marginal_effects(
+        blocks['Xp'], blocks['n'], coef, cov, [blocks['names'].index('has_credit_card')],
+        weights=blocks.get('wp')
+    )
+    return {country: (ame['Lower'][g, 0], ame['AME'][g, 0], ame['Upper'][g, 0])
+            for g, country in enumerate(blocks['countries'])}
+
+
 for dv_name in dependent_vars:
     print(f"\nProcessing table for Dependent Variable: {dv_name}")
-    dv_table = pd.DataFrame(index=countries, columns=output_columns, dtype=object)
-    dv_table.index.name = 'Country'
-
-    for country_code in countries:
-        result = results_storage.get(country_code, {}).get(dv_name, None)
-        if (result and 'OR' in result and 'Lower_CI' in result and 'Upper_CI' in result
-                and pd.notna(result['OR']) and 'Status' not in result):
-            dv_table.loc[country_code, 'OR'] = f"{result['OR']:.3f}"
-            dv_table.loc[country_code, 'Lower 95'] = f"{result['Lower_CI']:.3f}"
-            dv_table.loc[country_code, 'Higher 95'] = f"{result['Upper_CI']:.3f}"
-        else:
-            dv_table.loc[country_code, :] = 'NA'
+
+    try:
+        ame_by_country = country_marginal_effects(dv_name)
+    except Exception as e:
+        print(f"WARNING: marginal effects for '{dv_name}' could not be computed: {e}")
+        ame_by_country = {}
+
+    for country_code, (ame_lower, ame_value, ame_upper) in ame_by_country.items():
+        if (country_code, dv_name) in model_ids and pd.notna(ame_value):
+            store.add_effects(model_ids[(country_code, dv_name)], 'AME', ['has_credit_card'],
+                              [ame_value], [ame_lower], [ame_upper])
+
+    # The table is a view over the store: OR and AME with 95% CIs, 'NA' where there is no estimate
+    dv_table = store.country_table(SPEC_ID, dv_name)
 
     # --- Get the pre-defined output path for this DV ---
     # Path validation happened at the start, so dv_name should be in the dictionary
@@ -226,6 +345,26 @@ for dv_name in dependent_vars:
         print(f"ERROR saving table for '{dv_name}' to CSV: {e}")
         all_saved_successfully = False
 
+store.close()
+
+# --- Saving Fit Log ---
+if fit_log:
+    fit_log_df = pd.DataFrame.from_dict(fit_log, orient='index')
+    fit_log_df.index.names = ['Country', 'DV']
+    print(f"\nFit methods used: {fit_log_df['Method'].value_counts().to_dict()}")
+    print(f"Total iterations: {fit_log_df['Iterations'].sum()}, total fit time: {fit_log_df['Fit Time (s)'].sum():.1f}s")
+    if 'Warm Start' in fit_log_df.columns:
+        print(f"Warm starts: {fit_log_df['Warm Start'].value_counts().to_dict()}")
+    if 'Iterations Saved' in fit_log_df.columns:
+        saved = fit_log_df['Iterations Saved'].sum()
+        print(f"Iterations saved by warm starts: {saved:.0f} of {saved + fit_log_df['Iterations'].sum():.0f}")
+    print(f"Saving fit log to: {FIT_LOG_PATH}")
+    try:
+        fit_log_df.to_csv(FIT_LOG_PATH)
+    except Exception as e:
+        print(f"ERROR saving fit log to CSV: {e}")
+        all_saved_successfully = False
+
 # --- Final Summary ---
 if all_saved_successfully:
      print("\nAll result tables saved successfully.")
@@ -0,0 +1,6 @@
+"""Shared helpers for the numbered thesis scripts in the Codes folder.
+
+The numbered scripts import from this package (e.g. ``from findex.fit_policy import fit_with_fallback``),
+which works because Python puts the script's own folder on the import path. ``findex.pipeline`` exposes
+the same stages as functions over in-memory frames, so a notebook can run the whole chain in one process.
+"""
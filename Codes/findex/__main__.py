@@ -0,0 +1,6 @@
+"""``python -m findex``: see findex.cli."""
+import sys
+
+from findex.cli import main
+
+sys.exit(main())
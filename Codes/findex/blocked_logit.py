@@ -0,0 +1,138 @@
+"""
+Blocked low-precision kernel for logits whose design is mostly 0/1 columns.
+
+Nearly every column of the step 6 design is an indicator: the fixed-effect dummies and most regressors.
+Instead of a dense float64 n x k matrix, a compact design keeps each fixed effect as one integer code per
+row, the 0/1 regressors as int8 (or bit-packed, one bit per cell) and only the other regressors (e.g. age)
+as float64. The log-likelihood, the score X'w(y - p) and X'WX are then accumulated over blocks of rows:
+each block is expanded into a small reusable float64 buffer (BLOCK_BYTES, sized to stay in cache), so the
+full float64 design is never built. Columns are named and ordered as the patsy formula of step 6.
+"""
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+
+# Size of the float64 block buffer; rows per block = BLOCK_BYTES / (8 * columns), a multiple of 8
+BLOCK_BYTES = 1 << 20
+
+
+def binary_columns(df, columns):
+    """The columns whose non-missing values are all 0 or 1."""
+    return [col for col in columns if df[col].dropna().isin([0, 1]).all()]
+
+
+def compact_design(df, explanatory_vars, fe_vars=(), levels=None, binary_vars=None, storage='int8'):
+    """
+    Encode the design of df compactly.
+
+    levels ({fe: levels}) fixes the dummy columns, e.g. to the levels of all chunks of a file; by default the
+    sorted levels present in df. binary_vars fixes which regressors are stored as 0/1 (by default those that
+    are 0/1 in df). storage is 'int8' or 'bits'. Rows with a missing regressor or FE value are flagged in
+    'complete' and stored as zeros.
+    """
+    if storage not in ('int8', 'bits'):
+        raise ValueError(f"storage must be 'int8' or 'bits', not {storage!r}")
+    explanatory_vars = list(explanatory_vars)
+    binary_vars = set(binary_columns(df, explanatory_vars) if binary_vars is None else binary_vars)
+    n = len(df)
+    complete = np.ones(n, dtype=bool)
+
+    names = ['Intercept']
+    fe = []
+    for var in fe_vars:
+        var_levels = list(levels[var]) if levels is not None else sorted(df[var].dropna().unique().tolist())
+        codes = pd.Categorical(df[var], categories=var_levels).codes
+        codes = codes.astype(np.int16 if len(var_levels) < np.iinfo(np.int16).max else np.int32)
+        complete &= codes >= 0
+        fe.append((len(names), codes, len(var_levels)))
+        names += [f"C({var})[T.{level}]" for level in var_levels[1:]]
+
+    offset = len(names)
+    names += explanatory_vars
+    binary_positions = [offset + i for i, var in enumerate(explanatory_vars) if var in binary_vars]
+    dense_positions = [offset + i for i, var in enumerate(explanatory_vars) if var not in binary_vars]
+
+    # A copy: with every regressor already float64, to_numpy can return a read-only view of the frame
+    values = df[explanatory_vars].to_numpy(dtype=np.float64, copy=True)
+    missing = np.isnan(values)
+    complete &= ~missing.any(axis=1)
+    values[missing] = 0.0
+    binary = values[:, [p - offset for p in binary_positions]].astype(np.int8)
+    if storage == 'bits':
+        binary = np.packbits(binary.astype(bool), axis=0)
+
+    return {
+        'names': names, 'n': n, 'k': len(names), 'fe': fe, 'storage': storage,
+        'binary': binary, 'binary_positions': np.array(binary_positions, dtype=np.intp),
+        'dense': np.ascontiguousarray(values[:, [p - offset for p in dense_positions]]),
+        'dense_positions': np.array(dense_positions, dtype=np.intp),
+        'complete': complete,
+    }
+
+
+def compact_nbytes(compact):
+    """Memory of the encoded regressors (FE codes, 0/1 and other columns), in bytes."""
+    return (sum(codes.nbytes for _, codes, _ in compact['fe']) + compact['binary'].nbytes
+            + compact['dense'].nbytes)
+
+
+def block_rows(k):
+    """Rows per block so that a float64 block of k columns fills BLOCK_BYTES."""
+    return max(8, BLOCK_BYTES // (8 * k) // 8 * 8)
+
+
+def _expand_block(compact, start, stop, buffer):
+    """Write rows start:stop of the design into buffer (float64) and return that view."""
+    X = buffer[:stop - start]
+    X[:, 0] = 1.0
+    for offset, codes, n_levels in compact['fe']:
+        X[:, offset:offset + n_levels - 1] = 0.0
+        block_codes = codes[start:stop]
+        rows = np.flatnonzero(block_codes > 0)
+        X[rows, offset + block_codes[rows] - 1] = 1.0
+    if compact['binary_positions'].size:
+        if compact['storage'] == 'bits':
+            # Blocks start at a multiple of 8 rows, so they start on a byte
+            bits = np.unpackbits(compact['binary'][start // 8:(stop + 7) // 8], axis=0)[:stop - start]
+        else:
+            bits = compact['binary'][start:stop]
+        X[:, compact['binary_positions']] = bits
+    if compact['dense_positions'].size:
+        X[:, compact['dense_positions']] = compact['dense'][start:stop]
+    return X
+
+
+def blocked_totals(compact, models, clusters=None, n_clusters=0):
+    """
+    Log-likelihood, score and X'WX of several logits on the same design, in one pass over the row blocks.
+
+    models is {key: (params, y, weights)} with full-width params (one per design column, 0 for columns the
+    model leaves out) and per-row weights (0 for rows outside the model, else 1 or the survey weight). With
+    cluster codes, the per-cluster score sums (n_clusters x k) are added up too. Returns {key: totals}.
+    """
+    k = compact['k']
+    totals = {key: {'llf': 0.0, 'score': np.zeros(k), 'XtWX': np.zeros((k, k)),
+                    'cluster_scores': np.zeros((n_clusters, k)) if clusters is not None else None}
+              for key in models}
+    size = block_rows(k)
+    buffer = np.empty((size, k))
+    weighted = np.empty((size, k))
+    for start in range(0, compact['n'], size):
+        stop = min(start + size, compact['n'])
+        X = _expand_block(compact, start, stop, buffer)
+        for key, (params, y, weights) in models.items():
+            w = weights[start:stop]
+            if not w.any():
+                continue
+            y_block = y[start:stop]
+            eta = X @ params
+            p = expit(eta)
+            total = totals[key]
+            total['llf'] += np.dot(w, y_block * eta - np.logaddexp(0, eta))
+            residual = w * (y_block - p)
+            total['score'] += residual @ X
+            Xw = np.multiply(X, (w * p * (1 - p))[:, None], out=weighted[:stop - start])
+            total['XtWX'] += X.T @ Xw
+            if clusters is not None:
+                np.add.at(total['cluster_scores'], clusters[start:stop], X * residual[:, None])
+    return totals
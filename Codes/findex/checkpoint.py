@@ -0,0 +1,89 @@
+"""Append-only checkpoint for long regression runs, so an interrupted run can resume."""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+# ===================== FUNCTIONS =====================
+
+def _to_json(value):
+    """Convert numpy scalars and arrays so json can write them."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def run_signature(config, input_path=None):
+    """
+    Build a short signature for a run from its configuration (and the input file's size and
+    modification time), so checkpoint records from a different setup are never reused.
+    """
+    payload = dict(config)
+    if input_path and os.path.exists(input_path):
+        stat = os.stat(input_path)
+        payload['_input'] = [os.path.abspath(input_path), stat.st_size, int(stat.st_mtime)]
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def load_checkpoint(path, signature):
+    """
+    Read finished cells from a checkpoint file.
+
+    Returns {(group, dv): record} for records written with the same signature. A half-written
+    last line (the run was killed during a write) is skipped.
+    """
+    completed = {}
+    if not path or not os.path.exists(path):
+        return completed
+
+    skipped_lines = 0
+    other_runs = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                skipped_lines += 1
+                continue
+            if record.get('signature') != signature:
+                other_runs += 1
+                continue
+            completed[(record['group'], record['dv'])] = record
+
+    if skipped_lines:
+        print(f"  Checkpoint: skipped {skipped_lines} incomplete line(s) in {path}")
+    if other_runs:
+        print(f"  Checkpoint: ignored {other_runs} record(s) from runs with a different configuration")
+    return completed
+
+
+def append_checkpoint(path, signature, group, dv, result, fit_info=None):
+    """Append one finished (group, dv) cell to the checkpoint and flush it to disk."""
+    record = {
+        'signature': signature,
+        'group': group,
+        'dv': dv,
+        'result': result,
+        'fit_info': fit_info,
+    }
+    line = json.dumps(record, default=_to_json)
+
+    # If the previous run was killed mid-write, start on a fresh line so the new record stays readable
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                line = '\n' + line
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,263 @@
+"""
+Command-line entry point for the pipeline stages: ``python -m findex --config run.toml <stage> [...]``.
+
+The run config (TOML, or YAML when PyYAML is installed) holds the paths, variable lists, threshold and
+exclusions that the numbered scripts keep as constants. Each subcommand is one stage of findex.pipeline;
+``run`` chains several stages in one process, handing frames over in memory. A stage reads its input
+from the configured path when an earlier stage did not run in the same call, and writes its output when
+a path is configured.
+
+With ``--dev``, the stages run on the seeded, country-stratified subsample of the [dev] section and every
+output path gets a '_sampled' suffix, so a full pass takes seconds and never overwrites full-data results.
+
+Only the standard library is imported at start-up: pandas, statsmodels, matplotlib and pyarrow are loaded
+by the stages that use them. ``bench-imports`` measures the cold-start import time of each subcommand.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Stage of the pipeline -> (input in Session.data, output in Session.data)
+STAGE_IO = {
+    'merge': (None, 'merged'),
+    'decode': ('merged', 'recoded'),
+    'drop_rename': ('recoded', 'cleaned'),
+    'filter': ('cleaned', 'regression'),
+    'describe': ('regression', 'description'),
+    'fit_pooled': ('regression', 'pooled'),
+    'fit_per_country': ('regression', 'per_country'),
+    'plot': (None, 'figures'),
+}
+
+# Modules each subcommand loads (used by bench-imports; stages import them lazily themselves)
+STAGE_MODULES = {
+    'merge': ['findex.pipeline', 'findex.ingest'],
+    'decode': ['findex.pipeline'],
+    'drop_rename': ['findex.pipeline'],
+    'filter': ['findex.pipeline'],
+    'describe': ['findex.pipeline'],
+    'fit_pooled': ['findex.pipeline', 'findex.spec_grid', 'findex.results_store'],
+    'fit_per_country': ['findex.pipeline', 'findex.spec_grid', 'findex.results_store'],
+    'plot': ['findex.pipeline', 'findex.plots', 'matplotlib.pyplot', 'seaborn'],
+}
+
+# What every numbered script imported before any work started
+EAGER_MODULES = ['pandas', 'numpy', 'statsmodels.formula.api', 'matplotlib.pyplot', 'seaborn']
+
+# File names of the describe outputs (as in step 5), written to paths.output_dir
+DESCRIPTION_FILES = {
+    'overall': 'descriptive_overall.csv',
+    'correlation': 'correlation_matrix_overall.csv',
+    'country_means': 'country_means.csv',
+}
+
+
+# Subsample of --dev when the config has no [dev] section
+DEFAULT_DEV_SAMPLE = {'fraction': 0.05, 'max_rows_per_country': 200}
+
+
+# ===================== CONFIG =====================
+
+def sampled_path(path):
+    """Path of the dev-mode version of an output file ('data.csv' -> 'data_sampled.csv')."""
+    root, ext = os.path.splitext(path)
+    return f"{root}_sampled{ext}"
+
+
+def load_config(path, dev=False):
+    """
+    Read a run config file (.toml, or .yaml/.yml) into (pipeline config, paths).
+
+    Sections: [waves] {path: year}, [paths] (merged, recoded, cleaned, regression, pooled, per_country,
+    results_db, output_dir), [model] (dependent_vars, explanatory_vars, fe_vars, variables_of_interest),
+    [sample] (min_credit_card_threshold, countries_to_exclude), [run] (n_workers) and [dev] (fraction,
+    max_rows_per_country, seed; only used with dev=True).
+    """
+    lower = str(path).lower()
+    if lower.endswith(('.yaml', '.yml')):
+        import yaml  # optional: only needed for YAML configs
+        with open(path, encoding='utf-8') as f:
+            raw = yaml.safe_load(f) or {}
+    else:
+        try:
+            import tomllib
+        except ModuleNotFoundError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            raw = tomllib.load(f)
+
+    unknown = set(raw) - {'waves', 'paths', 'model', 'sample', 'run', 'dev'}
+    if unknown:
+        raise ValueError(f"{path}: unknown config section(s): {sorted(unknown)}")
+
+    config = {'waves': {str(p): int(year) for p, year in raw.get('waves', {}).items()}}
+    for section in ('model', 'sample', 'run'):
+        config.update(raw.get(section, {}))
+    if dev:
+        config['dev_sample'] = dict(raw.get('dev') or DEFAULT_DEV_SAMPLE)
+    return config, dict(raw.get('paths', {}))
+
+
+# ===================== STAGE I/O =====================
+
+def _read_frame(path):
+    import pandas as pd
+    if path.lower().endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, encoding='utf-8')
+
+
+def _write_frame(df, path):
+    if path.lower().endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8')
+    print(f"  Saved {len(df)} rows to {path}")
+
+
+def _input_path(session, path):
+    """In dev mode, the '_sampled' output of an earlier --dev call when there is one (already the subsample)."""
+    if session.config.get('dev_sample') and os.path.exists(sampled_path(path)):
+        session.sampled = True
+        return sampled_path(path)
+    return path
+
+
+def _output_path(session, path):
+    return sampled_path(path) if session.sampled else path
+
+
+def _load_input(session, stage, paths):
+    """Put the stage's input into the session from its configured file, unless an earlier stage made it."""
+    name = STAGE_IO[stage][0]
+    if stage == 'plot':
+        # Plots use whatever is available: country means of describe, per-country fits
+        if 'description' not in session.data and paths.get('output_dir'):
+            means = _input_path(session, os.path.join(paths['output_dir'], DESCRIPTION_FILES['country_means']))
+            if os.path.exists(means):
+                session.data['description'] = {'country_means': _read_frame(means)}
+        if 'per_country' not in session.data and paths.get('per_country'):
+            per_country = _input_path(session, paths['per_country'])
+            if os.path.exists(per_country):
+                session.data['per_country'] = _read_frame(per_country)
+        return
+    if name is None or name in session.data:
+        return
+    if not paths.get(name):
+        raise SystemExit(f"ERROR: stage '{stage}' needs '{name}': run the earlier stage in the same call "
+                         f"or set paths.{name} in the config")
+    path = _input_path(session, paths[name])
+    print(f"  Reading {name} from {path}")
+    session.data[name] = _read_frame(path)
+
+
+def _save_output(session, stage, paths):
+    name = STAGE_IO[stage][1]
+    output = session.data[name]
+    if name == 'description':
+        if paths.get('output_dir'):
+            for key, file_name in DESCRIPTION_FILES.items():
+                target = _output_path(session, os.path.join(paths['output_dir'], file_name))
+                output[key].to_csv(target, index=(key != 'country_means'))
+                print(f"  Saved {key} to {target}")
+    elif name == 'figures':
+        if paths.get('output_dir'):
+            for fig_name, fig in output.items():
+                target = _output_path(session, os.path.join(paths['output_dir'], f"{fig_name}.png"))
+                fig.savefig(target, dpi=300, bbox_inches='tight')
+                print(f"  Saved figure to {target}")
+    elif paths.get(name):
+        _write_frame(output, _output_path(session, paths[name]))
+
+
+def run_stages(stages, config, paths):
+    """Run the stages in order in one Session; returns the session."""
+    from findex.pipeline import Session
+
+    store = None
+    if paths.get('results_db') and any(stage.startswith('fit_') for stage in stages):
+        from findex.results_store import ResultsStore
+        store = ResultsStore(sampled_path(paths['results_db']) if config.get('dev_sample') else paths['results_db'])
+    session = Session(config, store=store)
+    try:
+        for stage in stages:
+            start = time.perf_counter()
+            print(f"[{stage}]")
+            _load_input(session, stage, paths)
+            getattr(session, stage)()
+            _save_output(session, stage, paths)
+            print(f"  {stage} finished in {time.perf_counter() - start:.2f}s")
+    finally:
+        if store is not None:
+            store.close()
+    return session
+
+
+# ===================== IMPORT BENCHMARK =====================
+
+def import_stage_modules(stage):
+    """Import the modules of one subcommand (or EAGER_MODULES for 'eager')."""
+    import importlib
+    for module in (EAGER_MODULES if stage == 'eager' else STAGE_MODULES[stage]):
+        importlib.import_module(module)
+
+
+def bench_imports(repeat=5):
+    """
+    Cold-start import time of each subcommand, each measured in fresh interpreters (best of repeat).
+
+    Returns {subcommand: seconds}; 'eager' is the import block of the numbered scripts, 'cli' the start-up
+    of this entry point alone.
+    """
+    code = ("import time; t = time.perf_counter(); import findex.cli as cli; {call}; "
+            "print(time.perf_counter() - t)")
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = {}
+    for name in ['cli'] + list(STAGE_MODULES) + ['eager']:
+        call = 'pass' if name == 'cli' else f"cli.import_stage_modules({name!r})"
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', code.format(call=call)], cwd=package_dir,
+                                 capture_output=True, text=True, check=True)
+            runs.append(float(out.stdout.strip().splitlines()[-1]))
+        timings[name] = min(runs)
+    return timings
+
+
+# ===================== MAIN =====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m findex', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', help='run config file (.toml, .yaml or .yml)')
+    parser.add_argument('--dev', action='store_true',
+                        help="run on the stratified subsample of the [dev] section; outputs get a '_sampled' suffix")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for stage in STAGE_IO:
+        commands.add_parser(stage.replace('_', '-'), help=f"run the {stage} stage")
+    run_parser = commands.add_parser('run', help='run several stages in one process (default: all)')
+    run_parser.add_argument('stages', nargs='*', help='stages in order, e.g. filter fit-pooled')
+    bench_parser = commands.add_parser('bench-imports', help='cold-start import time per subcommand')
+    bench_parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench-imports':
+        timings = bench_imports(args.repeat)
+        print(f"{'Subcommand':<18}{'Import time (ms)':>18}")
+        for name, seconds in timings.items():
+            print(f"{name:<18}{seconds * 1000:>18.1f}")
+        return 0
+
+    if not args.config:
+        parser.error('--config is required for the pipeline stages')
+    config, paths = load_config(args.config, dev=args.dev)
+    if args.command == 'run':
+        stages = [stage.replace('-', '_') for stage in args.stages] or list(STAGE_IO)
+        unknown = [stage for stage in stages if stage not in STAGE_IO]
+        if unknown:
+            parser.error(f"unknown stage(s): {unknown}; stages are {', '.join(STAGE_IO)}")
+    else:
+        stages = [args.command.replace('-', '_')]
+    run_stages(stages, config, paths)
+    return 0
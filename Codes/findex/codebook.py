@@ -0,0 +1,178 @@
+"""
+Codebook of the data preparation (steps 1-5): which survey columns are read, how they are recoded,
+renamed and which countries are left out (the credit card threshold of step 5 stays a script setting). The numbered scripts and the fused ETL plan share it.
+"""
+
+# Step 1: survey columns read from each wave
+columns_to_keep = [
+    "economy", "economycode", "regionwb", "pop_adult", "wpid_random", "wgt", "female", "age", "educ", "inc_q", "emp_in",
+    "account_fin", "account_mob", "account", "borrowed", "saved", "receive_wages", "receive_transfers", "receive_pension",
+    "receive_agriculture", "pay_utilities", "remittances", "mobileowner", "fin2", "fin4", "fin5", "fin6", "fin7", "fin8",
+    "fin9", "fin10", "fin11a", "fin11b", "fin11c", "fin11d", "fin11e", "fin11f", "fin11g", "fin11h", "fin14a", "fin14b",
+    "fin14c", "fin16", "fin17a", "fin17b", "fin20", "fin22a", "fin22b", "fin22c", "fin24", "fin26", "fin27c1", "fin27c2",
+    "fin28", "fin29c1", "fin29c2", "fin30", "fin31a", "fin31b", "fin31c", "fin32", "fin33", "fin34a", "fin34b", "fin35",
+    "fin37", "fin38", "fin39a", "fin39b", "fin42", "fin43a", "fin43b", "fin45"
+]
+
+# Step 2: recoding of the survey answers ("NA" = missing)
+recoding_dict = {
+    "female": {1: "1", 2: "0"},
+    "emp_in": {1: "1", 2: "0"},
+    "educ": {1: "0", 2: "0", 3: "1"},
+    "fin16": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin17a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin17b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin20": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin22a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin22b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin22c": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin32": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin33": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin34a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin34b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin35": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin37": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin38": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin39a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin39b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin42": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin43a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin43b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "receive_wages": {1: "1", 2: "1", 3: "1", 4: "0", 5: "NA"},
+    "receive_transfers": {1: "1", 2: "1", 3: "1", 4: "0", 5: "NA"},
+    "receive_pension": {1: "1", 2: "1", 3: "1", 4: "0", 5: "NA"},
+    "receive_agriculture": {1: "1", 2: "1", 3: "1", 4: "0", 5: "NA"},
+    "mobileowner": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin5": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin6": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin14a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin14b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin31b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin2": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin4": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin7": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin8": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin9": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin10": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11b": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11c": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11d": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11e": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11f": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11g": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin11h": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin31a": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin26": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin27c1": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin27c2": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin28": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin29c1": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin29c2": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin30": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "fin31c": {1: "1", 2: "0", 3: "NA", 4: "NA"},
+    "remittances": {1: "1", 2: "1", 3: "1", 4: "1", 5: "0", 6: "NA"},
+    "pay_utilities": {1: "1", 2: "0", 3: "0", 4: "0", 5: "NA"},
+}
+
+# Step 2: categorical answers split into binary variables {new variable: (source column, mapping)}
+derived_variables = {
+    "worried_old_age": ("fin45", {1: "1", 2: "0", 3: "0", 4: "0", 5: "NA", 6: "NA"}),
+    "worried_medical_costs": ("fin45", {1: "0", 2: "1", 3: "0", 4: "0", 5: "NA", 6: "NA"}),
+    "worried_monthly_expenses": ("fin45", {1: "0", 2: "0", 3: "1", 4: "0", 5: "NA", 6: "NA"}),
+    "worried_education_fees": ("fin45", {1: "0", 2: "0", 3: "0", 4: "1", 5: "NA", 6: "NA"}),
+    "inc_q_1": ("inc_q", {1: "1", 2: "0", 3: "0", 4: "0", 5: "0"}),
+    "inc_q_2": ("inc_q", {1: "0", 2: "1", 3: "0", 4: "0", 5: "0"}),
+    "inc_q_3": ("inc_q", {1: "0", 2: "0", 3: "1", 4: "0", 5: "0"}),
+    "inc_q_4": ("inc_q", {1: "0", 2: "0", 3: "0", 4: "1", 5: "0"}),
+    "inc_q_5": ("inc_q", {1: "0", 2: "0", 3: "0", 4: "0", 5: "1"}),
+    "fin14c_online": ("fin14c", {1: "1", 2: "0", 3: "0", 4: "NA", 5: "NA"}),
+    "fin14c_cash": ("fin14c", {1: "0", 2: "1", 3: "0", 4: "NA", 5: "NA"}),
+    "fin14c_both": ("fin14c", {1: "0", 2: "0", 3: "1", 4: "NA", 5: "NA"}),
+    "fin24_savings": ("fin24", {1: "1", 2: "0", 3: "0", 4: "0", 5: "0", 6: "0", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_family": ("fin24", {1: "0", 2: "1", 3: "0", 4: "0", 5: "0", 6: "0", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_work": ("fin24", {1: "0", 2: "0", 3: "1", 4: "0", 5: "0", 6: "0", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_borrowings": ("fin24", {1: "0", 2: "0", 3: "0", 4: "1", 5: "0", 6: "0", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_sale": ("fin24", {1: "0", 2: "0", 3: "0", 4: "0", 5: "1", 6: "0", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_other": ("fin24", {1: "0", 2: "0", 3: "0", 4: "0", 5: "0", 6: "1", 7:"0", 8: "NA", 9: "NA"}),
+    "fin24_no": ("fin24", {1: "0", 2: "0", 3: "0", 4: "0", 5: "0", 6: "0", 7:"1", 8: "NA", 9: "NA"}),
+}
+
+# Step 4: survey column -> analysis name
+column_mapping = {
+    'saved': 'saved',
+    'fin17a': 'saved_account',
+    'fin16': 'saved_retirement',
+    'fin2': 'has_debit_card',
+    'fin7': 'has_credit_card',
+    'female': 'female',
+    'age': 'age',
+    'educ': 'higher_educ',
+    'emp_in': 'employed',
+    'inc_q_1': 'inc_quint1',
+    'inc_q_2': 'inc_quint2',
+    'inc_q_3': 'inc_quint3',
+    'inc_q_4': 'inc_quint4',
+    'inc_q_5': 'inc_quint5',
+    'fin32': 'recv_wage',
+    'fin37': 'recv_govt_trans',
+    'fin38': 'recv_pension',
+    'borrowed': 'borrowed',
+    'mobileowner': 'has_mobile',
+    'fin30': 'paid_utility',
+    'fin14a': 'paid_bills_online',
+    'fin14b': 'bought_online',
+    'Year': 'year',
+    'wgt': 'wgt',  # Findex survey weight, used by the weighted logits in steps 6 and 7
+    'regionwb': 'regionwb'  # World Bank region, a grouping key of the grouped regressions (step 20)
+}
+
+# Step 4: countries excluded because of problems they cause for regressions (due to NAs)
+countries_to_exclude = [
+    'TTO',  # Trinidad and Tobago
+    'MOZ',  # Mozambique
+    'BLR',  # Belarus
+    'SWZ',  # Eswatini
+    'LUX',  # Luxembourg
+    'MNE',  # Montenegro
+    'LBY',  # Libya
+    'KWT',  # Kuwait
+    'BHR',  # Bahrain
+    'ARE',  # United Arab Emirates
+    'ISL',  # Iceland
+    'JAM'   # Jamaica
+]
+
+# Validation (findex.validation), checked in the same pass as the recoding of step 2.
+# The codes of recoding_dict and derived_variables are allowed for their columns; codes listed under
+# missing_codes are known non-answers (don't know, refused) that are allowed and become missing.
+missing_codes = {
+    "educ": [4, 5],
+}
+
+# Allowed codes of columns that are used as they are (not recoded)
+allowed_codes = {
+    "saved": [0, 1],
+    "borrowed": [0, 1],
+    "account": [0, 1],
+    "account_fin": [0, 1],
+    "account_mob": [0, 1],
+    "inc_q": [1, 2, 3, 4, 5],
+}
+
+# Allowed value ranges (inclusive, None = open)
+value_ranges = {
+    "age": (15, 100),
+    "wgt": (0, None),
+}
+
+# Survey columns behind the analysis variables of column_mapping (a split variable counts as its source column);
+# the other columns of columns_to_keep may be missing from a wave's questionnaire
+analysis_columns = [col for col in dict.fromkeys(derived_variables[name][0] if name in derived_variables else name
+                                                 for name in column_mapping) if col in columns_to_keep]
+
+# Columns that must have answers in every wave (per wave, by year)
+required_per_wave = {
+    2017: analysis_columns,
+    2021: analysis_columns,
+}
@@ -0,0 +1,140 @@
+"""
+Aggregation cube: counts, sums and weighted sums of the analysis indicators per cell of the strata.
+
+One pass over the respondent rows adds up, for every (country, year, region, sex, income quintile,
+education) cell and every indicator, the number of non-missing answers, their sum and sum of squares,
+and the survey-weighted count and sum. Any mean or share by any subset of the strata (or overall), raw or
+weighted, and with any filter on the strata, is then a sum over cells instead of a new scan of the rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Strata of the cube (columns of the step 4 data; 'inc_quint' is built from the quintile dummies)
+CUBE_DIMENSIONS = ['economycode', 'year', 'regionwb', 'female', 'inc_quint', 'higher_educ']
+
+QUINTILE_VARS = ['inc_quint1', 'inc_quint2', 'inc_quint3', 'inc_quint4', 'inc_quint5']
+
+
+def income_quintile(df, quintile_vars=QUINTILE_VARS):
+    """Income quintile (1-5) from the quintile dummies; NaN where a dummy is missing."""
+    quintiles = df[quintile_vars]
+    return pd.Series(np.where(quintiles.notna().all(axis=1), quintiles.fillna(0).to_numpy().argmax(axis=1) + 1,
+                              np.nan), index=df.index, name='inc_quint')
+
+
+def _whole_number_dimensions(df, dimensions):
+    """Float dimensions holding whole numbers (e.g. 0/1 with missing values) as nullable integers, for labels."""
+    for dim in dimensions:
+        values = df[dim]
+        if pd.api.types.is_float_dtype(values) and np.all(np.mod(values.dropna(), 1) == 0):
+            df[dim] = values.astype('Int64')
+    return df
+
+
+class AggregationCube:
+    """
+    Cells of the cube: one row per observed combination of the dimensions (missing values are a cell of
+    their own) with the row count, the weight total and the measures of every indicator as
+    '<indicator>|<measure>' columns.
+    """
+
+    def __init__(self, cells, dimensions, variables):
+        self.cells = cells
+        self.dimensions = list(dimensions)
+        self.variables = list(variables)
+
+    @classmethod
+    def from_frame(cls, df, variables=None, dimensions=CUBE_DIMENSIONS, weight_var='wgt'):
+        """
+        Build the cube from respondent rows in one grouped pass.
+
+        variables defaults to every numeric column other than the weight and the year. Without the weight
+        column, the weighted measures use a weight of 1.
+        """
+        df = df.copy()
+        if 'inc_quint' in dimensions and 'inc_quint' not in df.columns:
+            df['inc_quint'] = income_quintile(df)
+        missing = [col for col in dimensions if col not in df.columns]
+        if missing:
+            raise KeyError(f"Dimensions of the cube are missing from the data: {missing}")
+        if variables is None:
+            variables = [col for col in df.select_dtypes(include=[np.number]).columns
+                         if col not in (weight_var, 'year', 'inc_quint')]
+        weights = (df[weight_var].to_numpy(dtype=np.float64) if weight_var in df.columns
+                   else np.ones(len(df)))
+
+        measures = {'rows': np.ones(len(df)), 'weight': weights}
+        for var in variables:
+            values = df[var].to_numpy(dtype=np.float64)
+            answered = ~np.isnan(values)
+            filled = np.where(answered, values, 0.0)
+            measures.update({
+                f"{var}|count": answered.astype(np.float64),
+                f"{var}|sum": filled,
+                f"{var}|sumsq": filled * filled,
+                f"{var}|wcount": np.where(answered, weights, 0.0),
+                f"{var}|wsum": filled * weights,
+            })
+        keys = _whole_number_dimensions(df[list(dimensions)].copy(), dimensions)
+        frame = pd.DataFrame(measures, index=pd.MultiIndex.from_frame(keys))
+        cells = frame.groupby(level=list(range(len(dimensions))), dropna=False, sort=True).sum()
+        return cls(cells.reset_index(), dimensions, variables)
+
+    @classmethod
+    def read(cls, path):
+        """Load a cube written by write()."""
+        cells = pd.read_csv(path)
+        variables = list(dict.fromkeys(col.split('|')[0] for col in cells.columns if '|' in col))
+        dimensions = [col for col in cells.columns if '|' not in col and col not in ('rows', 'weight')]
+        return cls(_whole_number_dimensions(cells, dimensions), dimensions, variables)
+
+    def write(self, path):
+        self.cells.to_csv(path, index=False)
+
+    # ----- queries -----
+
+    def _select(self, where):
+        """Cells matching {dimension: value or list of values}."""
+        cells = self.cells
+        for dim, values in (where or {}).items():
+            values = values if isinstance(values, (list, tuple, set, np.ndarray, pd.Index)) else [values]
+            cells = cells[cells[dim].isin(list(values))]
+        return cells
+
+    def totals(self, by=(), where=None):
+        """Summed cells by the given dimensions (all cells for by=()), with the filter where applied."""
+        cells = self._select(where)
+        measures = cells.drop(columns=self.dimensions)
+        if not by:
+            return measures.sum().to_frame().T
+        return measures.groupby([cells[dim] for dim in by], dropna=False, sort=True).sum()
+
+    def mean(self, variables=None, by=(), where=None, weighted=False):
+        """
+        Mean (share, for 0/1 indicators) of each variable by the given dimensions, over the non-missing
+        answers; weighted uses the survey weights.
+        """
+        variables = self.variables if variables is None else list(variables)
+        totals = self.totals(by, where)
+        numerator, denominator = ('wsum', 'wcount') if weighted else ('sum', 'count')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = pd.DataFrame({var: totals[f"{var}|{numerator}"] / totals[f"{var}|{denominator}"]
+                                  for var in variables}, index=totals.index)
+        return means
+
+    def count(self, variables=None, by=(), where=None):
+        """Number of non-missing answers of each variable by the given dimensions."""
+        variables = self.variables if variables is None else list(variables)
+        totals = self.totals(by, where)
+        return pd.DataFrame({var: totals[f"{var}|count"].astype(np.int64) for var in variables}, index=totals.index)
+
+    def std(self, variables=None, by=(), where=None):
+        """Sample standard deviation of each variable by the given dimensions (unweighted)."""
+        variables = self.variables if variables is None else list(variables)
+        totals = self.totals(by, where)
+        result = {}
+        for var in variables:
+            n, s, ss = totals[f"{var}|count"], totals[f"{var}|sum"], totals[f"{var}|sumsq"]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[var] = np.sqrt(((ss - s * s / n) / (n - 1)).clip(lower=0))
+        return pd.DataFrame(result, index=totals.index)
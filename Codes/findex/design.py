@@ -0,0 +1,139 @@
+"""
+Design matrix encoded once per dataset and shared by every (dv, group) model of a run.
+
+The regressor matrix (Intercept, fixed-effect dummies, regressors; same column names and order as the
+patsy formulas of steps 6 and 7) is built once as one float64 array. The dependent variables only differ
+in their missing rows, so each model takes a row mask of the shared matrix instead of parsing a formula
+and copying a DataFrame. With a group variable the rows are sorted by group (stably), so a group's rows are
+one contiguous slice: when none of them are missing the model's X is a view of the shared array.
+
+Within a model's rows, dummies of absent levels are left out and, when the reference level is absent, the
+first present level becomes the reference (as patsy does on the group's own data), so the models match the
+formula fits of the scripts. A regressor with no variation in the rows (e.g. female within the women) is
+left out too, and reported as not estimated, instead of making the fit singular. The same rule picks the
+columns of every estimator built on this design (steps 6 and 7, findex.spec_grid and findex.pipeline).
+"""
+import numpy as np
+import pandas as pd
+
+
+def encode_design(df, explanatory_vars, fe_vars=(), dependent_vars=(), group_var=None, weight_var=None):
+    """
+    Encode the regressors of all models once.
+
+    Returns a dict with X (n x k), names, the FE blocks, integer codes of every FE/group variable, the
+    outcome of each DV, the rows complete in the regressors (and weights), and, with group_var, the
+    contiguous row range of each group.
+    """
+    fe_vars = list(fe_vars)
+    code_vars = list(dict.fromkeys(fe_vars + ([group_var] if group_var else [])))
+    missing = [col for col in list(explanatory_vars) + code_vars + list(dependent_vars)
+               + ([weight_var] if weight_var else []) if col not in df.columns]
+    if missing:
+        raise KeyError(f"Columns of the design are missing from the data: {missing}")
+
+    codes, levels = {}, {}
+    for var in code_vars:
+        categories = pd.Categorical(df[var])
+        codes[var] = categories.codes.astype(np.int32)
+        levels[var] = list(categories.categories)
+
+    order = np.arange(len(df))
+    if group_var:
+        order = np.argsort(codes[group_var], kind='stable')
+        codes = {var: c[order] for var, c in codes.items()}
+
+    n = len(df)
+    regressors = df[list(explanatory_vars)].to_numpy(dtype=np.float64)[order]
+    names = ['Intercept']
+    fe_blocks = {}
+    k_fe = sum(max(len(levels[fe]) - 1, 0) for fe in fe_vars)
+    X = np.empty((n, 1 + k_fe + regressors.shape[1]))
+    X[:, 0] = 1.0
+    col = 1
+    for fe in fe_vars:
+        block = slice(col, col + len(levels[fe]) - 1)
+        for j, level in enumerate(levels[fe][1:], start=1):
+            X[:, col] = codes[fe] == j
+            names.append(f"C({fe})[T.{level}]")
+            col += 1
+        fe_blocks[fe] = block
+    X[:, col:] = regressors
+    names += list(explanatory_vars)
+    regressor_block = slice(col, X.shape[1])
+
+    complete = ~np.isnan(regressors).any(axis=1)
+    for var in fe_vars:
+        complete &= codes[var] >= 0
+    weights = None
+    if weight_var:
+        weights = df[weight_var].to_numpy(dtype=np.float64)[order]
+        complete &= ~np.isnan(weights)
+
+    design = {
+        'X': X, 'names': names, 'fe_blocks': fe_blocks, 'regressors': regressor_block, 'codes': codes, 'levels': levels,
+        'y': {dv: df[dv].to_numpy(dtype=np.float64)[order] for dv in dependent_vars},
+        'complete': complete, 'weights': weights, 'order': order, 'group_var': group_var,
+    }
+    if group_var:
+        counts = np.bincount(codes[group_var][codes[group_var] >= 0], minlength=len(levels[group_var]))
+        # Rows with a missing group code sort first
+        start = int(np.sum(codes[group_var] < 0))
+        ends = start + np.cumsum(counts)
+        design['group_rows'] = {str(level): slice(int(end - count), int(end))
+                                for level, count, end in zip(levels[group_var], counts, ends)}
+    return design
+
+
+def model_rows(design, dv, group=None):
+    """Rows of one (dv, group) model: a slice (view) when no row of the range is missing, else an index array."""
+    rows = design['group_rows'][str(group)] if group is not None else slice(0, len(design['complete']))
+    valid = design['complete'][rows] & ~np.isnan(design['y'][dv][rows])
+    if valid.all():
+        return rows
+    return np.arange(rows.start, rows.stop)[valid]
+
+
+def model_columns(design, rows, columns=None):
+    """
+    Columns of a model on these rows, out of the given design columns (default all): the intercept, the
+    regressors that vary in these rows and the dummies of the FE levels present other than the reference (the
+    first present level when the global reference is absent).
+    """
+    keep = np.zeros(len(design['names']), dtype=bool)
+    keep[slice(None) if columns is None else columns] = True
+    for fe, block in design['fe_blocks'].items():
+        if not keep[block].any():
+            continue
+        present = np.unique(design['codes'][fe][rows])
+        level_present = np.zeros(block.stop - block.start + 1, dtype=bool)
+        level_present[present] = True
+        if not level_present[0]:
+            level_present[present[0]] = False  # first present level becomes the reference
+        keep[block] &= level_present[1:]
+    regressors = np.flatnonzero(keep[design['regressors']]) + design['regressors'].start
+    if regressors.size:
+        values = design['X'][rows][:, regressors] if isinstance(rows, slice) else design['X'][np.ix_(rows, regressors)]
+        keep[regressors] = values.min(axis=0) < values.max(axis=0)
+    return np.flatnonzero(keep)
+
+
+def model_data(design, dv, group=None):
+    """
+    (y, X, weights) of one model as pandas objects over the shared arrays, named as the formula fits.
+
+    X is a view of the shared matrix when the rows are a contiguous range and all columns are kept; it is
+    only copied (this model's rows or columns) otherwise. weights is None without a weight variable.
+    """
+    rows = model_rows(design, dv, group)
+    X = design['X'][rows]
+    names = design['names']
+    if len(X):
+        columns = model_columns(design, rows)
+        if columns.size < X.shape[1]:
+            X = X[:, columns]
+            names = [names[i] for i in columns]
+    y = pd.Series(design['y'][dv][rows], name=dv)
+    X = pd.DataFrame(X, columns=names, copy=False)
+    weights = design['weights'][rows] if design['weights'] is not None else None
+    return y, X, weights
@@ -0,0 +1,240 @@
+"""
+Lazy, fused version of the data preparation (steps 1-5) as one query plan.
+
+A plan is a list of steps (read, recode, rename, select, filter, country threshold, materialize) that is
+only executed by collect(). Before running, optimized() rewrites it:
+
+* projection pushdown: walking back from the final columns, each step only keeps the columns later steps
+  use, so the waves are read with just those columns and only they are decoded;
+* predicate pushdown: row filters on columns that no step changes (e.g. the excluded countries) are moved
+  up to the read, so excluded rows are dropped before any decoding.
+
+A materialize step writes the data at that point to a file and acts as a barrier: filters are not moved
+above it and projections do not pass through it, so the file holds the same rows and columns as the
+step-by-step pipeline at that point.
+"""
+
+from findex.ingest import read_waves
+from findex.validation import decode_and_validate, integer_columns
+
+
+class ETLPlan:
+    """Lazy query plan over the survey waves."""
+
+    def __init__(self, steps=None):
+        self.steps = list(steps or [])
+
+    def _add(self, kind, **args):
+        return ETLPlan(self.steps + [dict(args, kind=kind)])
+
+    # ----- building the plan -----
+
+    def read(self, sources, columns, year_column='Year'):
+        """Read the waves {path: year} (only columns from the given list, see findex.ingest) and stack them."""
+        return self._add('read', sources=dict(sources), columns=list(columns), year_column=year_column)
+
+    def recode(self, recoding, derived=None, checks=None):
+        """
+        Recode columns {column: mapping} and add split variables {new: (source, mapping)}, as step 2.
+
+        checks: optional missing_codes / allowed_codes / value_ranges / required_per_wave of findex.validation, run
+        in the same pass.
+        """
+        return self._add('recode', recoding=dict(recoding), derived=dict(derived or {}), checks=dict(checks or {}))
+
+    def rename(self, mapping):
+        """Rename columns {old: new}."""
+        return self._add('rename', mapping=dict(mapping))
+
+    def select(self, columns):
+        """Keep these columns, in this order."""
+        return self._add('select', columns=list(columns))
+
+    def exclude(self, column, values):
+        """Drop the rows whose column value is in values."""
+        return self._add('exclude', column=column, values=list(values))
+
+    def country_threshold(self, country_column, column, threshold):
+        """Keep countries whose mean of column is at least threshold, as step 5."""
+        return self._add('threshold', country_column=country_column, column=column, threshold=threshold)
+
+    def materialize(self, path):
+        """Write the data at this point of the plan to a CSV file."""
+        return self._add('materialize', path=path)
+
+    # ----- optimisation -----
+
+    @staticmethod
+    def _outputs(step):
+        """Columns a step creates or changes (filters cannot move above it if they use one of them)."""
+        if step['kind'] == 'recode':
+            return set(step['recoding']) | set(step['derived'])
+        if step['kind'] == 'rename':
+            return set(step['mapping'].values()) | set(step['mapping'])
+        return set()
+
+    def _push_down_predicates(self, steps):
+        """Move exclude filters up to right after the read, translating column names through renames."""
+        steps = [dict(step) for step in steps]
+        i = 0
+        while i < len(steps):
+            step = steps[i]
+            if step['kind'] != 'exclude':
+                i += 1
+                continue
+            j = i
+            column = step['column']
+            while j > 0 and steps[j - 1]['kind'] in ('recode', 'rename', 'select'):
+                previous = steps[j - 1]
+                if previous['kind'] == 'rename':
+                    inverse = {new: old for old, new in previous['mapping'].items()}
+                    column = inverse.get(column, column)
+                elif column in self._outputs(previous):
+                    break
+                j -= 1
+            moved = dict(step, column=column)
+            del steps[i]
+            steps.insert(j, moved)
+            i += 1
+        return steps
+
+    @staticmethod
+    def _push_down_projections(steps):
+        """Walk back from the end and keep in every step only the columns used afterwards."""
+        required = None  # None = all columns
+        out = []
+        for step in reversed(steps):
+            step = dict(step)
+            kind = step['kind']
+            if kind == 'select':
+                required = set(step['columns']) if required is None else required & set(step['columns'])
+                step['columns'] = [c for c in step['columns'] if c in required]
+            elif kind == 'rename':
+                if required is not None:
+                    inverse = {new: old for old, new in step['mapping'].items()}
+                    step['mapping'] = {old: new for old, new in step['mapping'].items() if new in required}
+                    required = {inverse.get(c, c) for c in required}
+            elif kind == 'recode':
+                if required is not None:
+                    step['recoding'] = {c: m for c, m in step['recoding'].items() if c in required}
+                    step['derived'] = {c: d for c, d in step['derived'].items() if c in required}
+                    required = (required - set(step['derived'])) | {src for src, _ in step['derived'].values()}
+                    # Wave coverage is only required of the columns that are still read
+                    if 'required_per_wave' in step['checks']:
+                        step['checks'] = dict(step['checks'], required_per_wave={
+                            year: [c for c in columns if c in required]
+                            for year, columns in step['checks']['required_per_wave'].items()})
+            elif kind == 'exclude':
+                if required is not None:
+                    required = required | {step['column']}
+            elif kind == 'threshold':
+                if required is not None:
+                    required = required | {step['country_column'], step['column']}
+            elif kind == 'materialize':
+                # The file keeps every column, as the step-by-step file read by later scripts (e.g. step 3)
+                required = None
+            elif kind == 'read':
+                if required is not None:
+                    step['columns'] = [c for c in step['columns'] if c in required]
+            out.append(step)
+        return list(reversed(out))
+
+    def optimized(self):
+        """Plan with predicates and projections pushed down towards the read."""
+        segments, current = [], []
+        for step in self.steps:
+            current.append(step)
+            if step['kind'] == 'materialize':
+                segments.append(current)
+                current = []
+        segments.append(current)
+        # Filters stay within their segment, so materialized files keep the rows of the step-by-step pipeline
+        steps = [step for segment in segments for step in self._push_down_predicates(segment)]
+        return ETLPlan(self._push_down_projections(steps))
+
+    def explain(self):
+        """Readable listing of the plan steps."""
+        lines = []
+        for i, step in enumerate(self.steps, 1):
+            kind = step['kind']
+            if kind == 'read':
+                detail = f"{len(step['sources'])} file(s), {len(step['columns'])} column(s)"
+            elif kind == 'recode':
+                detail = f"{len(step['recoding'])} recoded, {len(step['derived'])} derived"
+            elif kind == 'rename':
+                detail = f"{len(step['mapping'])} column(s)"
+            elif kind == 'select':
+                detail = f"{len(step['columns'])} column(s)"
+            elif kind == 'exclude':
+                detail = f"{step['column']} not in {len(step['values'])} value(s)"
+            elif kind == 'threshold':
+                detail = f"mean {step['column']} by {step['country_column']} >= {step['threshold']}"
+            else:
+                detail = step['path']
+            lines.append(f"{i}. {kind}: {detail}")
+        return "\n".join(lines)
+
+    # ----- execution -----
+
+    def collect(self, optimize=True):
+        """Run the plan and return the resulting DataFrame."""
+        steps = self.optimized().steps if optimize else self.steps
+        df = None
+        fused = set()
+        for i, step in enumerate(steps):
+            kind = step['kind']
+            if i in fused:
+                continue
+            if kind == 'read':
+                # Exclude filters right after the read are applied to every wave as it is read
+                exclude = []
+                for j in range(i + 1, len(steps)):
+                    if steps[j]['kind'] != 'exclude':
+                        break
+                    exclude.append(steps[j])
+                    fused.add(j)
+                df = read_waves(step['sources'], step['columns'], year_column=step['year_column'])
+                for s in exclude:
+                    df = df[~df[s['column']].isin(s['values'])]
+            elif kind == 'recode':
+                # Only the checks of columns still in the plan run (projection pushdown applies to them too)
+                df, _ = decode_and_validate(df, step['recoding'], step['derived'], **step['checks'])
+                # Columns without missing values become integers, as in step 2's file
+                df = integer_columns(df, list(step['derived']) + list(step['recoding']))
+            elif kind == 'rename':
+                df = df.rename(columns=step['mapping'])
+            elif kind == 'select':
+                df = df[step['columns']]
+            elif kind == 'exclude':
+                df = df[~df[step['column']].isin(step['values'])]
+            elif kind == 'threshold':
+                share = df.groupby(step['country_column'])[step['column']].transform('mean')
+                df = df[share >= step['threshold']]
+            elif kind == 'materialize':
+                df.to_csv(step['path'], index=False, encoding='utf-8')
+        return df.reset_index(drop=True)
+
+
+def preparation_plan(sources, codebook, min_credit_card_threshold=0.10, materialize=None):
+    """
+    Steps 1-5 as one plan: read the waves, split and recode (step 2), rename, keep the analysis columns and
+    drop the excluded countries (step 4), keep countries above the credit card threshold (step 5).
+
+    materialize: optional {'data_recoded': path, 'data_cleaned': path} to also write those intermediates.
+    """
+    materialize = materialize or {}
+    plan = ETLPlan().read(sources, codebook.columns_to_keep)
+    plan = plan.recode(codebook.recoding_dict, codebook.derived_variables, checks={
+        'missing_codes': codebook.missing_codes,
+        'allowed_codes': codebook.allowed_codes,
+        'value_ranges': codebook.value_ranges,
+        'required_per_wave': codebook.required_per_wave,
+    })
+    if 'data_recoded' in materialize:
+        plan = plan.materialize(materialize['data_recoded'])
+    plan = plan.rename(codebook.column_mapping)
+    plan = plan.select(list(codebook.column_mapping.values()) + ['economycode'])
+    plan = plan.exclude('economycode', codebook.countries_to_exclude)
+    if 'data_cleaned' in materialize:
+        plan = plan.materialize(materialize['data_cleaned'])
+    return plan.country_threshold('economycode', 'has_credit_card', min_credit_card_threshold)
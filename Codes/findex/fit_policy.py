@@ -0,0 +1,119 @@
+"""Fit policy for logit models: Newton first, then fallback solvers, within a per-fit budget."""
+import time
+import warnings
+
+import numpy as np
+from statsmodels.tools.sm_exceptions import (
+    ConvergenceWarning, PerfectSeparationWarning, HessianInversionWarning
+)
+
+# ===================== SETTINGS =====================
+# Solvers are tried in this order until one converges
+SOLVER_CHAIN = ['newton', 'bfgs', 'lbfgs']
+
+# Maximum iterations allowed for each solver
+MAX_ITER = {
+    'newton': 35,
+    'bfgs': 200,
+    'lbfgs': 300,
+}
+
+# Wall-clock budget (seconds) for one model, shared by all solvers in the chain
+TIME_BUDGET_SECONDS = 20.0
+
+
+class FitBudgetExceeded(Exception):
+    """Raised from the solver callback when the wall-clock budget runs out."""
+
+
+# ===================== FUNCTIONS =====================
+
+def _is_usable(result):
+    """Check that a fitted result converged and has finite estimates and standard errors."""
+    if not result.mle_retvals.get('converged', False):
+        return False
+    if not np.all(np.isfinite(result.params)):
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return bool(np.all(np.isfinite(result.bse)))
+
+
+def fit_with_fallback(model, solver_chain=None, max_iter=None, time_budget=TIME_BUDGET_SECONDS, **fit_kwargs):
+    """
+    Fit a statsmodels likelihood model, falling back along the solver chain.
+
+    Returns (result, fit_info). result is None when no solver converged within the budget.
+    fit_info holds the method used, iterations, time, convergence flag, all attempts and any
+    warnings raised, so it can be stored next to the estimates. Extra keyword arguments
+    (e.g. cov_type, cov_kwds) are passed to every fit call.
+    """
+    solver_chain = solver_chain or SOLVER_CHAIN
+    max_iter = max_iter or MAX_ITER
+
+    start_time = time.perf_counter()
+    deadline = start_time + time_budget
+    attempts = []
+    warning_names = set()
+    total_iterations = 0
+    result = None
+    method_used = None
+    status = 'No Convergence'
+
+    for method in solver_chain:
+        if time.perf_counter() >= deadline:
+            status = 'Time Budget Exceeded'
+            break
+
+        iterations = [0]
+
+        def callback(params, *args):
+            iterations[0] += 1
+            if time.perf_counter() >= deadline:
+                raise FitBudgetExceeded()
+
+        caught = []
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always', ConvergenceWarning)
+                warnings.simplefilter('always', PerfectSeparationWarning)
+                warnings.simplefilter('always', HessianInversionWarning)
+                candidate = model.fit(
+                    method=method,
+                    maxiter=max_iter.get(method, 100),
+                    callback=callback,
+                    disp=False,
+                    **fit_kwargs
+                )
+        except FitBudgetExceeded:
+            attempts.append(f"{method}:{iterations[0]}:budget")
+            total_iterations += iterations[0]
+            status = 'Time Budget Exceeded'
+            break
+        except (np.linalg.LinAlgError, ValueError, OverflowError) as e:
+            attempts.append(f"{method}:{iterations[0]}:{type(e).__name__}")
+            total_iterations += iterations[0]
+            continue
+        finally:
+            # Also for failed attempts: their separation or Hessian warnings are the ones worth logging
+            warning_names.update(w.category.__name__ for w in caught)
+
+        total_iterations += iterations[0]
+        if _is_usable(candidate):
+            attempts.append(f"{method}:{iterations[0]}:ok")
+            result = candidate
+            method_used = method
+            status = 'OK'
+            break
+        attempts.append(f"{method}:{iterations[0]}:not converged")
+
+    fit_info = {
+        'Fit Status': status,
+        'Method': method_used if method_used else 'none',
+        'Iterations': total_iterations,
+        'Fit Time (s)': round(time.perf_counter() - start_time, 4),
+        'Converged': result is not None,
+        'Attempts': ';'.join(attempts),
+        'Warnings': ';'.join(sorted(warning_names)),
+    }
+    return result, fit_info
@@ -0,0 +1,275 @@
+"""
+Multiple imputation of the binary indicators by chained equations, with Rubin pooling of the model results.
+
+Steps 6 and 7 drop every row with a missing model variable. Here each binary variable with missing values
+is imputed in turn from a logit on the other variables (the current imputed values of the others, the
+complete variables and the country share of the variable), drawing the logit coefficients from their
+approximate posterior so the imputations carry the estimation uncertainty. M completed datasets are kept
+as deltas against the base data: the missing row positions of each variable once, plus one int8 vector of
+imputed values per imputation. The fits of the M datasets run in parallel workers that share the base data,
+and the estimates are combined with Rubin's rules.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from scipy import stats
+from scipy.special import expit, logit
+
+from findex.fe_logit import CountryFELogit
+from findex.fit_policy import fit_with_fallback
+from findex.lpm import country_blocks
+
+# Worker-side copies of the base data and the imputations (set once per worker process)
+_BASE = None
+_IMPUTATIONS = None
+
+
+# ===================== IMPUTATION =====================
+
+def _logit_irls(X, y, maxiter=25, tol=1e-8):
+    """Plain logit by IRLS, returning the coefficients and their covariance (inverse information)."""
+    beta = np.zeros(X.shape[1])
+    for _ in range(maxiter):
+        p = expit(X @ beta)
+        # Small ridge keeps separated or collinear imputation models solvable
+        H = (X * (p * (1 - p))[:, None]).T @ X + 1e-6 * np.eye(X.shape[1])
+        step = np.linalg.solve(H, X.T @ (y - p))
+        beta += step
+        if np.max(np.abs(step)) < tol:
+            break
+    p = expit(X @ beta)
+    H = (X * (p * (1 - p))[:, None]).T @ X + 1e-6 * np.eye(X.shape[1])
+    return beta, np.linalg.inv(H)
+
+
+def chained_imputation(df, impute_vars, predictor_vars, country_var='economycode', m=5, n_cycles=10, seed=0):
+    """
+    Impute the binary impute_vars M times by chained equations.
+
+    predictor_vars must be complete; rows where one of them is missing keep their missing values.
+    Returns {'rows': {var: row positions}, 'values': [{var: int8 imputed values} per imputation], ...}.
+    """
+    impute_vars = [var for var in impute_vars if df[var].isna().any()]
+    predictor_vars = [var for var in predictor_vars if var not in impute_vars]
+    predictors = df[predictor_vars].to_numpy(dtype=np.float64)
+    usable = ~np.isnan(predictors).any(axis=1)
+
+    observed = {var: df[var].to_numpy(dtype=np.float64) for var in impute_vars}
+    rows = {var: np.flatnonzero(np.isnan(observed[var]) & usable).astype(np.int32) for var in impute_vars}
+    # Visit the variables from the least to the most missing, as usual for chained equations
+    order = sorted(impute_vars, key=lambda var: rows[var].size)
+
+    # Country share of each variable among observed rows (on the logit scale), a cheap stand-in for country FE
+    countries = df[country_var].astype(str).to_numpy()
+    country_share = {}
+    for var in impute_vars:
+        share = pd.Series(observed[var]).groupby(countries).mean()
+        overall = np.nanmean(observed[var])
+        values = share.reindex(countries).fillna(overall).to_numpy()
+        country_share[var] = logit(np.clip(values, 0.01, 0.99))
+
+    values_per_imputation = []
+    for i in range(m):
+        rng = np.random.default_rng([seed, i])
+        current = {var: observed[var][usable].copy() for var in impute_vars}
+        positions = {var: np.searchsorted(np.flatnonzero(usable), rows[var]) for var in impute_vars}
+
+        # Start from draws at the country share
+        for var in impute_vars:
+            p0 = expit(country_share[var][usable][positions[var]])
+            current[var][positions[var]] = rng.random(p0.size) < p0
+
+        for _ in range(n_cycles):
+            for var in order:
+                others = [current[other] for other in impute_vars if other != var]
+                X = np.column_stack([np.ones(usable.sum()), predictors[usable], *others, country_share[var][usable]])
+                miss = positions[var]
+                fit_rows = np.ones(X.shape[0], dtype=bool)
+                fit_rows[miss] = False
+                beta, cov = _logit_irls(X[fit_rows], current[var][fit_rows])
+                beta_draw = rng.multivariate_normal(beta, cov, method='cholesky')
+                p = expit(X[miss] @ beta_draw)
+                current[var][miss] = rng.random(miss.size) < p
+
+        values_per_imputation.append({var: current[var][positions[var]].astype(np.int8) for var in impute_vars})
+
+    return {'rows': rows, 'values': values_per_imputation, 'impute_vars': impute_vars, 'n_rows': len(df)}
+
+
+def completed_data(df, imputations, i, columns=None):
+    """Base data with imputation i applied (to the given columns only, by default all imputed variables)."""
+    columns = imputations['impute_vars'] if columns is None else [c for c in columns if c in imputations['rows']]
+    completed = df.copy()
+    for var in columns:
+        values = completed[var].to_numpy(dtype=np.float64, copy=True)
+        values[imputations['rows'][var]] = imputations['values'][i][var]
+        completed[var] = values
+    return completed
+
+
+def save_imputations(path, imputations):
+    """Store the deltas (row positions once, int8 values per imputation) in one compressed .npz file."""
+    arrays = {'n_rows': np.array(imputations['n_rows'])}
+    for var in imputations['impute_vars']:
+        arrays[f"rows/{var}"] = imputations['rows'][var]
+        arrays[f"values/{var}"] = np.vstack([values[var] for values in imputations['values']])
+    np.savez_compressed(path, **arrays)
+
+
+def load_imputations(path):
+    """Read imputations written by save_imputations."""
+    with np.load(path) as data:
+        impute_vars = [key.split('/', 1)[1] for key in data.files if key.startswith('rows/')]
+        rows = {var: data[f"rows/{var}"] for var in impute_vars}
+        stacked = {var: data[f"values/{var}"] for var in impute_vars}
+        m = next(iter(stacked.values())).shape[0] if stacked else 0
+        return {
+            'rows': rows,
+            'values': [{var: stacked[var][i] for var in impute_vars} for i in range(m)],
+            'impute_vars': impute_vars,
+            'n_rows': int(data['n_rows']),
+        }
+
+
+# ===================== RUBIN POOLING =====================
+
+def rubin_pool(estimates, variances, level=0.95):
+    """
+    Combine M estimates with Rubin's rules, elementwise over any trailing shape.
+
+    estimates, variances: arrays of shape (M, ...). Cells missing in any imputation stay NaN.
+    Returns a dict with the pooled estimate, within/between/total variance, degrees of freedom,
+    fraction of missing information and the t-based confidence bounds.
+    """
+    estimates = np.asarray(estimates, dtype=np.float64)
+    variances = np.asarray(variances, dtype=np.float64)
+    m = estimates.shape[0]
+
+    q_bar = estimates.mean(axis=0)
+    within = variances.mean(axis=0)
+    between = estimates.var(axis=0, ddof=1) if m > 1 else np.zeros_like(q_bar)
+    total = within + (1 + 1 / m) * between
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (1 + 1 / m) * between / within
+        dof = np.where(between > 0, (m - 1) * (1 + 1 / r) ** 2, np.inf)
+        fmi = (r + 2 / (dof + 3)) / (r + 1)
+    t = stats.t.ppf(0.5 + level / 2, dof)
+    se = np.sqrt(total)
+    return {'Estimate': q_bar, 'Within': within, 'Between': between, 'Total': total, 'SE': se,
+            'df': dof, 'FMI': fmi, 'Lower': q_bar - t * se, 'Upper': q_bar + t * se}
+
+
+# ===================== FITS PER IMPUTATION =====================
+
+def _fit_countries(data, dv, explanatory_vars, country_var, year_var, term):
+    """Step 7 logits for every country; returns (countries, coef, variance) of the term."""
+    blocks = country_blocks(data, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+    j = blocks['names'].index(term)
+    coef = np.full(len(blocks['countries']), np.nan)
+    variance = np.full(len(blocks['countries']), np.nan)
+    k_min = len(explanatory_vars) + (1 if year_var else 0) + 5
+    for g in range(len(blocks['countries'])):
+        n = blocks['n'][g]
+        X, y = blocks['Xp'][g, :n], blocks['yp'][g, :n]
+        if n < k_min or y.min() == y.max():
+            continue
+        # Regressors without variation in this country (e.g. a single wave) are left out, as in the formula fit
+        keep = np.ones(X.shape[1], dtype=bool)
+        keep[1:] = X[:, 1:].std(axis=0) > 0
+        if not keep[j]:
+            continue
+        try:
+            result, _ = fit_with_fallback(sm.Logit(y, X[:, keep]))
+        except Exception:
+            continue
+        if result is None:
+            continue
+        position = int(keep[:j].sum())
+        coef[g] = result.params[position]
+        variance[g] = result.cov_params()[position, position]
+    return blocks['countries'], coef, variance
+
+
+def fit_imputation(df, imputations, i, dependent_vars, explanatory_vars, country_var='economycode',
+                   year_var='year', term='has_credit_card'):
+    """
+    Fit the pooled FE model (step 6) and the country models (step 7) on completed dataset i.
+
+    Only the explanatory variables are filled in; rows with a missing DV are still dropped.
+    """
+    data = completed_data(df, imputations, i, columns=explanatory_vars)
+    fits = {}
+    for dv in dependent_vars:
+        model = CountryFELogit(data, dv, explanatory_vars, country_var=country_var, year_var=year_var)
+        pooled = model.fit()
+        countries, coef, variance = _fit_countries(data, dv, explanatory_vars, country_var, year_var, term)
+        fits[dv] = {
+            'names': model.slope_names,
+            'beta': pooled['beta'],
+            'variance': np.diagonal(pooled['cov']),
+            'nobs': pooled['nobs'],
+            'n_clusters': pooled['n_clusters'],
+            'countries': countries,
+            'country_coef': coef,
+            'country_variance': variance,
+        }
+    return fits
+
+
+def _init_worker(base, imputations):
+    """Keep the base data and the imputation deltas in the worker process for all of its tasks."""
+    global _BASE, _IMPUTATIONS
+    _BASE = base
+    _IMPUTATIONS = imputations
+
+
+def _fit_imputation_in_worker(i, *args):
+    """Fit one completed dataset against the worker's shared data."""
+    return fit_imputation(_BASE, _IMPUTATIONS, i, *args)
+
+
+def run_imputed_fits(df, imputations, dependent_vars, explanatory_vars, country_var='economycode',
+                     year_var='year', term='has_credit_card', n_workers=None):
+    """Fit all M completed datasets (in parallel unless n_workers=1); returns one fits dict per imputation."""
+    m = len(imputations['values'])
+    args = (dependent_vars, explanatory_vars, country_var, year_var, term)
+    n_workers = min(n_workers or os.cpu_count() or 1, m)
+    print(f"  Fitting {m} imputed datasets with {n_workers} worker(s)")
+
+    if n_workers == 1:
+        fits = []
+        for i in range(m):
+            fits.append(fit_imputation(df, imputations, i, *args))
+            print(f"  Finished imputation {i + 1}/{m}")
+        return fits
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(df, imputations)) as pool:
+        futures = [pool.submit(_fit_imputation_in_worker, i, *args) for i in range(m)]
+        fits = []
+        for i, future in enumerate(futures):
+            fits.append(future.result())
+            print(f"  Finished imputation {i + 1}/{m}")
+    return fits
+
+
+def pool_fits(fits, dv, level=0.95):
+    """Rubin-pooled pooled-model slopes and per-country term estimates for one DV."""
+    first = fits[0][dv]
+    pooled = rubin_pool([fit[dv]['beta'] for fit in fits], [fit[dv]['variance'] for fit in fits], level)
+    # Align the country estimates by country code, in case a country is only estimable in some imputations
+    countries = sorted(set().union(*(fit[dv]['countries'] for fit in fits)))
+    coef = [pd.Series(fit[dv]['country_coef'], index=fit[dv]['countries']).reindex(countries) for fit in fits]
+    variance = [pd.Series(fit[dv]['country_variance'], index=fit[dv]['countries']).reindex(countries) for fit in fits]
+    country = rubin_pool(coef, variance, level)
+    return {
+        'names': first['names'],
+        'pooled': pooled,
+        'nobs': first['nobs'],
+        'n_clusters': first['n_clusters'],
+        'countries': countries,
+        'country': country,
+    }
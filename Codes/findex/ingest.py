@@ -0,0 +1,127 @@
+"""
+Ingest of the raw Findex wave files: multi-threaded parsing, concurrent waves, compressed inputs.
+
+Files may be plain CSV or compressed (.gz, .zst, or a .zip holding one CSV); compressed files are
+decompressed as a stream while parsing, never to disk. Only the requested columns are converted. With
+pyarrow installed the CSV parser itself is multi-threaded; otherwise the pandas C parser is used. Waves
+are read concurrently in threads (both parsers release the GIL while parsing).
+"""
+import csv
+import gzip
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: pandas is used instead
+    pa = pa_csv = None
+
+# Encodings tried in order, as in step 1
+ENCODINGS = ('utf-8', 'ISO-8859-1')
+
+# Errors of text that is not valid in an encoding (pyarrow reports invalid UTF-8 as ArrowInvalid)
+TEXT_ERRORS = (UnicodeDecodeError,) + ((pa.ArrowInvalid,) if pa is not None else ())
+
+
+class _ZipMember(io.BufferedReader):
+    """Stream over the member of a zip archive that closes the archive with it."""
+
+    def __init__(self, archive, name):
+        self._archive = archive
+        super().__init__(archive.open(name))
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._archive.close()
+
+
+def open_stream(path):
+    """Binary file object over the file contents, decompressing .gz/.zst/.zip on the fly."""
+    lower = str(path).lower()
+    if lower.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if lower.endswith('.zst'):
+        import zstandard  # only needed for .zst files
+        return zstandard.open(path, 'rb')
+    if lower.endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+        members = [name for name in archive.namelist() if name.lower().endswith('.csv')]
+        if len(members) != 1:
+            archive.close()
+            raise ValueError(f"{path}: expected exactly one CSV file in the archive, found {len(members)}")
+        return _ZipMember(archive, members[0])
+    return open(path, 'rb')
+
+
+def _header(path, encoding):
+    """Column names from the first line of the file."""
+    with open_stream(path) as stream:
+        text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+        return next(csv.reader(text))
+
+
+def _read_pyarrow(path, columns, encoding):
+    header = _header(path, encoding)
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise ValueError(f"{path}: columns not found in the file: {missing}")
+    # Same column order as the pandas reader (file order)
+    ordered = [col for col in header if col in set(columns)]
+    with open_stream(path) as stream:
+        table = pa_csv.read_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(encoding=encoding, use_threads=True),
+            convert_options=pa_csv.ConvertOptions(include_columns=ordered),
+        )
+    return table.to_pandas()
+
+
+def _read_pandas(path, columns, encoding):
+    with open_stream(path) as stream:
+        return pd.read_csv(stream, usecols=columns, encoding=encoding)
+
+
+def read_wave(path, columns, encodings=ENCODINGS, engine=None):
+    """
+    Read the given columns of one wave file (CSV, possibly compressed, or Stata .dta).
+
+    engine: 'pyarrow', 'pandas' or None (pyarrow when installed). Encodings are tried in order.
+    """
+    if str(path).lower().endswith('.dta'):
+        # Stata files are read in chunks with their stored codes (see findex.stata_ingest)
+        from findex.stata_ingest import iter_stata_chunks
+        return pd.concat(iter_stata_chunks(path, columns), ignore_index=True)
+
+    engine = engine or ('pyarrow' if pa_csv is not None else 'pandas')
+    reader = _read_pyarrow if engine == 'pyarrow' else _read_pandas
+    last_error = None
+    for encoding in encodings:
+        try:
+            return reader(path, columns, encoding)
+        except TEXT_ERRORS as e:
+            last_error = e
+            print(f"{encoding} failed for {path}, trying the next encoding...")
+    raise last_error
+
+
+def read_waves(sources, columns, year_column='Year', max_workers=None, engine=None):
+    """
+    Read several waves {path: year} concurrently and stack them (in the given order) with a year column.
+    """
+    sources = list(dict(sources).items())
+
+    def load(item):
+        path, year = item
+        wave = read_wave(path, columns, engine=engine)
+        wave[year_column] = year
+        return wave
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(sources) or 1) as pool:
+        waves = list(pool.map(load, sources))
+    return pd.concat(waves, ignore_index=True)
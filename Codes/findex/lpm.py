@@ -0,0 +1,178 @@
+"""
+Linear probability models (LPM) for all countries at once, as a fast companion to the per-country logits.
+
+Rows are grouped by country into one zero-padded (countries x rows x regressors) array, so X'X, X'y and the
+HC1 "meat" of every country come out of single batched matrix products, and all countries are solved in
+one batched call. The pooled country-FE LPM with SEs clustered by country is built from the same blocks.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def country_blocks(df, dv, explanatory_vars, country_var='economycode', year_var='year', weight_var=None):
+    """
+    Arrange the model rows as zero-padded per-country blocks.
+
+    Returns a dict with the padded design Xp (G x n_max x k, columns: Intercept, regressors, year dummies),
+    outcome yp (G x n_max), row counts n (G), the country codes and the column names. With weight_var
+    the padded survey weights are returned as wp (rows with a missing weight are dropped).
+    """
+    cols = list(dict.fromkeys([dv] + list(explanatory_vars) + [country_var] + ([year_var] if year_var else [])
+                              + ([weight_var] if weight_var else [])))
+    data = df[cols].dropna()
+
+    names = ['Intercept'] + list(explanatory_vars)
+    parts = [np.ones((len(data), 1)), data[explanatory_vars].to_numpy(dtype=np.float64)]
+    if year_var:
+        years = sorted(data[year_var].unique())
+        for year in years[1:]:
+            parts.append((data[year_var].to_numpy() == year).astype(np.float64)[:, None])
+            names.append(f"C({year_var})[T.{year}]")
+    X = np.hstack(parts)
+    y = data[dv].to_numpy(dtype=np.float64)
+
+    countries, group = np.unique(data[country_var].astype(str).to_numpy(), return_inverse=True)
+    order = np.argsort(group, kind='stable')
+    group = group[order]
+    n = np.bincount(group, minlength=len(countries))
+    position = np.arange(len(group)) - np.repeat(np.cumsum(n) - n, n)
+
+    Xp = np.zeros((len(countries), n.max() if len(n) else 0, X.shape[1]))
+    yp = np.zeros((len(countries), Xp.shape[1]))
+    Xp[group, position] = X[order]
+    yp[group, position] = y[order]
+    blocks = {'countries': list(countries), 'names': names, 'Xp': Xp, 'yp': yp, 'n': n}
+    if weight_var:
+        wp = np.zeros_like(yp)
+        wp[group, position] = data[weight_var].to_numpy(dtype=np.float64)[order]
+        blocks['wp'] = wp
+    return blocks
+
+
+def _drop_constant_columns(XtX, Xty, n):
+    """
+    Neutralise regressors with no variation inside a country (e.g. a single survey year): their
+    rows/columns of X'X are replaced by the identity so the batched solve gives them a zero coefficient.
+    """
+    k = XtX.shape[1]
+    sums = XtX[:, 0, :]
+    sumsq = np.diagonal(XtX, axis1=1, axis2=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = sumsq / n[:, None] - (sums / n[:, None]) ** 2
+    estimable = variance > 1e-12
+    estimable[:, 0] = True
+
+    dropped = ~estimable
+    XtX = XtX * (estimable[:, :, None] & estimable[:, None, :])
+    XtX[:, np.arange(k), np.arange(k)] += dropped
+    Xty = Xty * estimable
+    return XtX, Xty, estimable
+
+
+def fit_lpm_by_country(blocks, min_extra_obs=5):
+    """
+    OLS of the outcome on the regressors separately for every country, with HC1 standard errors.
+
+    Returns (coef, se, status), coef and se as G x k arrays (NaN where not estimable) and status as a
+    list of per-country status strings in the same vocabulary as step 7, plus 'Rank Deficient' for a
+    country whose regressors are collinear (the other countries are still estimated).
+    """
+    Xp, yp, n = blocks['Xp'], blocks['yp'], blocks['n']
+    G, _, k = Xp.shape
+
+    XtX = np.matmul(Xp.transpose(0, 2, 1), Xp)
+    Xty = np.einsum('gnk,gn->gk', Xp, yp)
+    XtX, Xty, estimable = _drop_constant_columns(XtX, Xty, n)
+
+    status = ['OK'] * G
+    y_sum = Xty[:, 0]
+    too_small = n < k + min_extra_obs
+    no_variation = (y_sum == 0) | (y_sum == n)
+    usable = ~too_small & ~no_variation
+    # Exactly collinear regressors within a country (after the constant ones are neutralised)
+    rank_deficient = np.linalg.matrix_rank(XtX, hermitian=True) < k
+    usable &= ~rank_deficient
+    for g in range(G):
+        if too_small[g]:
+            status[g] = 'Insufficient N'
+        elif no_variation[g]:
+            status[g] = 'No DV Variation'
+        elif rank_deficient[g]:
+            status[g] = 'Rank Deficient'
+    # Keep the batched inverse well defined for countries that are not estimated
+    XtX[~usable] = np.eye(k)
+
+    XtX_inv = np.linalg.inv(XtX)
+    coef = np.einsum('gij,gj->gi', XtX_inv, Xty)
+
+    # HC1 meat from the residuals, padded rows contribute zero
+    resid = yp - np.einsum('gnk,gk->gn', Xp, coef)
+    resid[np.arange(Xp.shape[1])[None, :] >= n[:, None]] = 0.0
+    meat = np.matmul((Xp * (resid ** 2)[:, :, None]).transpose(0, 2, 1), Xp)
+    k_used = estimable.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dof = n / (n - k_used)
+    cov = dof[:, None, None] * XtX_inv @ meat @ XtX_inv
+    se = np.sqrt(np.clip(np.diagonal(cov, axis1=1, axis2=2), 0, None))
+
+    coef = np.where(estimable & usable[:, None], coef, np.nan)
+    se = np.where(estimable & usable[:, None], se, np.nan)
+    return coef, se, status
+
+
+def fit_lpm_pooled_fe(blocks):
+    """
+    Pooled LPM with country fixed effects (within estimator) and SEs clustered by country.
+
+    Uses only the per-country X'X, X'y and column sums, so no further pass over the rows is needed.
+    Returns (coef, se, names) for the slope columns (intercept absorbed by the fixed effects).
+    """
+    Xp, yp, n = blocks['Xp'], blocks['yp'], blocks['n']
+    G = Xp.shape[0]
+
+    XtX = np.matmul(Xp.transpose(0, 2, 1), Xp)[:, 1:, 1:]
+    Xty = np.einsum('gnk,gn->gk', Xp, yp)[:, 1:]
+    x_sum = Xp[:, :, 1:].sum(axis=1)
+    y_sum = yp.sum(axis=1)
+
+    # Within-country demeaning expressed on the accumulated blocks
+    Xt_X = XtX - np.einsum('gi,gj->gij', x_sum, x_sum) / n[:, None, None]
+    Xt_y = Xty - x_sum * (y_sum / n)[:, None]
+
+    total = Xt_X.sum(axis=0)
+    keep = np.diagonal(total) > 1e-12
+    A = total[np.ix_(keep, keep)]
+    A_inv = np.linalg.inv(A)
+    coef_kept = A_inv @ Xt_y.sum(axis=0)[keep]
+
+    # Cluster scores: demeaned X_c' e_c = X_c'y_c - X_c'X_c b (all within country)
+    scores = Xt_y[:, keep] - Xt_X[:, keep][:, :, keep] @ coef_kept
+    meat = scores.T @ scores
+    N = n.sum()
+    k_total = int(keep.sum()) + G
+    correction = G / (G - 1) * (N - 1) / (N - k_total)
+    cov = correction * A_inv @ meat @ A_inv
+
+    names = blocks['names'][1:]
+    coef = np.full(len(names), np.nan)
+    se = np.full(len(names), np.nan)
+    coef[keep] = coef_kept
+    se[keep] = np.sqrt(np.diagonal(cov))
+    return coef, se, names
+
+
+def per_country_table(blocks, coef, se, status, term='has_credit_card', level=0.95):
+    """Step 7 shaped table (Country, Lower 95, Coef, Higher 95) for one term, 'NA' where not estimated."""
+    j = blocks['names'].index(term)
+    z = stats.norm.ppf(0.5 + level / 2)
+    table = pd.DataFrame(index=blocks['countries'], columns=['Lower 95', 'Coef', 'Higher 95'], dtype=object)
+    table.index.name = 'Country'
+    for g, country in enumerate(blocks['countries']):
+        if status[g] == 'OK' and np.isfinite(coef[g, j]) and np.isfinite(se[g, j]):
+            table.loc[country, 'Coef'] = f"{coef[g, j]:.3f}"
+            table.loc[country, 'Lower 95'] = f"{coef[g, j] - z * se[g, j]:.3f}"
+            table.loc[country, 'Higher 95'] = f"{coef[g, j] + z * se[g, j]:.3f}"
+        else:
+            table.loc[country, :] = 'NA'
+    return table
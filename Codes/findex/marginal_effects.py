@@ -0,0 +1,104 @@
+"""
+Average marginal effects (AME) of logit models with delta-method SEs, for many models at once.
+
+Works from stored coefficients and covariance matrices plus the models' design rows, arranged as
+zero-padded blocks (models x rows x regressors), so all (country, dv) models are handled by the same
+batched array operations. A pooled model is simply a batch of one.
+"""
+import numpy as np
+from scipy import stats
+from scipy.special import expit
+
+
+def binary_columns(Xp, n):
+    """Columns that only take the values 0 and 1 in every model's rows (discrete-change AMEs)."""
+    mask = np.arange(Xp.shape[1])[None, :] < n[:, None]
+    is_01 = (Xp == 0) | (Xp == 1)
+    return np.all(is_01 | ~mask[:, :, None], axis=(0, 1))
+
+
+def average_marginal_effects(Xp, n, coef, cov, columns, discrete=None, level=0.95, weights=None):
+    """
+    AME of the given regressor columns on the predicted probability, for every model in the batch.
+
+    Xp: padded designs (G x n_max x k), n: rows per model (G), coef: G x k, cov: G x k x k.
+    For 0/1 regressors the AME is the average discrete change P(x_j=1) - P(x_j=0); for the others
+    it is the average derivative beta_j * p(1-p). With survey weights (G x n_max) the averages are
+    weighted. Returns a dict of G x J arrays: AME, SE, lower, upper.
+    """
+    columns = np.asarray(columns)
+    G, n_max, k = Xp.shape
+    if discrete is None:
+        discrete = binary_columns(Xp, n)[columns]
+    discrete = np.asarray(discrete, dtype=bool)
+
+    row_mask = (np.arange(n_max)[None, :] < n[:, None]).astype(np.float64)
+    if weights is not None:
+        row_mask = row_mask * weights
+    weights = row_mask / np.maximum(row_mask.sum(axis=1), 1e-300)[:, None]
+    coef_safe = np.nan_to_num(coef)
+
+    eta = np.einsum('gnk,gk->gn', Xp, coef_safe)
+    x_j = Xp[:, :, columns]
+    b_j = coef_safe[:, columns]
+
+    # Discrete change: linear predictor with x_j set to 1 and to 0
+    eta1 = eta[:, :, None] + b_j[:, None, :] * (1 - x_j)
+    eta0 = eta[:, :, None] - b_j[:, None, :] * x_j
+    p1, p0 = expit(eta1), expit(eta0)
+    f1, f0 = p1 * (1 - p1), p0 * (1 - p0)
+    ame_discrete = np.einsum('gn,gnj->gj', weights, p1 - p0)
+    # Gradient: mean[(f1 - f0) x] plus mean[f1 (1 - x_j) + f0 x_j] on the j-th coefficient
+    grad_discrete = np.matmul(((f1 - f0) * weights[:, :, None]).transpose(0, 2, 1), Xp)
+    own_discrete = np.einsum('gn,gnj->gj', weights, f1 * (1 - x_j) + f0 * x_j)
+
+    # Derivative: beta_j * mean[p(1-p)]
+    p = expit(eta)
+    w = p * (1 - p)
+    mean_w = np.einsum('gn,gn->g', weights, w)
+    ame_derivative = b_j * mean_w[:, None]
+    dw = np.einsum('gn,gnk->gk', weights * w * (1 - 2 * p), Xp)
+    grad_derivative = b_j[:, :, None] * dw[:, None, :]
+    own_derivative = np.repeat(mean_w[:, None], len(columns), axis=1)
+
+    ame = np.where(discrete[None, :], ame_discrete, ame_derivative)
+    grad = np.where(discrete[None, :, None], grad_discrete, grad_derivative)
+    own = np.where(discrete[None, :], own_discrete, own_derivative)
+    grad[:, np.arange(len(columns)), columns] += own
+
+    variance = np.einsum('gjk,gkl,gjl->gj', grad, np.nan_to_num(cov), grad)
+    se = np.sqrt(np.clip(variance, 0, None))
+
+    # Models without estimates stay missing
+    missing = ~np.isfinite(coef[:, columns])
+    ame[missing] = np.nan
+    se[missing] = np.nan
+
+    z = stats.norm.ppf(0.5 + level / 2)
+    return {'AME': ame, 'SE': se, 'Lower': ame - z * se, 'Upper': ame + z * se}
+
+
+def align_estimates(names, estimates):
+    """
+    Put stored estimates into the column order of a block design.
+
+    estimates: list (one per model) of None or dicts {'Param Names': [...], 'Params': [...], 'Cov': [[...]]}.
+    Parameters a model did not estimate (e.g. a year dummy in a one-wave country) get a zero coefficient
+    and zero variance; models without estimates get NaN. Returns (coef G x k, cov G x k x k).
+    """
+    k = len(names)
+    position = {name: i for i, name in enumerate(names)}
+    coef = np.full((len(estimates), k), np.nan)
+    cov = np.zeros((len(estimates), k, k))
+    for g, est in enumerate(estimates):
+        if not est or 'Params' not in est:
+            continue
+        idx = [position.get(name) for name in est['Param Names']]
+        keep = [i for i, j in enumerate(idx) if j is not None]
+        target = np.array([idx[i] for i in keep], dtype=int)
+        params = np.asarray(est['Params'], dtype=np.float64)
+        cov_est = np.asarray(est['Cov'], dtype=np.float64)
+        coef[g] = 0.0
+        coef[g, target] = params[keep]
+        cov[g][np.ix_(target, target)] = cov_est[np.ix_(keep, keep)]
+    return coef, cov
@@ -0,0 +1,240 @@
+"""
+Random-effects meta-analysis of per-country odds ratios, for many (spec, dv) combinations at once.
+
+The input is a long table of per-country estimates (log OR and its SE, or OR with a 95% CI as in the
+step 7 tables) with columns identifying each meta-analysis (e.g. Spec ID and DV). All meta-analyses are
+computed together: the sums over countries are grouped sums (np.bincount over a meta-analysis index), so
+DerSimonian-Laird is one pass and REML is one vectorized Fisher scoring loop for all of them.
+
+Per meta-analysis: number of countries, pooled OR with 95% CI and p-value, tau^2, I^2, H^2, Cochran's
+Q test and the 95% prediction interval (t with k - 2 df) for the OR of a new country. The subgroup
+meta-regression fits one mean per subgroup (e.g. World Bank region) with a common residual tau^2 and
+tests whether the subgroup means differ.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from findex.results_store import Z_95
+
+REML_TOL = 1e-10
+REML_MAX_ITER = 100
+
+
+# ===================== INPUT =====================
+
+def effect_sizes(df):
+    """
+    Log OR ('yi') and its sampling variance ('vi') per row, from Coef/Std.Err. columns (spec grid results)
+    when present, else from OR and the 95% CI (step 7 tables, 'NA' strings allowed). Rows without an
+    estimate are dropped.
+    """
+    df = df.copy()
+    if {'Coef', 'Std.Err.'} <= set(df.columns):
+        yi = pd.to_numeric(df['Coef'], errors='coerce')
+        se = pd.to_numeric(df['Std.Err.'], errors='coerce')
+    else:
+        odds_ratio = pd.to_numeric(df['OR'], errors='coerce')
+        lower = pd.to_numeric(df['Lower 95'], errors='coerce')
+        upper = pd.to_numeric(df['Higher 95'], errors='coerce')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yi = np.log(odds_ratio)
+            se = (np.log(upper) - np.log(lower)) / (2 * Z_95)
+    df['yi'] = yi
+    df['vi'] = se ** 2
+    keep = np.isfinite(df['yi']) & np.isfinite(df['vi']) & (df['vi'] > 0)
+    return df[keep].reset_index(drop=True)
+
+
+def store_effect_sizes(store, term='has_credit_card', level='country'):
+    """Effect sizes of every (spec, dv) of a level in a ResultsStore, with Spec ID, DV and Country columns."""
+    df = store.estimates(term=term, level=level)
+    df = df[df['status'] == 'OK'].rename(columns={'spec_id': 'Spec ID', 'dv': 'DV', 'grp': 'Country',
+                                                  'coef': 'Coef', 'se': 'Std.Err.'})
+    return effect_sizes(df[['Spec ID', 'DV', 'Country', 'Coef', 'Std.Err.']])
+
+
+# ===================== POOLING =====================
+
+def _index(df, by):
+    """Meta-analysis number of every row and the table of the meta-analysis keys."""
+    if not by:
+        return np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=[0])
+    codes = df.groupby(list(by), sort=True, dropna=False).ngroup().to_numpy()
+    keys = df[list(by)].assign(_code=codes).drop_duplicates('_code').set_index('_code').sort_index()
+    return codes, keys.reset_index(drop=True)
+
+
+def _sums(index, n, *values):
+    return [np.bincount(index, weights=v, minlength=n) for v in values]
+
+
+def _tau2_dl(y, v, index, n):
+    """DerSimonian-Laird tau^2 and the fixed-effect Q of every meta-analysis."""
+    w = 1 / v
+    sw, swy, sw2, k = _sums(index, n, w, w * y, w * w, np.ones_like(w))
+    mu = swy / sw
+    (q,) = _sums(index, n, w * (y - mu[index]) ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = sw - sw2 / sw
+        tau2 = np.where(c > 0, np.maximum(0.0, (q - (k - 1)) / c), 0.0)
+    return tau2, q, k
+
+
+def _tau2_reml(y, v, index, n, start):
+    """REML tau^2 by Fisher scoring, all meta-analyses at once (each stops when its step is below REML_TOL)."""
+    tau2 = start.copy()
+    active = np.ones(n, dtype=bool)
+    iterations = 0
+    while active.any() and iterations < REML_MAX_ITER:
+        w = 1 / (v + tau2[index])
+        sw, swy, sw2, sw3 = _sums(index, n, w, w * y, w * w, w ** 3)
+        mu = swy / sw
+        (ypp,) = _sums(index, n, (w * (y - mu[index])) ** 2)
+        trace_p = sw - sw2 / sw
+        trace_pp = sw2 - 2 * sw3 / sw + (sw2 / sw) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = np.where(trace_pp > 0, (ypp - trace_p) / trace_pp, 0.0)
+        new = np.where(active, np.maximum(0.0, tau2 + step), tau2)
+        active &= np.abs(new - tau2) > REML_TOL
+        tau2 = new
+        iterations += 1
+    return tau2
+
+
+def _pooled(y, v, index, n, tau2):
+    """Random-effects mean and SE of every meta-analysis for given tau^2."""
+    w = 1 / (v + tau2[index])
+    sw, swy = _sums(index, n, w, w * y)
+    return swy / sw, 1 / np.sqrt(sw)
+
+
+def random_effects(df, by=('Spec ID', 'DV'), method='REML', level=0.95):
+    """
+    Random-effects meta-analysis of the rows of df (see effect_sizes) for every combination of the by
+    columns. method is 'REML' or 'DL'. Returns one row per meta-analysis.
+    """
+    if method not in ('REML', 'DL'):
+        raise ValueError(f"method must be 'REML' or 'DL', not {method!r}")
+    if 'yi' not in df.columns:
+        df = effect_sizes(df)
+    by = [col for col in by if col in df.columns]
+    index, keys = _index(df, by)
+    n = len(keys)
+    y = df['yi'].to_numpy(dtype=np.float64)
+    v = df['vi'].to_numpy(dtype=np.float64)
+
+    tau2, q, k = _tau2_dl(y, v, index, n)
+    if method == 'REML':
+        tau2 = _tau2_reml(y, v, index, n, tau2)
+    mu, se = _pooled(y, v, index, n, tau2)
+
+    # I^2 from tau^2 and the typical within-country variance (equals (Q - df) / Q for DL)
+    w = 1 / v
+    sw, sw2 = _sums(index, n, w, w * w)
+    z = stats.norm.ppf(0.5 + level / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        typical_v = (k - 1) * sw / (sw ** 2 - sw2)
+        i2 = np.where(k > 1, tau2 / (tau2 + typical_v), np.nan)
+        t = stats.t.ppf(0.5 + level / 2, k - 2)
+        pi_half = np.where(k >= 3, t * np.sqrt(tau2 + se ** 2), np.nan)
+
+    result = keys.copy()
+    result['k'] = k.astype(np.int64)
+    result['Method'] = method
+    result['log OR'] = mu
+    result['SE'] = se
+    result['OR'] = np.exp(mu)
+    result['Lower 95'] = np.exp(mu - z * se)
+    result['Higher 95'] = np.exp(mu + z * se)
+    result['P-value'] = 2 * stats.norm.sf(np.abs(mu / se))
+    result['Tau2'] = tau2
+    result['I2'] = i2
+    result['H2'] = 1 / (1 - i2)
+    result['Q'] = q
+    result['Q P-value'] = np.where(k > 1, stats.chi2.sf(q, np.maximum(k - 1, 1)), np.nan)
+    result['PI Lower'] = np.exp(mu - pi_half)
+    result['PI Upper'] = np.exp(mu + pi_half)
+    return result
+
+
+def pooled_estimate(df, method='REML'):
+    """
+    The random-effects row (a Series) of one set of countries, e.g. the input of a forest plot, or None
+    when fewer than two countries have an estimate.
+    """
+    studies = effect_sizes(df)
+    if len(studies) < 2:
+        return None
+    return random_effects(studies, by=(), method=method).iloc[0]
+
+
+# ===================== SUBGROUPS =====================
+
+def subgroup_meta_regression(df, moderator, by=('Spec ID', 'DV'), level=0.95):
+    """
+    Mixed-effects meta-regression on a categorical moderator (e.g. 'Region'): one mean per subgroup, a
+    common residual tau^2 (method of moments) and a Wald test that the subgroup means are equal.
+
+    Returns (subgroups, tests): one row per (meta-analysis, subgroup) with its pooled OR, and one row per
+    meta-analysis with the residual tau^2, the share of tau^2 explained (R2, against the DL tau^2 of the
+    same model without the moderator), QM with its df and p-value.
+    """
+    if 'yi' not in df.columns:
+        df = effect_sizes(df)
+    by = [col for col in by if col in df.columns]
+    df = df.dropna(subset=[moderator]).reset_index(drop=True)
+    meta_index, keys = _index(df, by)
+    n_meta = len(keys)
+    cell_index, cells = _index(df, by + [moderator])
+    n_cells = len(cells)
+    cell_meta = np.zeros(n_cells, dtype=np.int64)
+    cell_meta[cell_index] = meta_index
+    y = df['yi'].to_numpy(dtype=np.float64)
+    v = df['vi'].to_numpy(dtype=np.float64)
+
+    # Fixed-effect fit of the subgroup means, for the residual heterogeneity
+    w = 1 / v
+    sw, swy, sw2, k_cell = _sums(cell_index, n_cells, w, w * y, w * w, np.ones_like(w))
+    beta_fe = swy / sw
+    (q_cell,) = _sums(cell_index, n_cells, w * (y - beta_fe[cell_index]) ** 2)
+    q_e, trace_p, k, n_sub = _sums(cell_meta, n_meta, q_cell, sw - sw2 / sw, k_cell, np.ones(n_cells))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau2_res = np.where(trace_p > 0, np.maximum(0.0, (q_e - (k - n_sub)) / trace_p), 0.0)
+
+    # Random-effects subgroup means with the common residual tau^2
+    w_star = 1 / (v + tau2_res[meta_index])
+    sw_star, swy_star = _sums(cell_index, n_cells, w_star, w_star * y)
+    beta = swy_star / sw_star
+    se = 1 / np.sqrt(sw_star)
+    weight_sum, weighted_beta = _sums(cell_meta, n_meta, sw_star, sw_star * beta)
+    grand_mean = weighted_beta / weight_sum
+    (qm,) = _sums(cell_meta, n_meta, sw_star * (beta - grand_mean[cell_meta]) ** 2)
+    qm_df = n_sub - 1
+
+    tau2_total, _, _ = _tau2_dl(y, v, meta_index, n_meta)
+    z = stats.norm.ppf(0.5 + level / 2)
+
+    subgroups = cells.copy()
+    subgroups['k'] = k_cell.astype(np.int64)
+    subgroups['log OR'] = beta
+    subgroups['SE'] = se
+    subgroups['OR'] = np.exp(beta)
+    subgroups['Lower 95'] = np.exp(beta - z * se)
+    subgroups['Higher 95'] = np.exp(beta + z * se)
+
+    tests = keys.copy()
+    tests['k'] = k.astype(np.int64)
+    tests['Subgroups'] = n_sub.astype(np.int64)
+    tests['Tau2 Residual'] = tau2_res
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tests['R2'] = np.where(tau2_total > 0, np.clip(1 - tau2_res / tau2_total, 0, 1), np.nan)
+    tests['QM'] = qm
+    tests['QM df'] = qm_df.astype(np.int64)
+    tests['QM P-value'] = np.where(qm_df > 0, stats.chi2.sf(qm, np.maximum(qm_df, 1)), np.nan)
+    return subgroups, tests
+
+
+def country_regions(df, country_var='economycode', region_var='regionwb'):
+    """Region of every country (first value in the data) as a Series indexed by country."""
+    return df.dropna(subset=[region_var]).groupby(country_var)[region_var].first()
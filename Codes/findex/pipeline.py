@@ -0,0 +1,267 @@
+"""
+In-process pipeline: the stages of the numbered scripts as functions over in-memory frames.
+
+Each stage takes and returns DataFrames (or dicts of them), so a notebook or a batch job can run the full
+chain in one process without writing and re-reading the intermediate CSV files:
+
+    merge_waves -> decode -> drop_rename -> filter_countries -> describe / fit_pooled / fit_per_country -> plots
+
+A Session runs the stages in order and keeps every output in memory for the next stage; the regression
+data is encoded once (see findex.spec_grid) and shared by the pooled and the per-country fits. Nothing is
+written to disk unless a stage is given an output path or a results store.
+
+With config['dev_sample'] (e.g. {'fraction': 0.05, 'max_rows_per_country': 200, 'seed': 1}), a Session
+runs on a seeded country-stratified subsample (see findex.subsample) drawn at the first stage; its spec ids
+end in '|sampled' and its figures say so, so dev results are never mistaken for full-data results.
+"""
+import numpy as np
+
+from findex import codebook
+from findex.validation import decode_and_validate, codebook_checks, integer_columns
+
+# Defaults of a run, as in the numbered scripts; a Session takes a dict overriding any of them
+DEFAULT_CONFIG = {
+    'waves': {},  # {path: survey year}
+    'year_column': 'Year',
+    'country_var': 'economycode',
+    'min_credit_card_threshold': 0.10,
+    'countries_to_exclude': None,  # None = codebook.countries_to_exclude
+    'dependent_vars': ['saved', 'saved_account', 'saved_retirement'],
+    'explanatory_vars': [
+        'has_credit_card', 'female', 'age', 'higher_educ', 'employed',
+        'inc_quint2', 'inc_quint3', 'inc_quint4', 'inc_quint5',
+        'recv_wage', 'recv_govt_trans', 'recv_pension', 'borrowed', 'has_mobile',
+        'paid_utility', 'paid_bills_online', 'bought_online',
+    ],
+    'fe_vars': ['economycode', 'year'],
+    'variables_of_interest': ['has_credit_card', 'saved', 'saved_account', 'saved_retirement'],
+    'n_workers': 1,
+    'dev_sample': None,  # {'fraction', 'max_rows_per_country', 'seed'}: run on a stratified subsample
+}
+
+# Suffix of the spec ids (results store, long-format results) of a run on the dev subsample
+SAMPLED_TAG = 'sampled'
+# First part of the spec ids of the pipeline's models in the results store
+PIPELINE_NAMESPACE = 'pipeline'
+
+# Columns the subsample is stratified on within each country: credit card ownership and the DVs
+DEV_STRATA = ['has_credit_card', 'saved', 'saved_account', 'saved_retirement']
+
+# Stage order of a full run
+STAGES = ('merge', 'decode', 'drop_rename', 'filter', 'describe', 'fit_pooled', 'fit_per_country', 'plot')
+
+
+# ===================== STAGES =====================
+
+def merge_waves(sources, columns=None, year_column='Year'):
+    """Step 1: read the waves {path: year} (columns_to_keep of the codebook) and stack them."""
+    from findex.ingest import read_waves  # pyarrow (when installed) is only loaded for this stage
+    return read_waves(sources, columns or codebook.columns_to_keep, year_column=year_column)
+
+
+def decode(df, book=codebook):
+    """
+    Step 2: split and recode the survey codes, validating them against the codebook in the same pass.
+
+    Raises findex.validation.CodebookError on bad input. Recoded columns without missing values are
+    integers, as they are when step 2's file is read back.
+    """
+    df, _ = decode_and_validate(df, **codebook_checks(book))
+    return integer_columns(df, list(book.derived_variables) + list(book.recoding_dict))
+
+
+def missing_shares(df, variables, country_var='economy'):
+    """Step 3: share of non-missing answers per variable, overall and per country (in %)."""
+    overall = df[variables].notna().mean()
+    per_country = (df[variables].notna().groupby(df[country_var]).mean() * 100).round(2)
+    return overall, per_country
+
+
+def drop_rename(df, column_mapping=None, countries_to_exclude=None, country_var='economycode'):
+    """Step 4: rename to the analysis names, keep those columns and drop the excluded countries."""
+    column_mapping = codebook.column_mapping if column_mapping is None else column_mapping
+    countries_to_exclude = codebook.countries_to_exclude if countries_to_exclude is None else countries_to_exclude
+    df = df.rename(columns=column_mapping)[list(column_mapping.values()) + [country_var]]
+    return df[~df[country_var].isin(countries_to_exclude)].reset_index(drop=True)
+
+
+def filter_countries(df, threshold=0.10, country_var='economycode', column='has_credit_card'):
+    """Step 5: keep the countries whose credit card ownership is at least threshold."""
+    share = df.groupby(country_var)[column].transform('mean')
+    return df[share >= threshold].reset_index(drop=True)
+
+
+def describe(df, variables_of_interest, country_var='economycode'):
+    """Step 5: overall descriptive statistics, correlation matrix and country means."""
+    return {
+        'overall': df.describe(include='all').T[["count", "mean", "std", "min", "max"]],
+        'correlation': df.select_dtypes(include=[np.number]).corr(),
+        'country_means': df.groupby(country_var)[variables_of_interest].mean().reset_index(),
+    }
+
+
+def dev_subsample(df, options, country_var='economycode', strata=DEV_STRATA):
+    """
+    The dev subsample of df (see findex.subsample). The strata are the analysis columns or, before step 4,
+    their survey columns (e.g. fin7 for has_credit_card).
+    """
+    from findex.subsample import DEFAULT_SEED, stratified_subsample
+    survey_names = {name: column for column, name in codebook.column_mapping.items()}
+    columns = [var if var in df.columns else survey_names.get(var) for var in strata]
+    return stratified_subsample(df, [col for col in columns if col in df.columns], group_var=country_var,
+                                fraction=options.get('fraction'),
+                                max_rows_per_group=options.get('max_rows_per_country'),
+                                seed=options.get('seed', DEFAULT_SEED))
+
+
+def _sample_name(threshold):
+    return f"cc{int(round(threshold * 100)):02d}"
+
+
+def model_specs(level, dependent_vars, explanatory_vars, fe_vars, threshold=0.10):
+    """
+    The step 6 ('pooled') or step 7 ('country') model as a specification of findex.spec_grid. Its spec id
+    is the one the scripts use in the results store, under the PIPELINE_NAMESPACE, so pipeline runs do not
+    replace the scripts' records.
+    """
+    from findex.spec_grid import expand_grid
+    fe_name = '_'.join('country' if fe == 'economycode' else fe for fe in fe_vars) or 'none'
+    return expand_grid({'baseline': explanatory_vars}, dependent_vars, {fe_name: fe_vars},
+                       {_sample_name(threshold): {'min_credit_card_threshold': threshold}}, (level,),
+                       namespace=PIPELINE_NAMESPACE)
+
+
+def fit_models(data, specs, country_var='economycode', n_workers=1, store=None):
+    """
+    Fit the given specifications on a DataFrame or on an already encoded design (build_shared_design),
+    and return the long-format table of findex.spec_grid (OR, CIs, status, solver per group and term).
+    """
+    from findex.spec_grid import build_shared_design, fit_design
+    design = data if isinstance(data, dict) else build_shared_design(data, specs, country_var)
+    return fit_design(design, specs, n_workers=n_workers, store=store)
+
+
+def country_or_table(results, dv, term='has_credit_card', columns=('OR', 'Lower 95', 'Higher 95')):
+    """Country and the given columns (by default OR, Lower 95, Higher 95: the plot input) of one DV from the
+    long-format per-country results."""
+    rows = results[(results['DV'] == dv) & (results['Term'] == term) & (results['Status'] == 'OK')]
+    return rows.rename(columns={'Group': 'Country'})[['Country', *columns]].reset_index(drop=True)
+
+
+# ===================== SESSION =====================
+
+class Session:
+    """
+    Runs the pipeline stages in one process, keeping each stage's output in self.data for the next.
+
+    Any stage can be started from a frame put in self.data by hand, e.g. session.data['cleaned'] = df.
+    Outputs: 'merged', 'recoded', 'cleaned', 'regression' (after the threshold), 'description',
+    'pooled' and 'per_country' (long-format results) and 'figures'.
+    """
+
+    def __init__(self, config=None, store=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.store = store
+        self.data = {}
+        self._design = None
+        self.sampled = False
+
+    def _dev_sample(self, df):
+        """Draw the dev subsample at the first stage that gets data (once per session)."""
+        options = self.config['dev_sample']
+        if not options or self.sampled:
+            return df
+        from findex.subsample import DEFAULT_SEED
+        sample = dev_subsample(df, options, self.config['country_var'])
+        print(f"  Dev mode: stratified subsample of {len(sample)} of {len(df)} rows "
+              f"(seed {options.get('seed', DEFAULT_SEED)})")
+        self.sampled = True
+        return sample
+
+    def _input(self, name):
+        if name not in self.data:
+            raise KeyError(f"Stage input '{name}' is not available; run the previous stage or set session.data['{name}']")
+        return self.data[name]
+
+    def merge(self):
+        merged = merge_waves(self.config['waves'], year_column=self.config['year_column'])
+        self.data['merged'] = self._dev_sample(merged)
+        return self.data['merged']
+
+    def decode(self):
+        self.data['recoded'] = decode(self._dev_sample(self._input('merged')))
+        return self.data['recoded']
+
+    def drop_rename(self):
+        self.data['cleaned'] = drop_rename(self._dev_sample(self._input('recoded')),
+                                           countries_to_exclude=self.config['countries_to_exclude'],
+                                           country_var=self.config['country_var'])
+        return self.data['cleaned']
+
+    def filter(self):
+        self.data['regression'] = filter_countries(self._dev_sample(self._input('cleaned')),
+                                                   self.config['min_credit_card_threshold'], self.config['country_var'])
+        self._design = None
+        return self.data['regression']
+
+    def describe(self):
+        self.data['description'] = describe(self._dev_sample(self._input('regression')), self.config['variables_of_interest'],
+                                            self.config['country_var'])
+        return self.data['description']
+
+    def _specs(self, level):
+        c = self.config
+        specs = model_specs(level, c['dependent_vars'], c['explanatory_vars'], c['fe_vars'],
+                            c['min_credit_card_threshold'])
+        if self.sampled:
+            for spec in specs:
+                spec['id'] = f"{spec['id']}|{SAMPLED_TAG}"
+        return specs
+
+    def _fit(self, level):
+        from findex.spec_grid import build_shared_design
+        if self._design is None:
+            # Encoded once for both levels (all variables and FE of the run), then shared without copies
+            self.data['regression'] = self._dev_sample(self._input('regression'))
+            self._design = build_shared_design(self.data['regression'], self._specs('pooled') + self._specs('country'),
+                                               self.config['country_var'])
+        return fit_models(self._design, self._specs(level), n_workers=self.config['n_workers'], store=self.store)
+
+    def fit_pooled(self):
+        self.data['pooled'] = self._fit('pooled')
+        return self.data['pooled']
+
+    def fit_per_country(self):
+        self.data['per_country'] = self._fit('country')
+        return self.data['per_country']
+
+    def plot(self):
+        """Scatter plots of the country means and OR forest plots; figures are kept in self.data['figures']."""
+        from findex.meta_analysis import pooled_estimate
+        from findex.plots import country_scatter, forest_plot
+        figures = {}
+        tag = ' (dev subsample)' if self.sampled else ''
+        if 'description' in self.data:
+            means = self.data['description']['country_means']
+            for dv in self.config['dependent_vars']:
+                figures[f'scatter_{dv}'] = country_scatter(means, dv, label_var=self.config['country_var'])
+                if tag:
+                    figures[f'scatter_{dv}'].axes[0].set_title(figures[f'scatter_{dv}'].axes[0].get_title() + tag)
+        if 'per_country' in self.data:
+            for dv in self.config['dependent_vars']:
+                table = country_or_table(self.data['per_country'], dv,
+                                         columns=('OR', 'Lower 95', 'Higher 95', 'Coef', 'Std.Err.'))
+                if not table.empty:
+                    figures[f'forest_{dv}'] = forest_plot(
+                        table, f'Odds Ratios for association between "Has a Credit Card" and "{dv}"{tag}',
+                        pooled=pooled_estimate(table))
+        self.data['figures'] = figures
+        return figures
+
+    def run(self, stages=STAGES):
+        """Run the given stages in order and return self."""
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError(f"Unknown stage '{stage}'; stages are {', '.join(STAGES)}")
+            getattr(self, stage)()
+        return self
@@ -0,0 +1,203 @@
+"""
+Figures of steps 5 and 8-10 as functions over in-memory tables, for the in-process pipeline.
+
+matplotlib and seaborn are imported inside the functions, so importing this module is cheap.
+"""
+import numpy as np
+import pandas as pd
+
+from findex.results_store import ResultsStore
+
+# ===================== VISUAL SETTINGS =====================
+# Same styling as the plot scripts 8-10
+SIGNIFICANT_COLOR = "#1F77B4"     # Blue for significant
+NONSIGNIFICANT_COLOR = "#D62728"   # Red for non-significant
+REFERENCE_LINE_COLOR = "#555555"   # Dark gray for reference line
+GRID_COLOR = "#CCCCCC"            # Light gray for grid
+POOLED_COLOR = "#2CA02C"          # Green for the pooled random-effects estimate
+GRID_ALPHA = 0.3
+POINT_SIZE = 80
+LINE_WIDTH = 2
+CAP_LENGTH = 0.2
+TITLE_SIZE = 16
+AXIS_LABEL_SIZE = 12
+LEGEND_FONT_SIZE = 12
+FIG_WIDTH = 18
+FIG_HEIGHT = 14
+DPI = 300
+
+SIGNIFICANT_LABEL = 'Statistically Significant at 95% CI'
+NONSIGNIFICANT_LABEL = 'Non-Statistically Significant at 95% CI'
+POOLED_LABEL = 'Pooled OR (random effects) with 95% prediction interval'
+DIAMOND_HEIGHT = 0.6
+
+
+def add_significance(df):
+    """Mark ORs whose 95% CI excludes 1 and pick their colors."""
+    df['Significant'] = ~((df['Lower 95'] <= 1) & (df['Higher 95'] >= 1))
+    df['Color'] = np.where(df['Significant'], SIGNIFICANT_COLOR, NONSIGNIFICANT_COLOR)
+    return df
+
+
+def load_store_data(db_path, spec_id, dv, term='has_credit_card'):
+    """Load the estimated country ORs of one DV from the results store (None, with a message, on failure)."""
+    try:
+        with ResultsStore(db_path) as store:
+            df = store.plot_input(spec_id, dv, term)
+    except Exception as e:
+        print(f"Error loading data from the results store: {e}")
+        return None
+    if df.empty:
+        print(f"Error: No estimated models for spec '{spec_id}' and DV '{dv}' in {db_path}")
+        return None
+    print(f"Successfully loaded data with {len(df)} countries from the results store.")
+    return add_significance(df)
+
+
+def load_csv_data(file_path):
+    """Load the country ORs from a step 7 table (None, with a message, on failure)."""
+    try:
+        df = pd.read_csv(file_path)
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {file_path}")
+        return None
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        return None
+    required_cols = ['Country', 'OR', 'Lower 95', 'Higher 95']
+    missing = [col for col in required_cols if col not in df.columns]
+    if missing:
+        print(f"Error: Missing required columns in input file: {missing}")
+        return None
+    # Countries without an estimate ('NA') are left out
+    df[required_cols[1:]] = df[required_cols[1:]].apply(pd.to_numeric, errors='coerce')
+    df = df.dropna(subset=required_cols[1:]).reset_index(drop=True)
+    print(f"Successfully loaded data with {len(df)} countries.")
+    return add_significance(df)
+
+
+def split_into_groups(df, num_groups):
+    """Split a sorted table into num_groups consecutive parts of (almost) equal size."""
+    bounds = np.linspace(0, len(df), num_groups + 1).round().astype(int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _plot_group(ax, group_data, axis_max):
+    n_countries = len(group_data)
+    positions = np.arange(n_countries - 1, -1, -1)
+    colors = np.where(group_data['Significant'], SIGNIFICANT_COLOR, NONSIGNIFICANT_COLOR)
+    lower = group_data['Lower 95'].to_numpy()
+    upper = group_data['Higher 95'].to_numpy()
+
+    ax.hlines(positions, lower, upper, colors=colors, linewidth=LINE_WIDTH, zorder=1)
+    ax.vlines(lower, positions - CAP_LENGTH / 2, positions + CAP_LENGTH / 2, colors=colors,
+              linewidth=LINE_WIDTH, zorder=1)
+    ax.vlines(upper, positions - CAP_LENGTH / 2, positions + CAP_LENGTH / 2, colors=colors,
+              linewidth=LINE_WIDTH, zorder=1)
+    ax.scatter(group_data['OR'], positions, color=colors, edgecolor='black', s=POINT_SIZE, zorder=2)
+    ax.axvline(x=1, color=REFERENCE_LINE_COLOR, linestyle='--', linewidth=1, alpha=0.7, zorder=0)
+
+    ax.set_xlim(left=0, right=axis_max)
+    ax.set_xticks(np.arange(0, int(np.ceil(axis_max)) + 1, 1))
+    ax.set_yticks(positions)
+    ax.set_yticklabels(group_data['Country'].tolist())
+    ax.tick_params(axis='y', which='both', left=False, labelleft=True)
+    ax.grid(True, axis='x', linestyle='--', alpha=GRID_ALPHA, color=GRID_COLOR, zorder=0)
+    for side in ('top', 'right', 'left'):
+        ax.spines[side].set_visible(False)
+    ax.set_xlabel('Odds Ratio (95% CI)', fontsize=AXIS_LABEL_SIZE)
+
+
+def draw_pooled(ax, pooled, position=-1.5, label=None):
+    """
+    Pooled estimate below the countries of a forest plot axis: a diamond spanning the 95% CI of the pooled
+    OR and, when available, a thin line for the 95% prediction interval. pooled is a row of
+    meta_analysis.random_effects (OR, Lower 95, Higher 95, PI Lower, PI Upper, Method, Tau2, I2).
+    """
+    ax.fill([pooled['Lower 95'], pooled['OR'], pooled['Higher 95'], pooled['OR']],
+            [position, position + DIAMOND_HEIGHT / 2, position, position - DIAMOND_HEIGHT / 2],
+            color=POOLED_COLOR, edgecolor='black', zorder=2)
+    if np.isfinite(pooled.get('PI Lower', np.nan)):
+        ax.hlines(position, pooled['PI Lower'], pooled['PI Upper'], colors=POOLED_COLOR, linewidth=1, zorder=1)
+        ax.vlines([pooled['PI Lower'], pooled['PI Upper']], position - CAP_LENGTH / 2, position + CAP_LENGTH / 2,
+                  colors=POOLED_COLOR, linewidth=1, zorder=1)
+    if label is None:
+        label = f"Pooled ({pooled.get('Method', 'RE')})"
+        if np.isfinite(pooled.get('I2', np.nan)):
+            label += f"\n$\\tau^2$ = {pooled['Tau2']:.3f}, $I^2$ = {100 * pooled['I2']:.0f}%"
+    ticks, labels = list(ax.get_yticks()), [tick.get_text() for tick in ax.get_yticklabels()]
+    ax.set_yticks(ticks + [position])
+    ax.set_yticklabels(labels + [label])
+    bottom, top = ax.get_ylim()
+    ax.set_ylim(min(bottom, position - DIAMOND_HEIGHT), top)
+
+
+def forest_plot(df, title, subtitle='Across Countries (Sorted by OR, Highest First) with 95% Confidence Intervals',
+                num_groups=2, pooled=None):
+    """
+    Per-country OR forest plot of scripts 8-10, from a table with Country, OR, Lower 95 and Higher 95
+    (e.g. ResultsStore.plot_input): the countries sorted by OR in num_groups panels (two rows of panels
+    for more than two groups). With pooled (see meta_analysis.pooled_estimate), the pooled diamond and
+    prediction interval are drawn below the last panel. Returns the matplotlib figure.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+
+    df = df.dropna(subset=['OR', 'Lower 95', 'Higher 95']).sort_values('OR', ascending=False)
+    df = add_significance(df.reset_index(drop=True))
+    groups = [group for group in split_into_groups(df, num_groups) if not group.empty]
+    rows, cols = (1, max(len(groups), 1)) if len(groups) <= 2 else (2, int(np.ceil(len(groups) / 2)))
+    # Round the largest upper bound (CI or prediction interval) up to the nearest 0.5
+    highest = df['Higher 95'].max()
+    if pooled is not None and np.isfinite(pooled.get('PI Upper', np.nan)):
+        highest = max(highest, pooled['PI Upper'])
+    axis_max = np.ceil(highest * 2) / 2
+
+    style = {'font.family': 'sans-serif',
+             'font.sans-serif': ['Arial', 'DejaVu Sans', 'Liberation Sans', 'sans-serif']}
+    with plt.style.context('seaborn-v0_8-whitegrid'), plt.rc_context(style):
+        fig = plt.figure(figsize=(FIG_WIDTH, FIG_HEIGHT), dpi=DPI)
+        grid = fig.add_gridspec(rows, cols)
+        ax = None
+        for i, group_data in enumerate(groups):
+            ax = fig.add_subplot(grid[i // cols, i % cols])
+            _plot_group(ax, group_data, axis_max)
+        if pooled is not None and ax is not None:
+            draw_pooled(ax, pooled)
+
+        legend_elements = [
+            Line2D([0], [0], marker='o', color='w', markerfacecolor=SIGNIFICANT_COLOR, markersize=10,
+                   label=SIGNIFICANT_LABEL),
+            Line2D([0], [0], marker='o', color='w', markerfacecolor=NONSIGNIFICANT_COLOR, markersize=10,
+                   label=NONSIGNIFICANT_LABEL),
+        ]
+        if pooled is not None:
+            legend_elements.append(Line2D([0], [0], marker='D', color=POOLED_COLOR, markerfacecolor=POOLED_COLOR,
+                                          markeredgecolor='black', markersize=10, linewidth=1, label=POOLED_LABEL))
+        fig.legend(handles=legend_elements, loc='lower center', ncol=len(legend_elements),
+                   fontsize=LEGEND_FONT_SIZE, frameon=True, bbox_to_anchor=(0.5, 0.02))
+        fig.suptitle(f'{title}\n{subtitle}', fontsize=TITLE_SIZE, fontweight='bold', y=0.98)
+        fig.subplots_adjust(left=0.15, bottom=0.1, right=0.95, top=0.92, wspace=0.3, hspace=0.3)
+    return fig
+
+
+def country_scatter(country_means, dv, x='has_credit_card', label_var='economycode'):
+    """Country means of dv against credit card ownership with a regression line, as in step 5."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.scatter(country_means[x], country_means[dv], alpha=0.7)
+    sns.regplot(x=x, y=dv, data=country_means, scatter=False, line_kws={"color": "red"}, ax=ax)
+    for _, row in country_means.iterrows():
+        ax.annotate(row[label_var], (row[x], row[dv]), textcoords="offset points", xytext=(0, 7), ha='center')
+
+    ax.set_title(f'Relationship between Credit Card Ownership and {dv} by Country Code')
+    ax.set_xlabel('Credit Card Ownership Rate')
+    ax.set_ylabel(f'{dv} Rate')
+    ax.grid(True, linestyle='--', alpha=0.6)
+    corr = country_means[x].corr(country_means[dv])
+    ax.annotate(f'Correlation: {corr:.2f}', xy=(0.05, 0.95), xycoords='axes fraction',
+                bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", alpha=0.8))
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,242 @@
+"""
+Typed results store (one SQLite file) for every fitted (spec, group, dv) model.
+
+Each model is stored once with its status, solver, fit statistics and, when it was estimated, the full
+coefficient vector (one row per term, with SEs) and the covariance matrix (float64 blob). Derived
+quantities such as average marginal effects go to a separate table. The tables are indexed by spec, dv,
+group and term, so filtered queries (e.g. the credit card OR of every country for one DV) do not scan
+the whole store.
+
+The CSV tables of step 7 and the inputs of the plot scripts are views over the store: numbers are only
+turned into '%.3f' strings when a table is written, and plots read the stored floats.
+"""
+import math
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# Normal quantile for 95% intervals, as statsmodels' conf_int() (use_t=False)
+Z_95 = 1.959963984540054
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS models (
+    model_id INTEGER PRIMARY KEY,
+    spec_id TEXT NOT NULL,
+    level TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    dv TEXT NOT NULL,
+    status TEXT NOT NULL,
+    method TEXT,
+    iterations INTEGER,
+    nobs INTEGER,
+    n_clusters INTEGER,
+    llf REAL,
+    llnull REAL,
+    prsquared REAL,
+    cov_type TEXT,
+    signature TEXT,
+    UNIQUE (spec_id, dv, grp)
+);
+CREATE TABLE IF NOT EXISTS coefficients (
+    model_id INTEGER NOT NULL REFERENCES models (model_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    coef REAL NOT NULL,
+    se REAL,
+    PRIMARY KEY (model_id, term)
+);
+CREATE TABLE IF NOT EXISTS covariances (
+    model_id INTEGER PRIMARY KEY REFERENCES models (model_id) ON DELETE CASCADE,
+    k INTEGER NOT NULL,
+    matrix BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS effects (
+    model_id INTEGER NOT NULL REFERENCES models (model_id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    term TEXT NOT NULL,
+    estimate REAL,
+    lower_95 REAL,
+    higher_95 REAL,
+    PRIMARY KEY (model_id, kind, term)
+);
+CREATE INDEX IF NOT EXISTS models_dv_status ON models (dv, status);
+CREATE INDEX IF NOT EXISTS coefficients_term ON coefficients (term, model_id);
+CREATE INDEX IF NOT EXISTS effects_term ON effects (kind, term, model_id);
+CREATE VIEW IF NOT EXISTS odds_ratios AS
+SELECT m.model_id, m.spec_id, m.level, m.grp, m.dv, c.term, c.coef, c.se,
+       exp(c.coef) AS odds_ratio,
+       exp(c.coef - {Z_95!r} * c.se) AS lower_95,
+       exp(c.coef + {Z_95!r} * c.se) AS higher_95,
+       m.nobs, m.status
+FROM models AS m JOIN coefficients AS c ON c.model_id = m.model_id;
+"""
+
+
+def _optional(value, cast):
+    """None for missing values, otherwise the value as a plain Python number."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return cast(value)
+
+
+def _fmt(value):
+    return 'NA' if value is None or pd.isna(value) else f"{value:.3f}"
+
+
+class ResultsStore:
+    """SQLite store of fitted models; use as a context manager or call close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # exp() is not built into every SQLite version
+        self.connection.create_function('exp', 1, lambda x: None if x is None else math.exp(x),
+                                        deterministic=True)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    # ----- writing -----
+
+    def add_model(self, spec_id, level, group, dv, status, names=None, params=None, cov=None, bse=None,
+                  method=None, iterations=None, nobs=None, n_clusters=None, llf=None, llnull=None,
+                  prsquared=None, cov_type=None, signature=None):
+        """
+        Store one model, replacing an earlier record of the same (spec_id, dv, group). Returns its model_id.
+
+        names/params (and cov, or bse) are left out for models that were not estimated.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM models WHERE spec_id = ? AND dv = ? AND grp = ?',
+                                    (spec_id, dv, str(group)))
+            cursor = self.connection.execute(
+                'INSERT INTO models (spec_id, level, grp, dv, status, method, iterations, nobs, n_clusters, '
+                'llf, llnull, prsquared, cov_type, signature) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (spec_id, level, str(group), dv, status, method, _optional(iterations, int),
+                 _optional(nobs, int), _optional(n_clusters, int), _optional(llf, float),
+                 _optional(llnull, float), _optional(prsquared, float), cov_type, signature))
+            model_id = cursor.lastrowid
+            if params is None:
+                return model_id
+
+            params = np.asarray(params, dtype=np.float64)
+            if cov is not None:
+                cov = np.ascontiguousarray(cov, dtype=np.float64)
+                bse = np.sqrt(np.diag(cov))
+                self.connection.execute('INSERT INTO covariances (model_id, k, matrix) VALUES (?, ?, ?)',
+                                        (model_id, params.size, cov.tobytes()))
+            bse = np.full(params.size, np.nan) if bse is None else np.asarray(bse, dtype=np.float64)
+            self.connection.executemany(
+                'INSERT INTO coefficients (model_id, position, term, coef, se) VALUES (?, ?, ?, ?, ?)',
+                [(model_id, i, str(name), float(b), _optional(float(s), float))
+                 for i, (name, b, s) in enumerate(zip(names, params, bse))])
+        return model_id
+
+    def clear(self, spec_id):
+        """Delete every model of a spec (with its coefficients, covariance and effects) before it is refitted."""
+        with self.connection:
+            self.connection.execute('DELETE FROM models WHERE spec_id = ?', (spec_id,))
+
+    def add_result(self, spec_id, level, group, dv, result, fit_info=None, **stats):
+        """Store a fitted statsmodels result (full params and covariance) with its fit_info."""
+        if fit_info:
+            stats.setdefault('method', fit_info['Method'])
+            stats.setdefault('iterations', fit_info['Iterations'])
+        return self.add_model(
+            spec_id, level, group, dv, 'OK', names=list(result.model.exog_names),
+            params=np.asarray(result.params), cov=np.asarray(result.cov_params()),
+            nobs=result.nobs, llf=result.llf, llnull=getattr(result, 'llnull', None),
+            prsquared=getattr(result, 'prsquared', None), cov_type=getattr(result, 'cov_type', None), **stats)
+
+    def add_effects(self, model_id, kind, terms, estimate, lower, upper):
+        """Store derived effects (e.g. kind='AME') of one model, one row per term."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO effects (model_id, kind, term, estimate, lower_95, higher_95) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(model_id, kind, term, _optional(float(e), float), _optional(float(lo), float),
+                  _optional(float(hi), float)) for term, e, lo, hi in zip(terms, estimate, lower, upper)])
+
+    # ----- reading -----
+
+    def query(self, sql, params=()):
+        """Run any SQL against the store and return a DataFrame."""
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def model_id(self, spec_id, group, dv):
+        row = self.connection.execute('SELECT model_id FROM models WHERE spec_id = ? AND dv = ? AND grp = ?',
+                                      (spec_id, dv, str(group))).fetchone()
+        return None if row is None else row[0]
+
+    def estimates(self, spec_id=None, dv=None, term=None, level=None):
+        """Odds ratios with 95% CIs (and the underlying coef/se) for the matching models and terms."""
+        filters = {'spec_id': spec_id, 'dv': dv, 'term': term, 'level': level}
+        where = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        sql = 'SELECT * FROM odds_ratios' + (' WHERE ' + ' AND '.join(where) if where else '')
+        return self.query(sql + ' ORDER BY spec_id, dv, grp, model_id, term',
+                          [value for value in filters.values() if value is not None])
+
+    def params(self, spec_id, group, dv):
+        """Coefficient vector of one model as a Series labelled by term, or None when it was not estimated."""
+        model_id = self.model_id(spec_id, group, dv)
+        if model_id is None:
+            return None
+        rows = self.connection.execute('SELECT term, coef FROM coefficients WHERE model_id = ? ORDER BY position',
+                                       (model_id,)).fetchall()
+        if not rows:
+            return None
+        return pd.Series([coef for _, coef in rows], index=[term for term, _ in rows], dtype=np.float64)
+
+    def covariance(self, spec_id, group, dv):
+        """Covariance matrix of one model as a DataFrame labelled by term, or None."""
+        model_id = self.model_id(spec_id, group, dv)
+        row = None if model_id is None else self.connection.execute(
+            'SELECT k, matrix FROM covariances WHERE model_id = ?', (model_id,)).fetchone()
+        if row is None:
+            return None
+        names = [name for (name,) in self.connection.execute(
+            'SELECT term FROM coefficients WHERE model_id = ? ORDER BY position', (model_id,))]
+        matrix = np.frombuffer(row[1], dtype=np.float64).reshape(row[0], row[0])
+        return pd.DataFrame(matrix, index=names, columns=names)
+
+    def plot_input(self, spec_id, dv, term='has_credit_card'):
+        """Country, OR, Lower 95, Higher 95 (floats) of every estimated group, the input of plots 8-10."""
+        df = self.query(
+            'SELECT grp AS Country, odds_ratio AS "OR", lower_95 AS "Lower 95", higher_95 AS "Higher 95" '
+            'FROM odds_ratios WHERE spec_id = ? AND dv = ? AND term = ? AND status = ? ORDER BY grp',
+            (spec_id, dv, term, 'OK'))
+        return df.dropna(subset=['OR', 'Lower 95', 'Higher 95']).reset_index(drop=True)
+
+    def country_table(self, spec_id, dv, term='has_credit_card', effect='AME'):
+        """
+        The per-country table of step 7 for one DV: OR and AME with 95% CIs as '%.3f' strings, 'NA' for
+        countries without an estimate, indexed by Country.
+        """
+        df = self.query(
+            'SELECT m.grp AS Country, m.status, o.odds_ratio, o.lower_95, o.higher_95, '
+            'e.estimate, e.lower_95 AS effect_lower, e.higher_95 AS effect_higher '
+            'FROM models AS m '
+            'LEFT JOIN odds_ratios AS o ON o.model_id = m.model_id AND o.term = ? '
+            'LEFT JOIN effects AS e ON e.model_id = m.model_id AND e.kind = ? AND e.term = ? '
+            'WHERE m.spec_id = ? AND m.dv = ? ORDER BY m.grp',
+            (term, effect, term, spec_id, dv))
+
+        table = pd.DataFrame(index=pd.Index(df['Country'], name='Country'), dtype=object)
+        estimated = ((df['status'] == 'OK') & df['odds_ratio'].notna()).to_numpy()
+        has_effect = estimated & df['estimate'].notna().to_numpy()
+        for column, source, mask in [('Lower 95', 'lower_95', estimated), ('OR', 'odds_ratio', estimated),
+                                     ('Higher 95', 'higher_95', estimated), (effect, 'estimate', has_effect),
+                                     (f'{effect} Lower 95', 'effect_lower', has_effect),
+                                     (f'{effect} Higher 95', 'effect_higher', has_effect)]:
+            table[column] = [_fmt(v) if m else 'NA' for v, m in zip(df[source], mask)]
+        return table
@@ -0,0 +1,391 @@
+"""
+Specification grid (multiverse) runner: many logit specifications over one shared, pre-encoded dataset.
+
+The level of a spec says how the data is split: 'pooled' (one model, SEs clustered by country), 'country'
+(one model per country, as step 7) or any grouping variable or ':'-joined combination of them, e.g.
+'regionwb', 'year', 'economycode:year' or 'female'. The group index of each level is built once with the
+shared design; the groups are fitted in batches, in parallel, and written in the same long format.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+from findex.design import encode_design, model_columns
+from findex.fit_policy import fit_with_fallback
+from findex.warm_start import WarmStarts
+
+# Worker-side copy of the shared design (set once per worker process)
+_DESIGN = None
+
+# Batches per worker process for grouped levels (more batches = better balance, more scheduling overhead)
+BATCHES_PER_WORKER = 4
+
+# First part of the spec ids of the grid in the results store
+GRID_NAMESPACE = 'grid'
+
+# Solved models of this process, keyed by (level, group, dv): each fit starts from the same group and DV
+# of an earlier spec (or from another DV of the group) instead of from zero
+_WARM_STARTS = WarmStarts()
+
+
+# ===================== GRID DEFINITION =====================
+
+def expand_grid(regressor_sets, dependent_vars, fe_choices, sample_filters, levels=('pooled',),
+                namespace=GRID_NAMESPACE):
+    """
+    Build the list of specifications as the product of all options.
+
+    regressor_sets, fe_choices and sample_filters are dicts {name: option}; the spec id is the namespace
+    followed by the option names, so results from different grids stay comparable by id while the models
+    of steps 6 and 7 (stored without a namespace) are never replaced by a grid run. levels are 'pooled',
+    'country', grouping variables, or tuples of them for combined groups (e.g. ('economycode', 'year')).
+    """
+    specs = []
+    levels = [level if isinstance(level, str) else ':'.join(level) for level in levels]
+    for (reg_name, regs), (fe_name, fes), (sample_name, sample), level in itertools.product(
+            regressor_sets.items(), fe_choices.items(), sample_filters.items(), levels):
+        specs.append({
+            'id': f"{namespace}|{reg_name}|{fe_name}|{sample_name}|{level}",
+            'regressor_set': reg_name,
+            'fe_name': fe_name,
+            'sample_name': sample_name,
+            'level': level,
+            'explanatory_vars': list(regs),
+            'fixed_effects': list(fes),
+            'sample': dict(sample),
+            'dependent_vars': list(dependent_vars),
+        })
+    return specs
+
+
+def group_keys(level, country_var='economycode'):
+    """Grouping variables of a level: none for 'pooled', the country for 'country', else the ':'-separated names."""
+    if level == 'pooled':
+        return ()
+    if level == 'country':
+        return (country_var,)
+    return tuple(level.split(':'))
+
+
+# ===================== SHARED DESIGN =====================
+
+def _level_label(value):
+    """Group label of one key value ('2017' rather than '2017.0' for whole numbers)."""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def group_index(df, keys):
+    """
+    Index of the groups of a combination of grouping variables, built once.
+
+    Returns a dict with the group labels (key values joined by ':', sorted), the row order that makes each
+    group one contiguous range (rows in their original order within a group) and the offsets of the
+    ranges: group g is order[offsets[g]:offsets[g + 1]]. Rows with a missing key are in no group.
+    """
+    key_codes, key_levels = [], []
+    for key in keys:
+        categories = pd.Categorical(df[key])
+        key_codes.append(categories.codes.astype(np.int64))
+        key_levels.append([_level_label(level) for level in categories.categories])
+
+    valid = np.ones(len(df), dtype=bool)
+    for codes in key_codes:
+        valid &= codes >= 0
+    shape = tuple(max(len(levels), 1) for levels in key_levels)
+    combined = np.ravel_multi_index([np.where(valid, codes, 0) for codes in key_codes], shape)
+    present, group_codes = np.unique(combined[valid], return_inverse=True)
+
+    rows = np.flatnonzero(valid)
+    order = rows[np.argsort(group_codes, kind='stable')]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(group_codes, minlength=present.size))])
+    labels = [':'.join(levels[i] for levels, i in zip(key_levels, position))
+              for position in zip(*np.unravel_index(present, shape))]
+    return {'keys': tuple(keys), 'labels': labels, 'order': order, 'offsets': offsets}
+
+
+def build_shared_design(df, specs, country_var='economycode'):
+    """
+    Encode the data once for the whole grid.
+
+    The regressor matrix of findex.design (intercept, dummies of every fixed-effect variable and every
+    regressor used by any spec) is built once; each (spec, group, dv) model takes its rows and columns of
+    it (see design_matrix). The country codes (clusters and sample filters) and the group index of every
+    grouped level (see group_index) are built here too.
+    """
+    explanatory_vars, fe_vars, dependent_vars = [], [], []
+    levels = {spec['level'] for spec in specs} - {'pooled'}
+    group_vars = {key for level in levels for key in group_keys(level, country_var)}
+    uses_years = False
+    for spec in specs:
+        explanatory_vars += spec['explanatory_vars']
+        fe_vars += spec['fixed_effects']
+        dependent_vars += spec['dependent_vars']
+        uses_years |= spec['sample'].get('years') is not None
+
+    used = set(explanatory_vars) | set(dependent_vars) | set(fe_vars) | group_vars | {country_var, 'has_credit_card'}
+    missing = [col for col in used | ({'year'} if uses_years else set()) if col not in df.columns]
+    if missing:
+        raise KeyError(f"Columns used by the specification grid are missing from the data: {missing}")
+
+    design = encode_design(df, list(dict.fromkeys(explanatory_vars)), list(dict.fromkeys(fe_vars)),
+                           list(dict.fromkeys(dependent_vars)))
+    design['positions'] = {name: i for i, name in enumerate(design['names'])}
+
+    categories = pd.Categorical(df[country_var])
+    design['country_codes'] = categories.codes.astype(np.int32)
+    design['country_names'] = [str(c) for c in categories.categories]
+    design['country_var'] = country_var
+    design['year'] = pd.to_numeric(df['year'], errors='coerce').to_numpy(dtype=np.float64) if uses_years else None
+
+    # Country credit card ownership, for the threshold filter of step 5
+    design['country_ownership'] = df.groupby(country_var)['has_credit_card'].mean()
+    design['groups'] = {level: group_index(df, group_keys(level, country_var)) for level in sorted(levels)}
+    return design
+
+
+def sample_mask(design, sample):
+    """Row mask for a sample filter (credit card threshold, years, excluded countries)."""
+    mask = np.ones(len(design['country_codes']), dtype=bool)
+    country_codes, country_names = design['country_codes'], design['country_names']
+
+    threshold = sample.get('min_credit_card_threshold')
+    if threshold is not None:
+        ownership = design['country_ownership']
+        kept = set(ownership.index[ownership >= threshold].astype(str))
+        kept_codes = np.array([i for i, name in enumerate(country_names) if name in kept], dtype=np.int32)
+        mask &= np.isin(country_codes, kept_codes)
+
+    excluded = sample.get('exclude_countries')
+    if excluded:
+        excluded_codes = np.array([i for i, name in enumerate(country_names) if name in set(excluded)], dtype=np.int32)
+        mask &= ~np.isin(country_codes, excluded_codes)
+
+    years = sample.get('years')
+    if years is not None:
+        mask &= np.isin(design['year'], np.asarray(years, dtype=np.float64))
+    return mask
+
+
+def design_matrix(design, explanatory_vars, fixed_effects, rows):
+    """
+    The regressor matrix of a model on the given rows, taken from the shared matrix in one copy.
+
+    Its columns are the intercept, the dummies of the fixed effects and the regressors, kept by the rule of
+    findex.design.model_columns (absent levels and regressors with no variation in these rows are left out).
+    """
+    columns = [0]
+    for fe in fixed_effects:
+        block = design['fe_blocks'][fe]
+        columns += range(block.start, block.stop)
+    columns += [design['positions'][var] for var in explanatory_vars]
+    columns = model_columns(design, rows, np.asarray(columns, dtype=np.intp))
+    return design['X'][np.ix_(rows, columns)], [design['names'][i] for i in columns]
+
+
+# ===================== FITTING =====================
+
+def _fit_cell(design, spec, dv, rows, group_label, models=None, warm_starts=None):
+    """
+    Fit one (spec, group, dv) logit and return its long-format rows.
+
+    When a models list is given, the full model record (all coefficients, covariance, fit statistics and
+    status, see findex.results_store) is appended to it. With warm_starts (findex.warm_start.WarmStarts),
+    the fit starts from the closest model solved before it and its solution is kept for the next ones.
+    """
+    explanatory_vars = spec['explanatory_vars']
+    base = {
+        'Spec ID': spec['id'], 'Regressor Set': spec['regressor_set'], 'FE': spec['fe_name'],
+        'Sample': spec['sample_name'], 'Level': spec['level'], 'Group': group_label, 'DV': dv,
+    }
+    record = {'spec_id': spec['id'], 'level': spec['level'], 'group': group_label, 'dv': dv}
+
+    def status_rows(status, fit_info=None):
+        extra = {'Method': fit_info['Method'], 'Iterations': fit_info['Iterations']} if fit_info else {}
+        if models is not None:
+            models.append(dict(record, status=status, nobs=int(rows.size),
+                               method=fit_info['Method'] if fit_info else None,
+                               iterations=fit_info['Iterations'] if fit_info else None))
+        return [dict(base, Term=var, Status=status, N=int(rows.size), **extra) for var in explanatory_vars]
+
+    min_obs_needed = len(explanatory_vars) + len(spec['fixed_effects']) + 5
+    if rows.size < min_obs_needed:
+        return status_rows('Insufficient N')
+
+    y = design['y'][dv][rows]
+    if np.unique(y).size < 2:
+        return status_rows('No DV Variation')
+
+    # Country FE is constant within a country, so it drops out by itself at country level
+    X, names = design_matrix(design, explanatory_vars, spec['fixed_effects'], rows)
+
+    fit_kwargs = {}
+    clusters = None
+    if design['country_var'] not in group_keys(spec['level'], design['country_var']):
+        # Groups spanning several countries (pooled, region, year, ...) get SEs clustered by country, as step 6
+        clusters = design['country_codes'][rows]
+        fit_kwargs = {'cov_type': 'cluster', 'cov_kwds': {'groups': clusters}}
+
+    warm_key = None
+    if warm_starts is not None:
+        key = (spec['level'], group_label, dv)
+        candidates = [key] + [(spec['level'], group_label, other) for other in spec['dependent_vars'] if other != dv]
+        start_params, warm_key = warm_starts.start(names, candidates)
+        if start_params is not None:
+            fit_kwargs['start_params'] = start_params
+
+    try:
+        result, fit_info = fit_with_fallback(sm.Logit(y, X), **fit_kwargs)
+    except Exception:
+        return status_rows('Fit/CI Error')
+    if result is None:
+        return status_rows(fit_info['Fit Status'], fit_info)
+
+    params = np.asarray(result.params)
+    if warm_starts is not None:
+        warm_starts.add(key, pd.Series(params, index=names))
+    bse = np.asarray(result.bse)
+    pvalues = np.asarray(result.pvalues)
+    conf = np.asarray(result.conf_int())
+    position = {name: i for i, name in enumerate(names)}
+    n_clusters = int(np.unique(clusters).size) if clusters is not None else np.nan
+    if models is not None:
+        models.append(dict(record, status='OK', names=names, params=params, cov=np.asarray(result.cov_params()),
+                           method=fit_info['Method'], iterations=fit_info['Iterations'], nobs=int(result.nobs),
+                           n_clusters=n_clusters, llf=result.llf, llnull=result.llnull,
+                           prsquared=result.prsquared, cov_type=result.cov_type))
+
+    rows_out = []
+    for var in explanatory_vars:
+        row = dict(base, Term=var, N=int(result.nobs),
+                   Clusters=n_clusters,
+                   **{'Pseudo R2': result.prsquared, 'Method': fit_info['Method'], 'Iterations': fit_info['Iterations'],
+                      'Warm Start': warm_key is not None})
+        i = position.get(var)
+        if i is None:
+            row['Status'] = 'Not Estimated (Dropped)'
+        else:
+            row.update({
+                'Coef': params[i], 'Std.Err.': bse[i], 'P-value': pvalues[i],
+                'Lower 95': np.exp(conf[i, 0]), 'OR': np.exp(params[i]), 'Higher 95': np.exp(conf[i, 1]),
+                'Status': 'OK',
+            })
+        rows_out.append(row)
+    return rows_out
+
+
+def _run_task(design, spec, dv, warm_starts=None, batch=None):
+    """
+    Fit the groups of one (spec, dv) task: all of them, or the group numbers in batch.
+    Returns (long-format rows, model records).
+    """
+    sample = sample_mask(design, spec['sample'])
+    complete = sample & ~np.isnan(design['y'][dv])
+    for var in spec['explanatory_vars']:
+        complete &= ~np.isnan(design['X'][:, design['positions'][var]])
+    for fe in spec['fixed_effects']:
+        complete &= design['codes'][fe] >= 0
+
+    models = []
+    if spec['level'] == 'pooled':
+        return _fit_cell(design, spec, dv, np.flatnonzero(complete), 'ALL', models, warm_starts), models
+
+    index = design['groups'][spec['level']]
+    offsets = index['offsets']
+    rows_out = []
+    for group in (range(len(index['labels'])) if batch is None else batch):
+        group_rows = index['order'][offsets[group]:offsets[group + 1]]
+        if not sample[group_rows].any():
+            continue
+        rows = group_rows[complete[group_rows]]
+        rows_out.extend(_fit_cell(design, spec, dv, rows, index['labels'][group], models, warm_starts))
+    return rows_out, models
+
+
+def _batches(index, n_batches):
+    """Split the groups of a level into up to n_batches contiguous runs with about the same number of rows."""
+    n_groups = len(index['labels'])
+    if n_batches <= 1 or n_groups <= 1:
+        return [None]
+    offsets = index['offsets']
+    bounds = np.searchsorted(offsets, np.linspace(0, offsets[-1], min(n_batches, n_groups) + 1)[1:-1])
+    bounds = np.unique(np.concatenate([[0], bounds, [n_groups]]))
+    return [np.arange(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _init_worker(design):
+    """Keep the shared design in the worker process for all of its tasks."""
+    global _DESIGN
+    _DESIGN = design
+
+
+def _run_task_in_worker(spec, dv, warm_start=True, batch=None):
+    """Run one task (or one batch of its groups) against the worker's shared design and solved models."""
+    return _run_task(_DESIGN, spec, dv, _WARM_STARTS if warm_start else None, batch)
+
+
+def fit_design(design, specs, n_workers=None, store=None, warm_start=True):
+    """
+    Fit every (spec, dv) task against an already encoded design (see build_shared_design) and return the
+    long-format table (one row per spec, group, dv and term).
+
+    With several workers, the groups of a grouped level are split into batches of about equal size
+    (BATCHES_PER_WORKER per worker), so one large task does not hold up the others; the table keeps
+    the order of a serial run.
+
+    n_workers=1 runs everything in the current process. With a ResultsStore, the earlier models of the specs
+    are deleted and every fitted model is written to it (by this process, as the tasks finish). With warm_start, each fit starts from the same
+    group and DV of an earlier spec handled by the same process ('Warm Start' column); set it to False for
+    cold starts at zero.
+    """
+    tasks = [(spec, dv) for spec in specs for dv in spec['dependent_vars']]
+    n_workers = n_workers or os.cpu_count() or 1
+    print(f"  Specification grid: {len(specs)} specs, {len(tasks)} (spec, dv) tasks, {n_workers} worker(s)")
+    batches = {level: _batches(index, n_workers * BATCHES_PER_WORKER if n_workers > 1 else 1)
+               for level, index in design.get('groups', {}).items()}
+
+    all_rows = []
+    if store is not None:
+        # Groups of an earlier run of the same spec that are not fitted now must not stay in the store
+        for spec in specs:
+            store.clear(spec['id'])
+
+    def collect(task_rows, models):
+        all_rows.extend(task_rows)
+        if store is not None:
+            for model in models:
+                store.add_model(**model)
+
+    if n_workers == 1:
+        warm_starts = WarmStarts() if warm_start else None
+        for i, (spec, dv) in enumerate(tasks, 1):
+            collect(*_run_task(design, spec, dv, warm_starts))
+            print(f"  Finished {i}/{len(tasks)}: {spec['id']} / {dv}")
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(design,)) as pool:
+            futures = [[pool.submit(_run_task_in_worker, spec, dv, warm_start, batch)
+                        for batch in batches.get(spec['level'], [None])] for spec, dv in tasks]
+            for i, ((spec, dv), task_futures) in enumerate(zip(tasks, futures), 1):
+                for future in task_futures:
+                    collect(*future.result())
+                print(f"  Finished {i}/{len(tasks)}: {spec['id']} / {dv}")
+
+    columns = ['Spec ID', 'Regressor Set', 'FE', 'Sample', 'Level', 'Group', 'DV', 'Term',
+               'Coef', 'Std.Err.', 'P-value', 'Lower 95', 'OR', 'Higher 95',
+               'N', 'Clusters', 'Pseudo R2', 'Status', 'Method', 'Iterations', 'Warm Start']
+    return pd.DataFrame(all_rows).reindex(columns=columns)
+
+
+def run_spec_grid(df, specs, country_var='economycode', n_workers=None, store=None, warm_start=True):
+    """
+    Fit the whole grid and return one long-format table (one row per spec, group, dv and term).
+
+    The data is encoded once and shared with every worker; tasks are (spec, dv) pairs (see fit_design).
+    """
+    design = build_shared_design(df, specs, country_var)
+    return fit_design(design, specs, n_workers=n_workers, store=store, warm_start=warm_start)
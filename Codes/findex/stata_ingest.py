@@ -0,0 +1,93 @@
+"""
+Chunked reading of the Findex micro_world Stata (.dta) files, keeping their value labels.
+
+The waves are streamed in chunks (only the selected columns, numeric codes as stored) into one typed
+Parquet store, so step 2 can read the codes without a CSV round trip. The value labels of the .dta files
+are kept and used to check the recoding of step 2: every labelled code of a recoded column should be
+mapped, otherwise it silently becomes missing.
+"""
+import pandas as pd
+
+# Stata files open with the variable -> value label set assignment only in a private reader attribute;
+# when it is not available, label sets are assumed to be named after their variables (as in micro_world files)
+_LABEL_LIST_ATTRIBUTE = '_lbllist'
+
+
+def value_labels(path):
+    """Value labels of a .dta file per variable: {variable: {code: label}}."""
+    with pd.read_stata(path, iterator=True) as reader:
+        label_sets = reader.value_labels()
+        variables = list(reader.variable_labels())
+        assigned = getattr(reader, _LABEL_LIST_ATTRIBUTE, None) or variables
+    return {var: label_sets[name] for var, name in zip(variables, assigned) if name in label_sets}
+
+
+def iter_stata_chunks(path, columns=None, chunksize=100_000):
+    """Yield chunks of the selected columns with the stored numeric codes (labels are not applied)."""
+    with pd.read_stata(path, columns=columns, chunksize=chunksize, convert_categoricals=False,
+                       preserve_dtypes=False) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def stata_to_store(sources, store_path, columns=None, year_column='Year', chunksize=100_000):
+    """
+    Stream the waves {path: year} into one Parquet file, chunk by chunk.
+
+    Numeric columns are stored as float64 (Stata missing values become NaN), text columns as strings, so
+    all chunks share one schema. Returns the number of rows written. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    n_rows = 0
+    try:
+        for path, year in dict(sources).items():
+            for chunk in iter_stata_chunks(path, columns, chunksize):
+                if columns is not None:
+                    chunk = chunk[list(columns)]
+                chunk = chunk.copy()
+                chunk[year_column] = year
+                for col in chunk.columns:
+                    if col != year_column and pd.api.types.is_numeric_dtype(chunk[col]):
+                        chunk[col] = chunk[col].astype('float64')
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    schema = table.schema
+                    writer = pq.ParquetWriter(store_path, schema)
+                writer.write_table(table.cast(schema))
+                n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def check_recoding(labels, recoding, derived=None):
+    """
+    Compare the recoding of step 2 with the value labels of one wave.
+
+    Returns a DataFrame (Column, Code, Label, Issue) listing labelled codes the recoding does not map
+    (they would become missing) and mapped codes that have no label in the file.
+    """
+    mappings = dict(recoding)
+    for new_column, (source, mapping) in (derived or {}).items():
+        mappings[f"{source} -> {new_column}"] = mapping
+
+    rows = []
+    for name, mapping in mappings.items():
+        column = name.split(' -> ')[0]
+        if column not in labels:
+            continue
+        column_labels = labels[column]
+        mapped = {float(code) for code in mapping}
+        for code, label in column_labels.items():
+            if float(code) not in mapped:
+                rows.append({'Column': name, 'Code': code, 'Label': label, 'Issue': 'Labelled code not recoded'})
+        labelled = {float(code) for code in column_labels}
+        for code in mapping:
+            if float(code) not in labelled:
+                rows.append({'Column': name, 'Code': code, 'Label': '', 'Issue': 'Recoded code has no label'})
+    return pd.DataFrame(rows, columns=['Column', 'Code', 'Label', 'Issue'])
@@ -0,0 +1,243 @@
+"""
+Out-of-core pooled logit: the step 6 model fitted from a CSV read in chunks.
+
+Only the model columns are read, one chunk at a time. A first pass collects the fixed-effect levels; each
+Newton (IRLS) iteration is then one pass that adds up X'WX, the score and the log-likelihood chunk by chunk
+(plus one pass per halving of a step that would lower the log-likelihood), so memory is bounded by the
+chunk size and the k x k accumulators. The pass at the final estimates also adds up the score of every
+cluster (a clusters x k array), from which the clustered covariance is formed with the same small-sample
+correction as statsmodels. All dependent variables are fitted in the same passes, each on its own complete
+rows, so the design of a chunk is built only once.
+
+A chunk's design is kept compact (FE codes and int8 0/1 regressors, see findex.blocked_logit) and its
+X'WX is added up in cache-sized row blocks, so a chunk takes about one byte per design cell instead of
+eight. With keep_encoded, the compact chunks are kept after the first Newton pass instead of reading the file again
+on every pass.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from findex.blocked_logit import binary_columns, blocked_totals, compact_design, compact_nbytes
+
+
+def csv_chunks(path, columns, chunksize=200_000, dtype=None):
+    """Chunk source for the streaming fit: a function returning a fresh iterator over the CSV chunks."""
+    def chunks():
+        return pd.read_csv(path, usecols=columns, chunksize=chunksize, dtype=dtype)
+    return chunks
+
+
+def frame_chunks(df, chunksize=None):
+    """Chunk source over a DataFrame already in memory (one chunk when chunksize is None)."""
+    def chunks():
+        size = chunksize or max(len(df), 1)
+        return (df.iloc[start:start + size] for start in range(0, len(df), size))
+    return chunks
+
+
+class StreamingLogit:
+    """Pooled logits of several DVs on explanatory variables and fixed effects, with SEs clustered by one variable."""
+
+    def __init__(self, chunk_source, dependent_vars, explanatory_vars, fe_vars, cluster_var, storage='int8',
+                 keep_encoded=False):
+        self.chunk_source = chunk_source
+        self.dependent_vars = list(dependent_vars)
+        self.explanatory_vars = list(explanatory_vars)
+        self.fe_vars = list(fe_vars)
+        self.cluster_var = cluster_var
+        self.storage = storage  # 0/1 regressors as 'int8' or 'bits'
+        self.keep_encoded = keep_encoded
+        self.encoded = None
+        self.levels = None
+        self.names = None
+
+    # ----- design -----
+
+    def _scan_levels(self):
+        """First pass: fixed-effect and cluster levels, complete-row counts and DV sums (for the null model)."""
+        fe_and_cluster = list(dict.fromkeys(self.fe_vars + [self.cluster_var]))
+        dv_levels = {dv: {var: set() for var in fe_and_cluster} for dv in self.dependent_vars}
+        counts = {dv: [0, 0.0] for dv in self.dependent_vars}
+        binary = set(self.explanatory_vars)
+        for chunk in self.chunk_source():
+            binary &= set(binary_columns(chunk, binary))
+            for dv in self.dependent_vars:
+                complete = chunk[self._model_columns(dv)].dropna()
+                counts[dv][0] += len(complete)
+                counts[dv][1] += complete[dv].sum()
+                for var in fe_and_cluster:
+                    dv_levels[dv][var].update(complete[var].unique().tolist())
+        self.levels = {var: sorted(set().union(*(dv_levels[dv][var] for dv in self.dependent_vars)))
+                       for var in fe_and_cluster}
+        self.counts = counts
+        self.binary_vars = [var for var in self.explanatory_vars if var in binary]
+        self.n_clusters = {dv: len(dv_levels[dv][self.cluster_var]) for dv in self.dependent_vars}
+
+        # Same column order and names as the step 6 formula: Intercept, C(fe)[T.level] ..., regressors.
+        # The design is shared by all DVs; each DV keeps the dummies of the levels present in its own rows
+        names = ['Intercept']
+        columns = {dv: [True] for dv in self.dependent_vars}
+        for fe in self.fe_vars:
+            names += [f"C({fe})[T.{level}]" for level in self.levels[fe][1:]]
+            for dv in self.dependent_vars:
+                present = sorted(dv_levels[dv][fe])
+                columns[dv] += [level in dv_levels[dv][fe] and level != present[0] for level in self.levels[fe][1:]]
+        self.names = names + self.explanatory_vars
+        self.columns = {dv: np.array(cols + [True] * len(self.explanatory_vars)) for dv, cols in columns.items()}
+
+    def _model_columns(self, dv):
+        return list(dict.fromkeys([dv] + self.explanatory_vars + self.fe_vars + [self.cluster_var]))
+
+    def _design(self, chunk):
+        """
+        Compact design of a chunk with the cluster codes and, per DV, the outcome (0 where missing) and the
+        row weights (1 for the DV's complete rows, 0 for the others).
+        """
+        compact = compact_design(chunk, self.explanatory_vars, self.fe_vars, levels=self.levels,
+                                 binary_vars=self.binary_vars, storage=self.storage)
+        clusters = pd.Categorical(chunk[self.cluster_var], categories=self.levels[self.cluster_var]).codes
+        outcomes = {}
+        for dv in self.dependent_vars:
+            y = chunk[dv].to_numpy(dtype=np.float64)
+            complete = compact['complete'] & ~np.isnan(y) & (clusters >= 0)
+            outcomes[dv] = (np.where(complete, y, 0.0), complete.astype(np.float64))
+        return compact, clusters, outcomes
+
+    def _encoded_chunks(self):
+        """The chunks' designs: kept from the first pass with keep_encoded, else encoded again on each pass."""
+        if self.encoded is not None:
+            return self.encoded
+        chunks = (self._design(chunk) for chunk in self.chunk_source())
+        if self.keep_encoded:
+            self.encoded = list(chunks)
+            return self.encoded
+        return chunks
+
+    def design_nbytes(self):
+        """(compact, dense float64) memory of the kept designs, in bytes (keep_encoded only)."""
+        compact = sum(compact_nbytes(c) for c, _, _ in self.encoded or [])
+        dense = sum(c['n'] * c['k'] * 8 for c, _, _ in self.encoded or [])
+        return compact, dense
+
+    # ----- passes -----
+
+    def _pass(self, params, with_scores=False):
+        """One pass over the data: log-likelihood, score and Hessian (and cluster scores) of every active DV."""
+        n_clusters = len(self.levels[self.cluster_var])
+        totals = {dv: {'llf': 0.0, 'score': np.zeros(len(beta)), 'XtWX': np.zeros((len(beta), len(beta))),
+                       'cluster_scores': np.zeros((n_clusters, len(beta))) if with_scores else None}
+                  for dv, beta in params.items()}
+        for compact, clusters, outcomes in self._encoded_chunks():
+            # The kernel works on all design columns; a DV's left-out columns get a 0 coefficient
+            models = {}
+            for dv, beta in params.items():
+                full = np.zeros(compact['k'])
+                full[self.columns[dv]] = beta
+                models[dv] = (full, *outcomes[dv])
+            chunk_totals = blocked_totals(compact, models, clusters if with_scores else None, n_clusters)
+            for dv in params:
+                keep = self.columns[dv]
+                total, chunk_total = totals[dv], chunk_totals[dv]
+                total['llf'] += chunk_total['llf']
+                total['score'] += chunk_total['score'][keep]
+                total['XtWX'] += chunk_total['XtWX'][np.ix_(keep, keep)]
+                if with_scores:
+                    total['cluster_scores'] += chunk_total['cluster_scores'][:, keep]
+        return totals
+
+    def fit(self, tol=1e-8, maxiter=35):
+        """
+        Newton fit of every DV, one pass over the data per iteration for all DVs that have not converged.
+
+        A step that lowers the log-likelihood is halved (one more pass for the DVs concerned), as in
+        findex.fe_logit. Returns (results, fit_info) like findex.fit_policy.fit_with_fallback: results is
+        {dv: result dict} with params, clustered covariance, log-likelihoods and counts, None for a DV whose fit
+        failed; fit_info is {dv: {'Fit Status', 'Iterations', 'Converged'}} with status 'OK', 'No Convergence'
+        or 'Singular Hessian'.
+        """
+        if self.levels is None:
+            self._scan_levels()
+        params = {dv: np.zeros(int(self.columns[dv].sum())) for dv in self.dependent_vars}
+        iterations = {dv: 0 for dv in self.dependent_vars}
+        status = {dv: 'No Convergence' for dv in self.dependent_vars}
+        active = set(self.dependent_vars)
+
+        totals = self._pass(params)
+        for _ in range(maxiter):
+            if not active:
+                break
+            steps = {}
+            for dv in list(active):
+                try:
+                    steps[dv] = np.linalg.solve(totals[dv]['XtWX'], totals[dv]['score'])
+                except np.linalg.LinAlgError:
+                    status[dv] = 'Singular Hessian'
+                    active.discard(dv)
+
+            # Halve the step of a DV whose log-likelihood would go down; the accepted pass is the next iteration's
+            scale = {dv: 1.0 for dv in steps}
+            pending = set(steps)
+            while pending:
+                trial = self._pass({dv: params[dv] + scale[dv] * steps[dv] for dv in pending})
+                for dv in list(pending):
+                    if trial[dv]['llf'] >= totals[dv]['llf'] - 1e-10 or scale[dv] < 1e-4:
+                        totals[dv] = trial[dv]
+                        pending.discard(dv)
+                    else:
+                        scale[dv] /= 2
+
+            for dv, step in steps.items():
+                change = scale[dv] * step
+                params[dv] = params[dv] + change
+                iterations[dv] += 1
+                if np.max(np.abs(change)) < tol:
+                    status[dv] = 'OK'
+                    active.discard(dv)
+
+        # Final pass at the estimates for the per-cluster scores
+        fitted = [dv for dv in self.dependent_vars if status[dv] == 'OK']
+        totals = self._pass({dv: params[dv] for dv in fitted}, with_scores=True) if fitted else {}
+        results = {dv: self._result(dv, params[dv], totals[dv], iterations[dv]) if dv in totals else None
+                   for dv in self.dependent_vars}
+        fit_info = {dv: {'Fit Status': status[dv], 'Iterations': iterations[dv], 'Converged': status[dv] == 'OK'}
+                    for dv in self.dependent_vars}
+        return results, fit_info
+
+    def _result(self, dv, beta, total, iterations):
+        """Clustered covariance (statsmodels correction) and fit statistics of one DV."""
+        n_obs, y_sum = self.counts[dv]
+        names = [name for name, keep in zip(self.names, self.columns[dv]) if keep]
+        H_inv = np.linalg.inv(total['XtWX'])
+        meat = total['cluster_scores'].T @ total['cluster_scores']
+        n_clusters = self.n_clusters[dv]
+        k = len(beta)
+        correction = n_clusters / (n_clusters - 1) * (n_obs - 1) / (n_obs - k)
+        cov = correction * H_inv @ meat @ H_inv
+
+        p0 = y_sum / n_obs
+        llnull = y_sum * np.log(p0) + (n_obs - y_sum) * np.log(1 - p0)
+        return {
+            'names': names,
+            'params': pd.Series(beta, index=names),
+            'cov': pd.DataFrame(cov, index=names, columns=names),
+            'llf': total['llf'],
+            'llnull': llnull,
+            'prsquared': 1 - total['llf'] / llnull,
+            'nobs': int(n_obs),
+            'n_clusters': n_clusters,
+            'iterations': iterations,
+        }
+
+
+def or_table(result, terms, level=0.95):
+    """Odds ratios with z-based confidence intervals and p-values for the given terms (step 6 columns)."""
+    params = result['params'].loc[terms]
+    se = np.sqrt(np.diagonal(result['cov'].loc[terms, terms].to_numpy()))
+    z = stats.norm.ppf(0.5 + level / 2)
+    return pd.DataFrame({
+        'OddsRatio': np.exp(params),
+        'PValue': 2 * stats.norm.sf(np.abs(params / se)),
+        'OR CI 95% Lower': np.exp(params - z * se),
+        'OR CI 95% Upper': np.exp(params + z * se),
+    }, index=terms)
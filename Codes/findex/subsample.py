@@ -0,0 +1,58 @@
+"""
+Deterministic stratified subsample for development runs.
+
+Each country keeps a fraction of its rows (and/or at most a fixed number). Within a country the rows are
+ordered by the strata (the credit card and DV answers) and taken at equal steps, so every country's
+credit card and DV shares stay as close to the full data as the sample size allows. The order within a
+stratum and the start of the steps come from a seeded generator, so the same data, settings and seed
+always give the same rows, in their original order.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 20240101
+
+
+def stratified_subsample(df, strata, group_var='economycode', fraction=None, max_rows_per_group=None,
+                         seed=DEFAULT_SEED):
+    """
+    Rows of df kept by the subsample: per group_var value, fraction of the rows (all when None), capped at
+    max_rows_per_group. The rows of a group are sorted by the strata columns (missing answers last) and
+    then by a seeded random key, and taken at equal steps from a seeded random start (systematic sampling),
+    so each stratum gets its proportional share to within a row. Returns the subsample with a fresh index.
+    """
+    if fraction is None and max_rows_per_group is None:
+        raise ValueError("Give a fraction, a max_rows_per_group or both for the subsample")
+    if fraction is not None and not 0 < fraction <= 1:
+        raise ValueError(f"fraction must be in (0, 1], not {fraction}")
+    strata = [col for col in strata if col in df.columns and col != group_var]
+
+    rng = np.random.default_rng(seed)
+    keys = rng.random(len(df))
+    groups = pd.Categorical(df[group_var]).codes
+    # Missing answers sort after the answered ones
+    strata_codes = [np.where(codes < 0, codes.max() + 1, codes) for codes in
+                    (pd.Categorical(df[col]).codes.astype(np.int64) for col in strata)]
+    order = np.lexsort([keys] + strata_codes[::-1] + [groups])
+    order = order[groups[order] >= 0]
+
+    sizes = np.bincount(groups[groups >= 0])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    offsets = rng.random(sizes.size)
+    keep = []
+    for group, (size, start) in enumerate(zip(sizes, starts)):
+        target = size if fraction is None else int(round(fraction * size))
+        if max_rows_per_group is not None:
+            target = min(target, int(max_rows_per_group))
+        target = min(max(target, 1), size)
+        if size:
+            keep.append(order[start + np.floor((np.arange(target) + offsets[group]) * size / target).astype(np.int64)])
+    rows = np.sort(np.concatenate(keep)) if keep else np.array([], dtype=np.int64)
+    return df.iloc[rows].reset_index(drop=True)
+
+
+def prevalence_gap(full, sample, variables, group_var='economycode'):
+    """Largest absolute difference of the per-group means of the variables between the full data and the sample."""
+    full_means = full.groupby(group_var)[list(variables)].mean()
+    sample_means = sample.groupby(group_var)[list(variables)].mean().reindex(full_means.index)
+    return (full_means - sample_means).abs().max()
@@ -0,0 +1,154 @@
+"""
+Codebook validation fused into the recoding of step 2.
+
+Each recoded column is decoded through a lookup table indexed by its integer code, and the same lookup
+gives the validity bit of every row, so checking the allowed codes costs no extra pass over the data.
+Columns used as they are get allowed-code and range masks, and every required column must have answers
+in each wave. Problems are collected for all columns and raised together as a CodebookError, so bad
+input stops the pipeline before the regression steps.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CodebookError(ValueError):
+    """Input data that does not match the codebook; .report holds one row per problem."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"{len(report)} codebook problem(s):\n{report.to_string(index=False)}")
+
+
+def _lookup_table(mapping, missing_codes=()):
+    """Decoded value and validity per integer code (codes 0..max), from a step 2 mapping."""
+    codes = [int(code) for code in mapping] + [int(code) for code in missing_codes]
+    size = max(codes) + 1 if codes else 1
+    values = np.full(size, np.nan)
+    valid = np.zeros(size, dtype=bool)
+    for code, value in mapping.items():
+        values[int(code)] = np.nan if value == 'NA' else float(value)
+        valid[int(code)] = True
+    valid[[int(code) for code in missing_codes]] = True
+    return values, valid
+
+
+def decode_column(raw, mapping, missing_codes=()):
+    """
+    Recode one column and flag invalid codes in the same lookup.
+
+    Returns (decoded float array, invalid mask). Missing input stays missing and is not invalid.
+    """
+    raw = np.asarray(raw, dtype=np.float64)
+    values, valid = _lookup_table(mapping, missing_codes)
+    present = ~np.isnan(raw)
+    codes = np.where(present, raw, -1)
+    in_table = present & (codes >= 0) & (codes < values.size) & (codes == np.floor(codes))
+    index = np.where(in_table, codes, 0).astype(np.intp)
+    decoded = np.where(in_table, values[index], np.nan)
+    invalid = present & ~(in_table & valid[index])
+    return decoded, invalid
+
+
+def _problem(column, invalid, raw, issue, wave=''):
+    examples = pd.unique(np.asarray(raw)[invalid])[:5]
+    return {'Column': column, 'Wave': wave, 'Rows': int(invalid.sum()),
+            'Examples': ', '.join(str(v) for v in examples), 'Issue': issue}
+
+
+def check_waves(df, required_per_wave, year_column='Year'):
+    """Problems for required columns that are absent or have no answers in a wave."""
+    problems = []
+    for year, columns in required_per_wave.items():
+        wave = df[year_column].to_numpy() == year
+        if not wave.any():
+            problems.append({'Column': year_column, 'Wave': year, 'Rows': 0, 'Examples': '', 'Issue': 'Wave not found'})
+            continue
+        for column in columns:
+            if column not in df.columns:
+                problems.append({'Column': column, 'Wave': year, 'Rows': int(wave.sum()), 'Examples': '',
+                                 'Issue': 'Column missing'})
+            elif df[column].isna().to_numpy()[wave].all():
+                problems.append({'Column': column, 'Wave': year, 'Rows': int(wave.sum()), 'Examples': '',
+                                 'Issue': 'No answers in this wave'})
+    return problems
+
+
+def decode_and_validate(df, recoding, derived=None, missing_codes=None, allowed_codes=None, value_ranges=None,
+                        required_per_wave=None, year_column='Year', raise_errors=True):
+    """
+    Step 2 recoding with the codebook checks in the same pass.
+
+    Adds the derived (split) columns and recodes the columns of recoding, returning (decoded DataFrame,
+    problem report). Decoded values are numbers (NaN = missing) instead of the '1'/'0'/'NA' strings.
+    Raises CodebookError when there are problems, unless raise_errors is False.
+    """
+    derived = derived or {}
+    missing_codes = missing_codes or {}
+    df = df.copy()
+    problems = check_waves(df, required_per_wave, year_column) if required_per_wave else []
+
+    # Split variables first: they read the raw codes of their source columns
+    for new_column, (source, mapping) in derived.items():
+        if source not in df.columns:
+            continue
+        decoded, invalid = decode_column(df[source], mapping, missing_codes.get(source, ()))
+        df[new_column] = decoded
+        if invalid.any():
+            problems.append(_problem(f"{source} -> {new_column}", invalid, df[source], 'Code not in codebook'))
+
+    for column, mapping in recoding.items():
+        if column not in df.columns:
+            continue
+        raw = df[column].to_numpy()
+        decoded, invalid = decode_column(raw, mapping, missing_codes.get(column, ()))
+        df[column] = decoded
+        if invalid.any():
+            problems.append(_problem(column, invalid, raw, 'Code not in codebook'))
+
+    for column, codes in (allowed_codes or {}).items():
+        if column not in df.columns:
+            continue
+        raw = df[column].to_numpy(dtype=np.float64)
+        invalid = ~np.isnan(raw) & ~np.isin(raw, np.asarray(codes, dtype=np.float64))
+        if invalid.any():
+            problems.append(_problem(column, invalid, raw, 'Code not allowed'))
+
+    for column, (low, high) in (value_ranges or {}).items():
+        if column not in df.columns:
+            continue
+        raw = df[column].to_numpy(dtype=np.float64)
+        invalid = np.zeros(raw.size, dtype=bool)
+        if low is not None:
+            invalid |= raw < low
+        if high is not None:
+            invalid |= raw > high
+        if invalid.any():
+            problems.append(_problem(column, invalid, raw, f"Outside range [{low}, {high}]"))
+
+    report = pd.DataFrame(problems, columns=['Column', 'Wave', 'Rows', 'Examples', 'Issue'])
+    if raise_errors and not report.empty:
+        raise CodebookError(report)
+    return df, report
+
+
+def integer_columns(df, columns):
+    """
+    Decoded columns without missing values as int64, as the '1'/'0' strings of the old recoding were
+    written and read back (decoding gives float64 so that missing answers can be NaN).
+    """
+    for column in columns:
+        if column in df.columns and df[column].notna().all():
+            df[column] = df[column].astype(np.int64)
+    return df
+
+
+def codebook_checks(codebook):
+    """Keyword arguments of decode_and_validate taken from the codebook module."""
+    return {
+        'recoding': codebook.recoding_dict,
+        'derived': codebook.derived_variables,
+        'missing_codes': codebook.missing_codes,
+        'allowed_codes': codebook.allowed_codes,
+        'value_ranges': codebook.value_ranges,
+        'required_per_wave': codebook.required_per_wave,
+    }
@@ -0,0 +1,50 @@
+"""
+Warm starts for related logit fits.
+
+The models of a run are close to each other: the three DVs share regressors and most rows, each country
+model is a slice of the pooled model, and neighbouring specifications of the grid differ by a few terms.
+WarmStarts keeps the solved coefficients by key and builds the start vector of the next fit from the
+closest solved model (matched by column name, 0 for terms it does not have), so Newton starts near the
+optimum instead of at zero.
+"""
+import numpy as np
+import pandas as pd
+
+
+def aligned_start(names, params):
+    """Start vector for a model with these column names from solved params (a named Series); 0 where missing."""
+    return params.reindex(list(names)).fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def country_start(pooled_params, country, country_var='economycode'):
+    """
+    Pooled country-FE coefficients as the start of one country's model: the country's dummy is folded into
+    the intercept and the other country dummies are dropped.
+    """
+    prefix = f"C({country_var})[T."
+    params = pooled_params[[not name.startswith(prefix) for name in pooled_params.index]].copy()
+    if 'Intercept' in params.index:
+        params['Intercept'] += pooled_params.get(f"{prefix}{country}]", 0.0)
+    return params
+
+
+class WarmStarts:
+    """Solved coefficient vectors by key (e.g. ('country', 'KEN', 'saved')), used to seed related fits."""
+
+    def __init__(self):
+        self.solved = {}
+
+    def add(self, key, params):
+        """Keep the solution of a fitted model (a named Series, e.g. result.params)."""
+        self.solved[key] = pd.Series(params, dtype=np.float64)
+
+    def start(self, names, candidates):
+        """
+        Start vector for a model with these column names from the first available candidate key.
+
+        Returns (start_params, key), or (None, None) when no candidate was solved yet (cold start at 0).
+        """
+        for key in candidates:
+            if key in self.solved:
+                return aligned_start(names, self.solved[key]), key
+        return None, None